@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+
+"""
+    doc_server.py:
+    Serves the API documentation locally with Swagger UI, listening by
+    default on http://localhost:12345
+    *   the Swagger UI dist folder is downloaded once per release into a
+        versioned cache directory (apidocs/.cache/swagger-ui-<release>)
+    *   swagger.json is cached next to its S3 ETag and only downloaded again
+        when the object changed (conditional GetObject)
+    *   --definition renders the documentation straight from a local
+        api_definition.yaml, without any AWS access
+    *   responses are prepared in memory once, served with strong ETags,
+        gzip content encoding and Cache-Control headers
+
+    usage: python apidocs/doc_server.py [--definition stacks/resources/api_creation/api_definition.yaml]
+           [--bucket BUCKET] [--region REGION] [--port 12345] [--yes]
+"""
+
+import argparse
+import gzip
+import hashlib
+import http.server
+import importlib.util
+import io
+import json
+import mimetypes
+import os
+import shutil
+import sys
+import tempfile
+import urllib.request
+import zipfile
+
+APIDOCS_DIR = os.path.dirname(os.path.abspath(__file__))
+API_CREATION_DIR = os.path.join(APIDOCS_DIR, "..", "stacks", "resources", "api_creation")
+CACHE_DIR = os.path.join(APIDOCS_DIR, ".cache")
+
+SWAGGER_UI_RELEASE = "4.5.2"
+SWAGGER_UI_RELEASE_URL = "https://github.com/swagger-api/swagger-ui/archive/refs/tags/v{release}.zip"
+
+# the default spec url of the Swagger UI dist, replaced by the cached swagger.json
+SWAGGER_UI_DEFAULT_URL = "https://petstore.swagger.io/v2/swagger.json"
+# files of the Swagger UI dist which may reference the default spec url
+SWAGGER_UI_INITIALIZERS = ("index.html", "swagger-initializer.js")
+
+STACK_NAME = "ApiGatewayDynamicPublish"
+DOC_BUCKET_EXPORT_NAME = "api-gateway-dynamic-publish-documentation-name"
+SWAGGER_JSON_KEY = "swagger.json"
+
+DEFAULT_PORT = 12345
+
+# the spec and the pages loading it are revalidated on every load, the release assets are
+# cached for a day (their urls do not carry the release, so they are not marked immutable)
+REVALIDATE = "no-cache"
+ASSETS = "public, max-age=86400"
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# below this size gzip does not pay for itself
+GZIP_MIN_SIZE = 1024
+
+
+def swagger_ui_dir(cache_dir: str, release: str) -> str:
+    return os.path.join(cache_dir, f"swagger-ui-{release}")
+
+
+def fetch_swagger_ui(cache_dir: str, release: str = SWAGGER_UI_RELEASE) -> str:
+    """
+        Returns the directory holding the dist folder of the Swagger UI
+        release, downloading it when the release is not cached yet.
+    """
+    ui_dir = swagger_ui_dir(cache_dir, release)
+    if os.path.isdir(ui_dir):
+        return ui_dir
+
+    print(f"Downloading Swagger UI {release} ...")
+    with urllib.request.urlopen(SWAGGER_UI_RELEASE_URL.format(release=release)) as response:
+        archive = zipfile.ZipFile(io.BytesIO(response.read()))
+
+    dist_prefix = f"swagger-ui-{release}/dist/"
+
+    # extract next to the cache entry and rename, an interrupted download never leaves a partial release
+    os.makedirs(cache_dir, exist_ok=True)
+    extract_dir = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.startswith(dist_prefix):
+                continue
+            target_file = os.path.join(extract_dir, member.filename[len(dist_prefix):])
+            os.makedirs(os.path.dirname(target_file), exist_ok=True)
+            with archive.open(member) as source, open(target_file, "wb") as target:
+                shutil.copyfileobj(source, target)
+        os.replace(extract_dir, ui_dir)
+    finally:
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+    return ui_dir
+
+
+def get_documentation_bucket(region_name: str = None) -> str:
+    import boto3
+
+    stacks = boto3.client("cloudformation", region_name=region_name).describe_stacks(StackName=STACK_NAME)
+    for output in stacks["Stacks"][0].get("Outputs", []):
+        if output.get("ExportName") == DOC_BUCKET_EXPORT_NAME:
+            return output["OutputValue"]
+
+    raise ValueError(f"Stack {STACK_NAME} does not export {DOC_BUCKET_EXPORT_NAME}")
+
+
+def fetch_swagger_json(s3_client, bucket_name: str, cache_dir: str) -> bytes:
+    """
+        Returns swagger.json from the documentation bucket, the cached copy is
+        used as long as the ETag of the object is unchanged.
+    """
+    from botocore.exceptions import ClientError
+
+    spec_file = os.path.join(cache_dir, SWAGGER_JSON_KEY)
+    etag_file = f"{spec_file}.etag"
+
+    request = {"Bucket": bucket_name, "Key": SWAGGER_JSON_KEY}
+    if os.path.isfile(spec_file) and os.path.isfile(etag_file):
+        with open(etag_file, "r") as etag:
+            request["IfNoneMatch"] = etag.read().strip()
+
+    try:
+        response = s3_client.get_object(**request)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("304", "NotModified"):
+            raise
+        with open(spec_file, "rb") as spec:
+            return spec.read()
+
+    body = response["Body"].read()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(spec_file, "wb") as spec:
+        spec.write(body)
+    with open(etag_file, "w") as etag:
+        etag.write(response["ETag"])
+
+    return body
+
+
+class UnresolvedPlaceholders(dict):
+    """
+        Substitution map rendering every @@PLACEHOLDER@@ as <PLACEHOLDER>, the
+        integration ARNs are only known once the stack is deployed (@ cannot
+        start a plain yaml scalar, so the placeholder itself is not kept).
+    """
+
+    def get(self, key, default=None):
+        return f"<{key}>"
+
+
+def render_local_definition(definition_file: str) -> bytes:
+    # spec_bundler ships with the api creator lambda asset, which is not a package
+    module_spec = importlib.util.spec_from_file_location("spec_bundler", os.path.join(API_CREATION_DIR, "spec_bundler.py"))
+    spec_bundler = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(spec_bundler)
+
+    api_definition = spec_bundler.bundle_api_definition(definition_file, UnresolvedPlaceholders())
+
+    return json.dumps(api_definition).encode("utf-8")
+
+
+def prepare_response(body: bytes, content_type: str, cache_control: str) -> dict:
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    response = {
+        "Body": body,
+        "ContentType": content_type,
+        "CacheControl": cache_control,
+        "ETag": f'"{digest}"'
+    }
+
+    if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= GZIP_MIN_SIZE:
+        # mtime=0 keeps the compressed body (and its ETag) stable across restarts
+        response["GzipBody"] = gzip.compress(body, compresslevel=6, mtime=0)
+        response["GzipETag"] = f'"{digest}-gzip"'
+
+    return response
+
+
+def load_site(ui_dir: str, swagger_json: bytes) -> dict:
+    """
+        Returns the prepared responses keyed by request path.
+    """
+    site = {}
+    for root, _, files in os.walk(ui_dir):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
+            relative_path = os.path.relpath(file_path, ui_dir).replace(os.sep, "/")
+
+            with open(file_path, "rb") as asset:
+                body = asset.read()
+
+            cache_control = ASSETS
+            if relative_path in SWAGGER_UI_INITIALIZERS:
+                body = body.replace(SWAGGER_UI_DEFAULT_URL.encode("utf-8"), SWAGGER_JSON_KEY.encode("utf-8"))
+                cache_control = REVALIDATE
+
+            content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+            site[f"/{relative_path}"] = prepare_response(body, content_type, cache_control)
+
+    site[f"/{SWAGGER_JSON_KEY}"] = prepare_response(swagger_json, "application/json", REVALIDATE)
+    if "/index.html" in site:
+        site["/"] = site["/index.html"]
+
+    return site
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in (accept_encoding or "").split(","):
+        name, _, parameters = coding.strip().partition(";")
+        if name.strip() in ("gzip", "*"):
+            return parameters.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+
+    return False
+
+
+class DocumentationHandler(http.server.BaseHTTPRequestHandler):
+    site = {}
+
+    def send_site_response(self, include_body: bool) -> None:
+        response = self.site.get(self.path.split("?", 1)[0])
+        if response is None:
+            self.send_error(404)
+            return
+
+        body, etag = response["Body"], response["ETag"]
+        use_gzip = "GzipBody" in response and accepts_gzip(self.headers.get("Accept-Encoding"))
+        if use_gzip:
+            body, etag = response["GzipBody"], response["GzipETag"]
+
+        not_modified = etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", response["CacheControl"])
+        if "GzipBody" in response:
+            self.send_header("Vary", "Accept-Encoding")
+
+        if not_modified:
+            self.end_headers()
+            return
+
+        self.send_header("Content-Type", response["ContentType"])
+        self.send_header("Content-Length", str(len(body)))
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+
+        if include_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_site_response(include_body=True)
+
+    def do_HEAD(self):
+        self.send_site_response(include_body=False)
+
+    def log_request(self, code="-", size="-"):
+        # only errors (log_error) are worth printing
+        pass
+
+
+def create_server(site: dict, port: int = DEFAULT_PORT, host: str = "localhost") -> http.server.ThreadingHTTPServer:
+    handler = type("SiteHandler", (DocumentationHandler,), {"site": site})
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+
+def confirm_download() -> bool:
+    print("")
+    print("##################################")
+    print("")
+    print("To view API documentation in the OpenAPI format, it is necessary to download Swagger UI.")
+    print("Swagger UI is a third party, open source project licenced under the Apache License 2.0.")
+    print("See https://github.com/swagger-api/swagger-ui")
+    print("")
+    print("##################################")
+    print("")
+
+    while True:
+        answer = input("Would you like to download Swagger UI to view the API documentation? [y/n]").strip().lower()
+        if answer in ("y", "yes"):
+            return True
+        if answer in ("n", "no"):
+            return False
+        print("Please answer y[yes] or n[no].")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the API documentation locally with Swagger UI")
+    parser.add_argument("--definition", help="render a local OpenAPI definition (e.g. api_definition.yaml) instead of the published swagger.json")
+    parser.add_argument("--bucket", help="documentation bucket, resolved from the stack exports by default")
+    parser.add_argument("--region", default=os.environ.get("AWS_DEFAULT_REGION"), help="region of the deployed stack")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="local port to listen on")
+    parser.add_argument("--release", default=SWAGGER_UI_RELEASE, help="Swagger UI release to serve")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="directory caching Swagger UI and swagger.json")
+    parser.add_argument("--yes", action="store_true", help="download Swagger UI without asking")
+    args = parser.parse_args()
+
+    if not os.path.isdir(swagger_ui_dir(args.cache_dir, args.release)):
+        if not args.yes and not confirm_download():
+            sys.exit(0)
+    ui_dir = fetch_swagger_ui(args.cache_dir, args.release)
+
+    if args.definition:
+        swagger_json = render_local_definition(args.definition)
+    else:
+        import boto3
+
+        bucket_name = args.bucket or get_documentation_bucket(args.region)
+        swagger_json = fetch_swagger_json(boto3.client("s3", region_name=args.region), bucket_name, args.cache_dir)
+
+    server = create_server(load_site(ui_dir, swagger_json), args.port)
+    print(f"Server started at http://localhost:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+"""
+    generate_spec.py:
+    Generates large, synthetic API Gateway flavoured OpenAPI 3 definitions
+    shaped like stacks/resources/api_creation/api_definition.yaml (request
+    validators, markdown descriptions with bash samples, lambda proxy
+    integrations with @@PLACEHOLDER@@ uris, schemas referenced by $ref)
+    together with the matching placeholder substitution map, either as a
+    single file or split into per-route fragments under paths/.
+
+    usage: python benchmarks/generate_spec.py --paths 5000 --schemas 500 --output-dir /tmp/spec [--split]
+"""
+
+import argparse
+import json
+import os
+
+HEADER = '''openapi: "3.0.0"
+info:
+  title: @@API_NAME@@
+  version: "v1.0"
+x-amazon-apigateway-request-validators:
+  all:
+    validateRequestBody: true
+    validateRequestParameters: true
+  params-only:
+    validateRequestBody: false
+    validateRequestParameters: true
+x-amazon-apigateway-request-validator: all
+paths:
+'''
+
+OPERATION = '''get:
+  summary: "Get resource {index}"
+  description: |
+    ## Get resource {index}
+
+    The purpose of this endpoint is to return resource {index}.
+
+    ### Sample invocation
+
+    ```bash
+    #!/bin/bash
+
+    # set the desired AWS region below
+    AWS_REGION="us-east-1"
+
+    STACK_NAME="ApiGatewayDynamicPublish"
+
+    # Get the API Endpoint
+    API_ENDPOINT_URL_EXPORT_NAME="api-gateway-dynamic-publish-url"
+    API_ENDPOINT_URL=$(aws cloudformation --region ${{AWS_REGION}} describe-stacks --stack-name ${{STACK_NAME}} --query "Stacks[0].Outputs[?ExportName=='${{API_ENDPOINT_URL_EXPORT_NAME}}'].OutputValue" --output text)
+    API_GATEWAY_URL="${{API_ENDPOINT_URL}}"
+{description_lines}
+    echo "Testing GET ${{API_GATEWAY_URL}}/resource-{index}"
+    API_RESPONSE=$(curl -sX GET ${{API_GATEWAY_URL}}/resource-{index}?filter=${{FILTER}})
+
+    echo ""
+    echo ${{API_RESPONSE}} | jq .
+    echo ""
+    ```
+  operationId: "resource{index}Integration"
+  x-amazon-apigateway-request-validator: all
+  parameters:
+  - in: query
+    name: filter
+    schema:
+      type: string
+    description: |
+        An optional filter applied to resource {index}
+  responses:
+    200:
+      description: "OK"
+      content:
+        application/json:
+          schema:
+            type: array
+            items:
+              $ref: "{root_ref}#/components/schemas/{schema}"
+    500:
+      description: "Internal Server Error"
+  x-amazon-apigateway-integration:
+    uri: @@API_INTEGRATION_{integration}_LAMBDA@@
+    payloadFormatVersion: "2.0"
+    httpMethod: "POST"
+    type: "aws_proxy"
+    connectionType: "INTERNET"
+'''
+
+SCHEMA = '''    {name}:
+      type: object
+      properties:
+        id:
+          type: string
+          description: |
+            Identifier of {name}.
+{child}'''
+
+SCHEMA_CHILD = '''        child:
+          $ref: "#/components/schemas/{child}"
+'''
+
+
+def schema_name(index: int) -> str:
+    return f"Resource{index}Response"
+
+
+def indent(text: str, prefix: str) -> str:
+    return "".join(prefix + line if line.strip() else line for line in text.splitlines(True))
+
+
+def generate_spec_files(
+        paths: int,
+        schemas: int,
+        ref_depth: int,
+        integrations: int,
+        description_lines: int,
+        split: bool = False
+    ) -> dict:
+    """
+        Returns the generated definition as {relative file name: content}. When
+        split is set every path item is written to its own paths/ fragment and
+        referenced from api_definition.yaml with an external $ref.
+    """
+    extra_lines = "".join(
+        f'    # sample step {line}: inspect the response of the previous request before continuing\n'
+        for line in range(description_lines)
+    )
+
+    files = {}
+    parts = [HEADER]
+    for index in range(paths):
+        operation = OPERATION.format(
+            index=index,
+            schema=schema_name(index % schemas),
+            # a fragment refers to the shared schemas through the root definition
+            root_ref="../api_definition.yaml" if split else "",
+            integration=index % integrations,
+            description_lines=extra_lines
+        )
+        if split:
+            files[f"paths/resource-{index}.yaml"] = operation
+            parts.append(f'  /resource-{index}:\n    $ref: "paths/resource-{index}.yaml"\n')
+        else:
+            parts.append(f"  /resource-{index}:\n{indent(operation, '    ')}")
+
+    parts.append("components:\n  schemas:\n")
+    for index in range(schemas):
+        # schemas form $ref chains of ref_depth links: 0 -> 1 -> ... -> ref_depth
+        child = ""
+        if (index + 1) % (ref_depth + 1) != 0 and index + 1 < schemas:
+            child = SCHEMA_CHILD.format(child=schema_name(index + 1))
+        parts.append(SCHEMA.format(name=schema_name(index), child=child))
+
+    files["api_definition.yaml"] = "".join(parts)
+
+    return files
+
+
+def write_spec_files(output_dir: str, files: dict) -> None:
+    for file_name, content in files.items():
+        file_path = os.path.join(output_dir, file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as spec_file:
+            spec_file.write(content)
+
+
+def generate_substitutions(integrations: int, region: str = "us-east-1", account: str = "123456789012") -> dict:
+    substitutions = {"API_NAME": "apigateway-dynamic-publish-synthetic"}
+    for index in range(integrations):
+        function_arn = f"arn:aws:lambda:{region}:{account}:function:synthetic-integration-{index}"
+        substitutions[f"API_INTEGRATION_{index}_LAMBDA"] = (
+            f"arn:aws:apigateway:{region}:lambda:path/2015-03-31/functions/{function_arn}/invocations"
+        )
+
+    return substitutions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Synthetic OpenAPI definition generator")
+    parser.add_argument("--paths", type=int, default=1000, help="number of paths (routes)")
+    parser.add_argument("--schemas", type=int, default=100, help="number of component schemas")
+    parser.add_argument("--ref-depth", type=int, default=5, help="length of the $ref chains between schemas")
+    parser.add_argument("--integrations", type=int, default=10, help="number of distinct lambda integrations")
+    parser.add_argument("--description-lines", type=int, default=20, help="extra markdown lines per description")
+    parser.add_argument("--split", action="store_true", help="write one fragment file per path under paths/")
+    parser.add_argument("--output-dir", required=True, help="directory receiving api_definition.yaml and substitutions.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    files = generate_spec_files(
+        args.paths, max(args.schemas, 1), args.ref_depth, max(args.integrations, 1), args.description_lines, args.split
+    )
+    write_spec_files(args.output_dir, files)
+
+    with open(os.path.join(args.output_dir, "substitutions.json"), "w") as substitutions_file:
+        json.dump(generate_substitutions(max(args.integrations, 1)), substitutions_file, indent=2)
+
+    size = sum(len(content) for content in files.values())
+    print(f"Generated {args.paths} paths and {args.schemas} schemas ({size / 1024:.1f} KiB in {len(files)} files) in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""
+    import_time.py:
+    Measures the cold start import cost of the api creator lambda handler
+    with `python -X importtime` and fails when the cumulative import time
+    exceeds the budget or when a module that should be lazily imported
+    (boto3, botocore, yaml) is loaded at import time.
+
+    usage: python benchmarks/import_time.py [--budget-ms 50] [--top 10]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+API_CREATION_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "stacks", "resources", "api_creation"
+)
+
+# modules which must only be imported on the code paths that need them
+LAZY_MODULES = ("boto3", "botocore", "yaml")
+
+
+def measure_import(module_name: str, module_dir: str) -> list:
+    env = dict(os.environ)
+    env.pop("AWS_REGION", None)
+    env["PYTHONPATH"] = module_dir
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=module_dir,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{result.stderr}")
+
+    # import time: self [us] | cumulative | imported package
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import time benchmark for api_creator.py")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="cumulative import time budget")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to print")
+    args = parser.parse_args()
+
+    timings = measure_import("api_creator", os.path.abspath(API_CREATION_DIR))
+    module_cumulative_us = next(cumulative for name, _, cumulative in timings if name == "api_creator")
+
+    print(f"api_creator cumulative import time: {module_cumulative_us / 1000:.2f} ms (budget {args.budget_ms} ms)")
+    for name, self_us, cumulative_us in sorted(timings, key=lambda t: t[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.2f} ms  {name}")
+
+    failures = []
+    imported = {name for name, _, _ in timings}
+    for lazy_module in LAZY_MODULES:
+        if lazy_module in imported:
+            failures.append(f"{lazy_module} is imported at module import time")
+    if module_cumulative_us / 1000 > args.budget_ms:
+        failures.append("cumulative import time exceeds the budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
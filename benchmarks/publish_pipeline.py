@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+    publish_pipeline.py:
+    Benchmarks the api creator publish pipeline (render and parse -> JSON ->
+    upload) on synthetic definitions produced by generate_spec.py. Every
+    render starts from the files, as in a new execution environment. Each stage
+    is timed and its peak memory allocation recorded, in a separate run,
+    with tracemalloc. The upload stage runs against a moto backed S3 bucket.
+
+    usage: python benchmarks/publish_pipeline.py --paths 100 1000 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generate_spec import generate_spec_files, generate_substitutions, write_spec_files
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "stacks", "resources", "api_creation")
+)
+
+BUCKET_NAME = "api-documentation-benchmark"
+
+
+def measure(stage: str, results: list, profile_memory: bool, func, *args):
+    started = time.perf_counter()
+    value = func(*args)
+    elapsed = time.perf_counter() - started
+
+    # memory is profiled in a second, traced run so tracemalloc overhead does not skew the timing
+    peak = None
+    if profile_memory:
+        tracemalloc.start()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    results.append((stage, elapsed, peak))
+    return value
+
+
+def run_pipeline(api_creator, s3_client, spec_dir: str, substitutions: dict, profile_memory: bool) -> list:
+    root_file = os.path.join(spec_dir, "api_definition.yaml")
+
+    results = []
+    api_definition = measure("render", results, profile_memory, api_creator.render_api_definition, root_file, substitutions)
+    api_definition_json = measure("json", results, profile_memory, json.dumps, api_definition)
+    # mirrors the object written by publish_api_documentation
+    measure(
+        "upload", results, profile_memory,
+        lambda: s3_client.put_object(Bucket=BUCKET_NAME, Key="swagger.json", Body=api_definition_json)
+    )
+    measure("publish (end to end)", results, profile_memory, api_creator.publish_api_documentation, BUCKET_NAME, api_definition)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="api creator publish pipeline benchmark")
+    parser.add_argument("--paths", type=int, nargs="+", default=[100, 1000, 5000], help="route counts to benchmark")
+    parser.add_argument("--schemas-ratio", type=float, default=0.1, help="component schemas per path")
+    parser.add_argument("--ref-depth", type=int, default=5, help="length of the $ref chains between schemas")
+    parser.add_argument("--description-lines", type=int, default=20, help="extra markdown lines per description")
+    parser.add_argument("--single-file", action="store_true", help="generate a monolithic definition instead of per-route fragments")
+    parser.add_argument("--skip-memory", action="store_true", help="skip the tracemalloc memory profiling runs")
+    args = parser.parse_args()
+
+    from moto import mock_aws
+
+    for variable in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(variable, "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+
+    import api_creator
+
+    with mock_aws(), tempfile.TemporaryDirectory() as work_dir:
+        s3_client = api_creator.get_s3_client()
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+
+        print(f"{'paths':>6} {'spec KiB':>9} {'stage':<22} {'seconds':>9} {'peak MiB':>9}")
+        for paths in args.paths:
+            integrations = 10
+            files = generate_spec_files(
+                paths, max(int(paths * args.schemas_ratio), 1), args.ref_depth, integrations,
+                args.description_lines, not args.single_file
+            )
+            spec_dir = os.path.join(work_dir, str(paths))
+            write_spec_files(spec_dir, files)
+            spec_size = sum(len(content) for content in files.values())
+
+            substitutions = generate_substitutions(integrations)
+            for stage, elapsed, peak in run_pipeline(api_creator, s3_client, spec_dir, substitutions, not args.skip_memory):
+                peak_mib = "-" if peak is None else f"{peak / 1024 / 1024:.1f}"
+                print(f"{paths:>6} {spec_size / 1024:>9.1f} {stage:<22} {elapsed:>9.3f} {peak_mib:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+    api_monitoring.py:
+    CDK Construct that creates a CloudWatch dashboard and latency / throttle
+    alarms per route of the published API. Throttled requests (429) are
+    counted from the API Gateway access logs, HTTP APIs do not publish a
+    throttle metric. The routes are read from the
+    OpenAPI 3 spec file (api_definition.yaml) at synth time, the alarm
+    thresholds from the x-slo extension of each operation.
+"""
+
+import importlib.util
+import os
+
+from aws_cdk import Duration
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_cloudwatch_actions as cloudwatch_actions
+from aws_cdk import aws_logs as logs
+from aws_cdk import aws_sns as sns
+from aws_cdk import aws_sns_subscriptions as sns_subscriptions
+from constructs import Construct
+
+API_CREATION_DIR = f"{os.path.dirname(__file__)}/resources/api_creation"
+
+HTTP_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+
+# namespace of the metrics extracted from the access logs
+ACCESS_LOG_METRICS_NAMESPACE = 'ApiGatewayDynamicPublish'
+
+
+def load_spec_bundler():
+    # spec_bundler ships with the api creator lambda asset, which is not a package
+    module_spec = importlib.util.spec_from_file_location("spec_bundler", f"{API_CREATION_DIR}/spec_bundler.py")
+    spec_bundler = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(spec_bundler)
+
+    return spec_bundler
+
+
+class PlaceholderNames(dict):
+    """
+        Substitution map resolving every @@PLACEHOLDER@@ to its own name.
+    """
+
+    def get(self, key, default=None):
+        return key
+
+
+def read_api_routes(definition_file: str = f"{API_CREATION_DIR}/api_definition.yaml") -> list:
+    """
+        Returns one entry per operation: method, path, operationId, the
+        integration placeholder (e.g. API_INTEGRATION_PING_LAMBDA) and x-slo.
+    """
+    spec_bundler = load_spec_bundler()
+
+    # placeholders are replaced by their own name, so integrations can be paired with the stack functions
+    api_definition = spec_bundler.bundle_api_definition(definition_file, PlaceholderNames())
+
+    routes = []
+    for path, path_item in api_definition.get('paths', {}).items():
+        for method, operation in path_item.items():
+            if method == 'x-amazon-apigateway-any-method':
+                method = 'ANY'
+            elif method in HTTP_METHODS:
+                method = method.upper()
+            else:
+                continue
+
+            integration = operation.get('x-amazon-apigateway-integration', {})
+            routes.append({
+                'Method': method,
+                'Path': path,
+                'OperationId': operation.get('operationId', f"{method} {path}"),
+                'Integration': integration.get('uri'),
+                'Slo': operation.get('x-slo', {})
+            })
+
+    return routes
+
+
+class ApiMonitoring(Construct):
+    """
+        Dashboard and alarms for every route of the API.
+        integration_functions maps the integration placeholders of the spec to
+        the lambda functions serving them, access_log_group is the log group
+        the stage writes its access logs to (api_creator.stage_access_log_settings).
+    """
+
+    def __init__(
+            self,
+            scope: Construct,
+            construct_id: str,
+            api_id: str,
+            api_stage_name: str,
+            integration_functions: dict,
+            access_log_group: logs.ILogGroup,
+            alarm_email: str = None,
+            routes: list = None
+        ) -> None:
+        super().__init__(scope, construct_id)
+
+        routes = routes if routes is not None else read_api_routes()
+
+        self.alarm_topic = sns.Topic(self, 'ApiAlarmTopic')
+        if alarm_email:
+            self.alarm_topic.add_subscription(sns_subscriptions.EmailSubscription(alarm_email))
+
+        self.dashboard = cloudwatch.Dashboard(self, 'ApiDashboard')
+        self.alarms = []
+
+        for route in routes:
+            integration_function = integration_functions.get(route['Integration'])
+
+            def route_metric(metric_name: str, statistic: str) -> cloudwatch.Metric:
+                return cloudwatch.Metric(
+                    namespace='AWS/ApiGateway',
+                    metric_name=metric_name,
+                    dimensions_map={
+                        'ApiId': api_id,
+                        'Stage': api_stage_name,
+                        'Resource': route['Path'],
+                        'Method': route['Method']
+                    },
+                    statistic=statistic,
+                    period=Duration.minutes(1)
+                )
+
+            route_name = f"{route['Method']} {route['Path']}"
+            widgets = [
+                cloudwatch.GraphWidget(
+                    title=f"{route_name} latency",
+                    left=[
+                        route_metric('Latency', 'p50'),
+                        route_metric('Latency', 'p99'),
+                        route_metric('IntegrationLatency', 'p99')
+                    ],
+                    width=8
+                ),
+                cloudwatch.GraphWidget(
+                    title=f"{route_name} requests",
+                    left=[route_metric('Count', 'Sum')],
+                    right=[route_metric('4xx', 'Sum'), route_metric('5xx', 'Sum')],
+                    width=8
+                )
+            ]
+
+            if integration_function is not None:
+                widgets.append(
+                    cloudwatch.GraphWidget(
+                        title=f"{route_name} lambda",
+                        left=[integration_function.metric_duration(statistic='p99', period=Duration.minutes(1))],
+                        right=[integration_function.metric('ConcurrentExecutions', statistic='Maximum', period=Duration.minutes(1))],
+                        width=8
+                    )
+                )
+
+            self.dashboard.add_widgets(*widgets)
+
+            slo = route['Slo']
+
+            if 'p99LatencyMs' in slo:
+                latency_alarm = cloudwatch.Alarm(
+                    self,
+                    f"{route['OperationId']}P99LatencyAlarm",
+                    alarm_description=f"p99 latency of {route_name} above {slo['p99LatencyMs']} ms",
+                    metric=route_metric('Latency', 'p99').with_(period=Duration.minutes(5)),
+                    threshold=slo['p99LatencyMs'],
+                    evaluation_periods=slo.get('evaluationPeriods', 3),
+                    comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                    treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+                )
+                self.alarms.append(latency_alarm)
+
+            if 'throttles' in slo:
+                # access log line: ip - - [time] "method routeKey protocol" status ...
+                throttled_requests = logs.MetricFilter(
+                    self,
+                    f"{route['OperationId']}ThrottledRequests",
+                    log_group=access_log_group,
+                    filter_pattern=logs.FilterPattern.space_delimited('ip', 'identity', 'user', 'time', 'request', 'status', '...')
+                        .where_string('request', '=', f"* {route_name} *")
+                        .where_number('status', '=', 429),
+                    metric_namespace=ACCESS_LOG_METRICS_NAMESPACE,
+                    metric_name=f"{route['OperationId']}ThrottledRequests",
+                    metric_value='1',
+                    default_value=0
+                )
+
+                throttle_alarm = cloudwatch.Alarm(
+                    self,
+                    f"{route['OperationId']}ThrottleAlarm",
+                    alarm_description=f"throttled (429) requests of {route_name} above {slo['throttles']} per minute",
+                    metric=throttled_requests.metric(statistic='Sum', period=Duration.minutes(1)),
+                    threshold=slo['throttles'],
+                    evaluation_periods=slo.get('evaluationPeriods', 3),
+                    comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                    treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+                )
+                self.alarms.append(throttle_alarm)
+
+        for alarm in self.alarms:
+            alarm.add_alarm_action(cloudwatch_actions.SnsAction(self.alarm_topic))
@@ -17,6 +17,8 @@ from aws_cdk import (
     RemovalPolicy, 
     Stack
 )
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as events_targets
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda
 from aws_cdk import aws_logs as logs
@@ -24,6 +26,30 @@ from aws_cdk import aws_s3 as s3
 from aws_cdk import custom_resources
 from constructs import Construct
 
+from stacks.api_monitoring import ApiMonitoring
+from stacks.api_monitoring import read_api_routes
+
+# integration placeholder of the spec -> module of api_integrations serving it
+INTEGRATION_HANDLER_MODULES = {
+    'API_INTEGRATION_PING_LAMBDA': 'ping',
+    'API_INTEGRATION_GREETING_LAMBDA': 'greeting'
+}
+
+
+def build_route_handlers(routes: list) -> dict:
+    """
+        Route table of the router function ({route key: module}), built from
+        the routes declared in api_definition.yaml.
+    """
+    route_handlers = {}
+    for route in routes:
+        route_key = f"{route['Method']} {route['Path']}"
+        if route['Integration'] not in INTEGRATION_HANDLER_MODULES:
+            raise ValueError(f"No router handler for the integration {route['Integration']} of {route_key}")
+        route_handlers[route_key] = INTEGRATION_HANDLER_MODULES[route['Integration']]
+
+    return route_handlers
+
 
 class ApiGatewayDynamicPublishStack(Stack):
     """
@@ -99,25 +125,69 @@ class ApiGatewayDynamicPublishStack(Stack):
                 )
         )
 
-        api_gateway_ping_lambda = aws_lambda.Function(
-            scope=self,
-            id="ApiGatewayPingLambda",
-            code=aws_lambda.Code.from_asset(f"{os.path.dirname(__file__)}/resources/api_integrations"),
-            handler="ping.lambda_handler",
-            role=api_gateway_integration_lambda_role,
-            runtime=aws_lambda.Runtime.PYTHON_3_9,
-            timeout=Duration.seconds(15)
-        )
+        # "functions" deploys one function per operation, "router" a single function serving every operation
+        integration_mode = config['api'].get('integrationMode', 'functions')
+
+        if integration_mode == 'router':
+
+            api_gateway_router_lambda = aws_lambda.Function(
+                scope=self,
+                id="ApiGatewayRouterLambda",
+                code=aws_lambda.Code.from_asset(f"{os.path.dirname(__file__)}/resources/api_integrations"),
+                handler="router.lambda_handler",
+                role=api_gateway_integration_lambda_role,
+                runtime=aws_lambda.Runtime.PYTHON_3_9,
+                timeout=Duration.seconds(15),
+                environment={
+                    'ROUTE_HANDLERS': json.dumps(build_route_handlers(read_api_routes()), sort_keys=True)
+                }
+            )
 
-        api_gateway_greeting_lambda = aws_lambda.Function(
-            scope=self,
-            id="ApiGatewayGreetingLambda",
-            code=aws_lambda.Code.from_asset(f"{os.path.dirname(__file__)}/resources/api_integrations"),
-            handler="greeting.lambda_handler",
-            role=api_gateway_integration_lambda_role,
-            runtime=aws_lambda.Runtime.PYTHON_3_9,
-            timeout=Duration.seconds(15)
-        )
+            integration_lambdas = [api_gateway_router_lambda]
+            integration_functions = {
+                'API_INTEGRATION_PING_LAMBDA': api_gateway_router_lambda,
+                'API_INTEGRATION_GREETING_LAMBDA': api_gateway_router_lambda
+            }
+            integration_properties = {
+                'ApiIntegrationRouterLambda': api_gateway_router_lambda.function_arn
+            }
+
+        else:
+
+            api_gateway_ping_lambda = aws_lambda.Function(
+                scope=self,
+                id="ApiGatewayPingLambda",
+                code=aws_lambda.Code.from_asset(f"{os.path.dirname(__file__)}/resources/api_integrations"),
+                handler="ping.lambda_handler",
+                role=api_gateway_integration_lambda_role,
+                runtime=aws_lambda.Runtime.PYTHON_3_9,
+                timeout=Duration.seconds(15)
+            )
+
+            api_gateway_greeting_lambda = aws_lambda.Function(
+                scope=self,
+                id="ApiGatewayGreetingLambda",
+                code=aws_lambda.Code.from_asset(f"{os.path.dirname(__file__)}/resources/api_integrations"),
+                handler="greeting.lambda_handler",
+                role=api_gateway_integration_lambda_role,
+                runtime=aws_lambda.Runtime.PYTHON_3_9,
+                timeout=Duration.seconds(15)
+            )
+
+            integration_lambdas = [api_gateway_ping_lambda, api_gateway_greeting_lambda]
+            integration_functions = {
+                'API_INTEGRATION_PING_LAMBDA': api_gateway_ping_lambda,
+                'API_INTEGRATION_GREETING_LAMBDA': api_gateway_greeting_lambda
+            }
+            integration_properties = {
+                'ApiIntegrationPingLambda': api_gateway_ping_lambda.function_arn,
+                'ApiIntegrationGreetingLambda': api_gateway_greeting_lambda.function_arn
+            }
+
+        # optional lambda authorizer, referenced from the spec as @@API_AUTHORIZER_LAMBDA@@
+        authorizer_lambda_arn = config['api'].get('authorizerLambdaArn')
+        if authorizer_lambda_arn:
+            integration_properties['ApiAuthorizerLambda'] = authorizer_lambda_arn
 
         ##########################################################
         # </END> Create API Creator Custom Resource
@@ -169,30 +239,106 @@ class ApiGatewayDynamicPublishStack(Stack):
 
         api_documentation_bucket.grant_read_write(apicreator_lambda_role)
 
+        # the publish lease lives in the documentation bucket, which only serialises this stack's publishers,
+        # stacks of the same account publishing the same api name must share a bucket (granted by role policy only)
+        publish_lock_bucket_name = config['api'].get('publishLockBucketName')
+        publish_lock_properties = {}
+        # is_complete publishes (on_event only renders), a lease must outlive the longest publish
+        publish_timeout = Duration.minutes(config['api'].get('publishTimeoutMinutes', 5))
+        publish_lock_environment = {'PUBLISH_LOCK_TTL_SECONDS': str(int(publish_timeout.to_seconds()))}
+        if publish_lock_bucket_name:
+            s3.Bucket.from_bucket_name(self, 'PublishLockBucket', publish_lock_bucket_name).grant_read_write(apicreator_lambda_role)
+            publish_lock_properties['PublishLockBucketName'] = publish_lock_bucket_name
+            publish_lock_environment['PUBLISH_LOCK_BUCKET_NAME'] = publish_lock_bucket_name
+
+        apicreator_code = aws_lambda.Code.from_asset( 
+            f"{os.path.dirname(__file__)}/resources/api_creation",
+            bundling=BundlingOptions(
+                image=aws_lambda.Runtime.PYTHON_3_9.bundling_image,
+                command=[
+                    "bash", "-c",
+                    "pip install --no-cache -r requirements.txt -t /asset-output && cp -au . /asset-output"
+                ],
+            ),
+        )
+
+        # renders the definitions into a publish job (and deletes), returns without publishing
         apicreator_lambda = aws_lambda.Function(
             scope=self,
             id="ApiCreatorLambda",
-            code=aws_lambda.Code.from_asset( 
-                f"{os.path.dirname(__file__)}/resources/api_creation",
-                bundling=BundlingOptions(
-                    image=aws_lambda.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash", "-c",
-                        "pip install --no-cache -r requirements.txt -t /asset-output && cp -au . /asset-output"
-                    ],
-                ),
-            ),
+            code=apicreator_code,
             handler="api_creator.lambda_handler",
             role=apicreator_lambda_role,
             runtime=aws_lambda.Runtime.PYTHON_3_9,
-            timeout=Duration.minutes(5)
+            timeout=Duration.minutes(5),
+            environment=publish_lock_environment
         )
 
-        # Provider that invokes the api creator lambda function
+        # polled by the provider framework, advances the publish job until the api and its stage are ready
+        apicreator_is_complete_lambda = aws_lambda.Function(
+            scope=self,
+            id="ApiCreatorIsCompleteLambda",
+            code=apicreator_code,
+            handler="api_creator.is_complete_handler",
+            role=apicreator_lambda_role,
+            runtime=aws_lambda.Runtime.PYTHON_3_9,
+            timeout=publish_timeout,
+            environment=publish_lock_environment
+        )
+
+        # additional regions the api is published to, next to the stack region
+        api_regions = config['api'].get('regions', [])
+
+        # invoked directly to redeploy a previous definition snapshot without a stack update
+        apicreator_rollback_lambda = aws_lambda.Function(
+            scope=self,
+            id="ApiCreatorRollbackLambda",
+            code=apicreator_code,
+            handler="api_creator.rollback_handler",
+            role=apicreator_lambda_role,
+            runtime=aws_lambda.Runtime.PYTHON_3_9,
+            timeout=publish_timeout,
+            environment={
+                'API_NAME': config['api']['apiName'],
+                'API_STAGE_NAME': config['api']['apiStageName'],
+                'API_DOCUMENTATION_BUCKET_NAME': api_documentation_bucket.bucket_name,
+                **publish_lock_environment
+            }
+        )
+
+        # compares the published api with the current snapshot on a schedule
+        apicreator_drift_reconciler_lambda = aws_lambda.Function(
+            scope=self,
+            id="ApiDriftReconcilerLambda",
+            code=apicreator_code,
+            handler="drift_reconciler.lambda_handler",
+            role=apicreator_lambda_role,
+            runtime=aws_lambda.Runtime.PYTHON_3_9,
+            timeout=Duration.minutes(5),
+            environment={
+                'API_NAME': config['api']['apiName'],
+                'API_STAGE_NAME': config['api']['apiStageName'],
+                'API_DOCUMENTATION_BUCKET_NAME': api_documentation_bucket.bucket_name,
+                'DRIFT_SELF_HEAL': str(config['api'].get('driftSelfHeal', False)).lower(),
+                **publish_lock_environment
+            }
+        )
+
+        events.Rule(
+            self,
+            'ApiDriftReconcilerSchedule',
+            schedule=events.Schedule.rate(Duration.minutes(config['api'].get('driftCheckIntervalMinutes', 15))),
+            targets=[events_targets.LambdaFunction(apicreator_drift_reconciler_lambda)]
+        )
+
+        # Provider that invokes the api creator lambda functions
         apicreator_provider = custom_resources.Provider(
             self,
             'ApiCreatorCustomResourceProvider',
-            on_event_handler=apicreator_lambda
+            on_event_handler=apicreator_lambda,
+            is_complete_handler=apicreator_is_complete_lambda,
+            query_interval=Duration.seconds(config['api'].get('publishQueryIntervalSeconds', 10)),
+            total_timeout=Duration.minutes(config['api'].get('publishTotalTimeoutMinutes', 60))
         )
 
         # The custom resource that uses the api creator provider to supply values
@@ -202,14 +348,19 @@ class ApiGatewayDynamicPublishStack(Stack):
             service_token=apicreator_provider.service_token,
             properties={
                 'ApiGatewayAccessLogsLogGroupArn': api_gateway_access_log_group.log_group_arn,
-                'ApiIntegrationPingLambda': api_gateway_ping_lambda.function_arn,
-                'ApiIntegrationGreetingLambda': api_gateway_greeting_lambda.function_arn,
                 'ApiDocumentationBucketName': api_documentation_bucket.bucket_name,
                 'ApiDocumentationBucketUrl': api_documentation_bucket.bucket_website_url,
                 'ApiName': f"{config['api']['apiName']}",
                 'ApiStageName': config['api']['apiStageName'],
                 'ThrottlingBurstLimit': config['api']['throttlingBurstLimit'],
-                'ThrottlingRateLimit': config['api']['throttlingRateLimit']
+                'ThrottlingRateLimit': config['api']['throttlingRateLimit'],
+                'ApiUpdateStrategy': config['api'].get('updateStrategy', 'routes'),
+                'ApiRegions': api_regions,
+                'RegionalSubstitutions': config['api'].get('regionalSubstitutions', {}),
+                'RegionalAccessLogGroupArns': config['api'].get('regionalAccessLogGroupArns', {}),
+                'ApiSubstitutions': config['api'].get('substitutions', {}),
+                **integration_properties,
+                **publish_lock_properties
             }
         )
 
@@ -232,25 +383,88 @@ class ApiGatewayDynamicPublishStack(Stack):
         )
 
         # grant HttpApi permission to invoke api lambda function
-        api_gateway_ping_lambda.add_permission(
-            f"Invoke By Orchestrator Gateway Permission",
-            principal=iam.ServicePrincipal("apigateway.amazonaws.com"),
-            action="lambda:InvokeFunction",
-            source_arn=http_api_arn
-        )
+        for integration_lambda in integration_lambdas:
+            integration_lambda.add_permission(
+                f"Invoke By Orchestrator Gateway Permission",
+                principal=iam.ServicePrincipal("apigateway.amazonaws.com"),
+                action="lambda:InvokeFunction",
+                source_arn=http_api_arn
+            )
 
-        api_gateway_greeting_lambda.add_permission(
-            f"Invoke By Orchestrator Gateway Permission",
-            principal=iam.ServicePrincipal("apigateway.amazonaws.com"),
-            action="lambda:InvokeFunction",
-            source_arn=http_api_arn
-        )
+        # grant HttpApi permission to invoke the lambda authorizer
+        if authorizer_lambda_arn:
+            aws_lambda.CfnPermission(
+                self,
+                'ApiAuthorizerInvokePermission',
+                action="lambda:InvokeFunction",
+                function_name=authorizer_lambda_arn,
+                principal="apigateway.amazonaws.com",
+                source_arn=(
+                    f"arn:{self.partition}:execute-api:"
+                    f"{self.region}:{self.account}:"
+                    f"{apigateway_id}/authorizers/*"
+                )
+            )
+
+        # the apis published to the additional regions invoke the same functions
+        for api_region in api_regions:
+            regional_apigateway_id = CustomResource.get_att_string(
+                apicreator_custom_resource,
+                attribute_name=f"ApiId-{api_region}"
+            )
+            regional_http_api_arn = (
+                f"arn:{self.partition}:execute-api:"
+                f"{api_region}:{self.account}:"
+                f"{regional_apigateway_id}/*/*/*"
+            )
+
+            for integration_lambda in integration_lambdas:
+                integration_lambda.add_permission(
+                    f"Invoke By Orchestrator Gateway Permission {api_region}",
+                    principal=iam.ServicePrincipal("apigateway.amazonaws.com"),
+                    action="lambda:InvokeFunction",
+                    source_arn=regional_http_api_arn
+                )
+
+            if authorizer_lambda_arn:
+                aws_lambda.CfnPermission(
+                    self,
+                    f'ApiAuthorizerInvokePermission{api_region}',
+                    action="lambda:InvokeFunction",
+                    function_name=authorizer_lambda_arn,
+                    principal="apigateway.amazonaws.com",
+                    source_arn=(
+                        f"arn:{self.partition}:execute-api:"
+                        f"{api_region}:{self.account}:"
+                        f"{regional_apigateway_id}/authorizers/*"
+                    )
+                )
 
         ##########################################################
         # </END> Create AWS API Gateway permissions
         ##########################################################
 
 
+        ##########################################################
+        # <START> API monitoring
+        ##########################################################
+
+        # dashboard and alarms per route, read from api_definition.yaml
+        ApiMonitoring(
+            self,
+            'ApiMonitoring',
+            api_id=apigateway_id,
+            api_stage_name=config['api']['apiStageName'],
+            integration_functions=integration_functions,
+            access_log_group=api_gateway_access_log_group,
+            alarm_email=config['api'].get('alarmEmail')
+        )
+
+        ##########################################################
+        # </END> API monitoring
+        ##########################################################
+
+
         ##########################################################
         # <START> Stack exports
         ##########################################################
@@ -291,6 +505,13 @@ class ApiGatewayDynamicPublishStack(Stack):
             export_name="api-gateway-dynamic-publish-arn"
         )
     
+        CfnOutput(
+            self, 
+            id="api-gateway-dynamic-publish-endpoints", 
+            value=CustomResource.get_att_string(apicreator_custom_resource, attribute_name='ApiEndpoints'), 
+            export_name="api-gateway-dynamic-publish-endpoints"
+        )
+
         CfnOutput(
             self, 
             id="api-gateway-dynamic-publish-documentation-name", 
@@ -298,6 +519,13 @@ class ApiGatewayDynamicPublishStack(Stack):
             export_name="api-gateway-dynamic-publish-documentation-name"
         )
 
+        CfnOutput(
+            self,
+            id="api-gateway-dynamic-publish-rollback-function",
+            value=apicreator_rollback_lambda.function_name,
+            export_name="api-gateway-dynamic-publish-rollback-function"
+        )
+
         ##########################################################
         # </END> Stack exports
         ##########################################################
@@ -4,58 +4,245 @@
     api_creator.py: 
     Cloudformation custom resource lambda handler which performs the following tasks:
     *   injects lambda functions arns (created during CDK deployment) into the 
-        OpenAPI 3 spec file (api_definition.yaml)
-    *   deploys or updates the API Gateway stage using the OpenAPI 3 spec file (api_definition.yaml)
-    *   deletes the API Gateway stage (if the Cloudformation operation is delete)
+        OpenAPI 3 spec file (api_definition.yaml) and the per-route fragments it references,
+        and stores them as a publish job for is_complete_handler (on_event returns right away)
+    *   deploys or updates the API Gateway stage using the OpenAPI 3 spec file (api_definition.yaml),
+        updates only change the routes and integrations which differ from the deployed api
+    *   deletes the API Gateway api and its stage in every region (if the Cloudformation
+        operation is delete), together with its documentation, manifest and snapshots
+    *   advances the publish job on every is_complete_handler poll of the custom
+        resource provider framework: publishes it, then reports completion once
+        the API and its stage are deployed
+    *   publishes the same API to additional regions (ApiRegions) in parallel with
+        the stack region, optionally with per region placeholder overrides
+    *   validates the authorizers declared in the OpenAPI 3 spec file, their result
+        caching and identity sources are imported with the definition
+    *   stores every deployed definition as a content addressed snapshot in the
+        documentation bucket, rollback_handler redeploys a previous snapshot
+    *   imports a minimal definition without the documentation only fields,
+        the full definition is published as swagger.json
+    *   publishes under a lease (publish_lock.py), concurrent publishers of the
+        same api name are serialised and a publisher of the same work reuses
+        the result of the one holding the lease
 """
 
 import json
 import logging
 import os
+import threading
+import uuid
 
-import boto3
-import yaml
+import spec_bundler
+import spec_store
 
 # set logging
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
-# environment variables
-aws_region = os.environ['AWS_REGION']
+# boto3 clients are created on first use and cached for the lifetime of the
+# execution environment. boto3, botocore and yaml are imported lazily so that
+# cold starts (and Delete events) only pay for what they actually use.
+boto3_session = None
+boto3_clients = {}
+boto3_clients_lock = threading.Lock()
 
-# boto3 clients
-apigateway_client = boto3.client('apigatewayv2')
-s3_client = boto3.client('s3')
+# connection pool and retry settings shared by every client
+client_max_pool_connections = int(os.environ.get('CLIENT_MAX_POOL_CONNECTIONS', '10'))
+client_max_attempts = int(os.environ.get('CLIENT_MAX_ATTEMPTS', '5'))
 
-def replace_placeholders(template_file: str, substitutions: dict) -> str:
-    import re
+def get_aws_region() -> str:
+    return os.environ['AWS_REGION']
 
-    def from_dict(dct):
-        def lookup(match):
-            key = match.group(1)
-            return dct.get(key, f'<{key} not found>')
-        return lookup
 
-    with open (template_file, "r") as template_file:
-        template_data = template_file.read()
+def get_publish_regions(props: dict) -> list:
+    # the stack region always comes first, it owns the documentation and the stack outputs
+    regions = [get_aws_region()]
+    for region_name in props.get('ApiRegions', []):
+        if region_name not in regions:
+            regions.append(region_name)
+
+    return regions
+
+
+def get_client(service_name: str, region_name: str = None):
+    global boto3_session
+
+    # one client (and connection pool) per service and region, the
+    # execution environment region is used when none is given
+    region_name = region_name or os.environ.get('AWS_REGION')
+    client_key = (service_name, region_name)
+    client = boto3_clients.get(client_key)
+    if client is not None:
+        return client
+
+    # boto3 sessions are not thread safe, serialize client creation
+    with boto3_clients_lock:
+        if client_key not in boto3_clients:
+            import boto3
+            from botocore.config import Config
+
+            if boto3_session is None:
+                boto3_session = boto3.session.Session()
+
+            boto3_clients[client_key] = boto3_session.client(
+                service_name,
+                region_name=region_name,
+                config=Config(
+                    max_pool_connections=client_max_pool_connections,
+                    retries={
+                        'max_attempts': client_max_attempts,
+                        'mode': 'standard'
+                    }
+                )
+            )
+
+        return boto3_clients[client_key]
+
+
+def get_apigateway_client(region_name: str = None):
+    return get_client('apigatewayv2', region_name)
+
+
+def get_s3_client():
+    return get_client('s3')
+
+
+def render_api_definition(root_file: str, substitutions: dict) -> dict:
+    # assembles the root definition and its per-route fragments, only changed fragments are re-rendered
+    return spec_bundler.bundle_api_definition(root_file, substitutions)
+
+
+# HTTP API authorizer identity sources are request or context expressions
+authorizer_identity_source_prefixes = ('$request.header.', '$request.querystring.', '$context.', '$stageVariables.')
+
+
+def validate_authorizers(api_definition: dict) -> None:
+    """
+        Checks the authorizers declared in components.securitySchemes
+        (x-amazon-apigateway-authorizer) and the security requirements that
+        reference them before the definition is imported, so that a bad
+        declaration fails the deployment with a clear message instead of an
+        import warning.
+    """
+    security_schemes = api_definition.get('components', {}).get('securitySchemes', {})
+    errors = []
+
+    for scheme_name, scheme in security_schemes.items():
+        authorizer = scheme.get('x-amazon-apigateway-authorizer')
+        if authorizer is None:
+            continue
+
+        authorizer_type = authorizer.get('type')
+        identity_sources = [
+            identity_source.strip()
+            for identity_source in authorizer.get('identitySource', '').split(',')
+            if identity_source.strip()
+        ]
+        ttl = int(authorizer.get('authorizerResultTtlInSeconds', 0))
+
+        for identity_source in identity_sources:
+            if not identity_source.startswith(authorizer_identity_source_prefixes):
+                errors.append(f"{scheme_name}: unsupported identitySource {identity_source}")
+
+        if authorizer_type == 'jwt':
+            if not authorizer.get('jwtConfiguration', {}).get('issuer'):
+                errors.append(f"{scheme_name}: jwt authorizers require jwtConfiguration.issuer")
+            if not identity_sources:
+                errors.append(f"{scheme_name}: jwt authorizers require an identitySource")
+
+        elif authorizer_type == 'request':
+            if not authorizer.get('authorizerUri'):
+                errors.append(f"{scheme_name}: request authorizers require an authorizerUri")
+            if authorizer.get('authorizerPayloadFormatVersion') not in ('1.0', '2.0'):
+                errors.append(f"{scheme_name}: authorizerPayloadFormatVersion must be 1.0 or 2.0")
+            if authorizer.get('enableSimpleResponses') and authorizer.get('authorizerPayloadFormatVersion') != '2.0':
+                errors.append(f"{scheme_name}: enableSimpleResponses requires authorizerPayloadFormatVersion 2.0")
+            if not 0 <= ttl <= 3600:
+                errors.append(f"{scheme_name}: authorizerResultTtlInSeconds must be between 0 and 3600")
+            # cached results are keyed by the identity sources
+            if ttl > 0 and not identity_sources:
+                errors.append(f"{scheme_name}: caching (authorizerResultTtlInSeconds > 0) requires an identitySource")
+
+        else:
+            errors.append(f"{scheme_name}: unsupported authorizer type {authorizer_type}")
+
+    security_requirements = list(api_definition.get('security', []))
+    for path, path_item in api_definition.get('paths', {}).items():
+        for operation in path_item.values():
+            if isinstance(operation, dict):
+                security_requirements.extend(operation.get('security', []))
+
+    for security_requirement in security_requirements:
+        for scheme_name in security_requirement:
+            if scheme_name not in security_schemes:
+                errors.append(f"security requirement references undeclared scheme {scheme_name}")
+
+    if errors:
+        raise ValueError(f"Invalid authorizer declarations: {'; '.join(sorted(set(errors)))}")
+
+
+def lambda_integration_uri(function_arn: str) -> str:
+    # lambda functions are invoked through the apigateway service of the region hosting them
+    function_region = function_arn.split(':')[3] if function_arn.count(':') >= 6 else get_aws_region()
+    return f"arn:aws:apigateway:{function_region}:lambda:path/2015-03-31/functions/{function_arn}/invocations"
+
 
-    # perform the subsitutions, looking for placeholders @@PLACEHOLDER@@
-    api_template = re.sub('@@(.*?)@@', from_dict(substitutions), template_data)
+def build_regional_substitutions(substitutions: dict, regional_substitutions: dict, region_name: str) -> dict:
+    # per region overrides, e.g. a replica of an integration function deployed in that region
+    region_substitutions = dict(substitutions)
+    for placeholder, value in regional_substitutions.get(region_name, {}).items():
+        if value.startswith('arn:') and ':lambda:' in value and ':function:' in value:
+            value = lambda_integration_uri(value)
+        region_substitutions[placeholder] = value
 
-    return api_template
+    return region_substitutions
 
 
-def get_api_by_name(api_name: str) -> str:
-    get_apis = apigateway_client.get_apis()
+def run_in_regions(regions: list, func, *args) -> dict:
+    """
+        Runs func(region_name, *args) for every region concurrently and returns
+        {region_name: result}. Failures are collected for every region before
+        raising, so one failing region does not hide the state of the others.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    results = {}
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+        futures = {region_name: executor.submit(func, region_name, *args) for region_name in regions}
+        for region_name, future in futures.items():
+            try:
+                results[region_name] = future.result()
+            except Exception as e:
+                logger.error(f"Failed in {region_name}: {str(e)}")
+                errors.append(f"{region_name}: {str(e)}")
+
+    if errors:
+        raise ValueError(f"Unexpected error encountered in {len(errors)} of {len(regions)} regions: {'; '.join(errors)}")
+
+    return results
+
+
+def get_api_summary_by_name(api_name: str, region_name: str = None) -> dict:
+    get_apis = get_apigateway_client(region_name).get_apis()
     for api in get_apis['Items']:
         if api['Name'] == api_name:
-            return api['ApiId']
+            return api
+
+    return None
+
+
+def get_api_by_name(api_name: str, region_name: str = None) -> str:
+    api = get_api_summary_by_name(api_name, region_name)
+    if api is not None:
+        return api['ApiId']
 
     return None
 
 
-def create_api(api_template: str) -> str:
-    api_response = apigateway_client.import_api(
+def create_api(api_template: str, region_name: str = None) -> str:
+    api_response = get_apigateway_client(region_name).import_api(
         Body=api_template,
         FailOnWarnings=True
     )
@@ -63,12 +250,12 @@ def create_api(api_template: str) -> str:
     return api_response['ApiEndpoint'], api_response['ApiId']
 
 
-def update_api(api_template: str, api_name: str) -> str:
+def update_api(api_template: str, api_name: str, region_name: str = None) -> str:
     
-    api_id = get_api_by_name(api_name)
+    api_id = get_api_by_name(api_name, region_name)
 
     if api_id is not None:
-        api_response = apigateway_client.reimport_api(
+        api_response = get_apigateway_client(region_name).reimport_api(
             ApiId=api_id,
             Body=api_template,
             FailOnWarnings=True
@@ -76,11 +263,143 @@ def update_api(api_template: str, api_name: str) -> str:
         return api_response['ApiEndpoint'], api_response['ApiId']
 
 
-def delete_api(api_name: str) -> None:
-    if get_api_by_name(api_name) is not None:
-        apigateway_client.delete_api(
-            ApiId=get_api_by_name(api_name)
-        )
+def update_api_routes(plan: list, api: dict, region_name: str = None) -> str:
+    import route_planner
+
+    # only the routes and integrations which differ from the definition are changed
+    logger.info(f"Route update plan for api id {api['ApiId']}:\n{route_planner.format_plan(plan)}")
+    route_planner.apply_plan(get_apigateway_client(region_name), api['ApiId'], plan)
+
+    return api['ApiEndpoint'], api['ApiId']
+
+
+def delete_api(api_name: str, region_name: str = None) -> None:
+    # the stage, routes and integrations are deleted with the api
+    api_id = get_api_by_name(api_name, region_name)
+    if api_id is None:
+        logger.info(f"API {api_name} not found in {region_name or get_aws_region()}, nothing to delete")
+        return
+
+    client = get_apigateway_client(region_name)
+    try:
+        client.delete_api(ApiId=api_id)
+    except client.exceptions.NotFoundException:
+        logger.info(f"API {api_id} already deleted in {region_name or get_aws_region()}")
+
+
+def stage_access_log_settings(api_access_logs_arn: str) -> dict:
+    return {
+        'DestinationArn': api_access_logs_arn,
+        'Format': '$context.identity.sourceIp - - [$context.requestTime] "$context.httpMethod $context.routeKey $context.protocol" $context.status $context.responseLength $context.requestId $context.integrationErrorMessage'
+    }
+
+
+# retention of the access log groups provisioned in additional regions, as for the stack log group
+access_log_retention_days = int(os.environ.get('ACCESS_LOG_RETENTION_DAYS', '14'))
+
+
+def access_log_group_name(log_group_arn: str) -> str:
+    # arn:aws:logs:<region>:<account>:log-group:<name>[:*]
+    log_group_name = log_group_arn.split(':log-group:', 1)[1]
+    return log_group_name[:-2] if log_group_name.endswith(':*') else log_group_name
+
+
+def regional_log_group_arn(log_group_arn: str, region_name: str) -> str:
+    # the log group of the same name in another region
+    arn_parts = log_group_arn.split(':')
+    arn_parts[3] = region_name
+    return ':'.join(arn_parts)
+
+
+def get_access_log_group_arns(props: dict, regions: list) -> dict:
+    """
+        Returns {region: access log group arn}. Stages only deliver access logs
+        to a log group of their own region: the stack log group serves the
+        stack region, additional regions use RegionalAccessLogGroupArns or a
+        log group of the same name provisioned by the api creator.
+    """
+    regional_arns = props.get('RegionalAccessLogGroupArns', {})
+
+    return {
+        region_name: regional_arns.get(region_name)
+        or regional_log_group_arn(props['ApiGatewayAccessLogsLogGroupArn'], region_name)
+        for region_name in regions
+    }
+
+
+def get_provisioned_access_log_regions(props: dict, regions: list) -> list:
+    # additional regions without a log group of their own in RegionalAccessLogGroupArns
+    return [
+        region_name for region_name in regions[1:]
+        if not props.get('RegionalAccessLogGroupArns', {}).get(region_name)
+    ]
+
+
+def get_dropped_regions(event: dict) -> dict:
+    """
+        Regions an Update removed from ApiRegions, as {region: the access log
+        group provisioned for it, None when it used one of its own}.
+    """
+    if event['RequestType'] != 'Update':
+        return {}
+
+    old_props = event.get('OldResourceProperties', {})
+    old_regions = get_publish_regions(old_props)
+    regions = get_publish_regions(event['ResourceProperties'])
+    dropped_regions = [region_name for region_name in old_regions if region_name not in regions]
+    if not dropped_regions:
+        return {}
+
+    provisioned_regions = get_provisioned_access_log_regions(old_props, old_regions)
+    access_log_group_arns = get_access_log_group_arns(old_props, dropped_regions)
+
+    return {
+        region_name: access_log_group_arns[region_name] if region_name in provisioned_regions else None
+        for region_name in dropped_regions
+    }
+
+
+def settings_access_log_group_arn(settings: dict, region_name: str) -> str:
+    # versions recorded before regional log groups only hold the stack region log group
+    return (settings.get('ApiGatewayAccessLogsLogGroupArns', {}).get(region_name)
+            or regional_log_group_arn(settings['ApiGatewayAccessLogsLogGroupArn'], region_name))
+
+
+def ensure_access_log_group(log_group_arn: str, region_name: str) -> None:
+    client = get_client('logs', region_name)
+    log_group_name = access_log_group_name(log_group_arn)
+
+    try:
+        client.create_log_group(logGroupName=log_group_name)
+    except client.exceptions.ResourceAlreadyExistsException:
+        return
+
+    client.put_retention_policy(logGroupName=log_group_name, retentionInDays=access_log_retention_days)
+
+
+def delete_access_log_group(log_group_arn: str, region_name: str) -> None:
+    client = get_client('logs', region_name)
+
+    try:
+        client.delete_log_group(logGroupName=access_log_group_name(log_group_arn))
+    except client.exceptions.ResourceNotFoundException:
+        logger.info(f"Access log group {log_group_arn} already deleted")
+
+
+def delete_from_region(region_name: str, api_name: str, provisioned_access_log_group_arn: str = None) -> None:
+    delete_api(api_name, region_name)
+
+    # the log groups provisioned for additional regions go with the api, as the stack log group does
+    if provisioned_access_log_group_arn:
+        delete_access_log_group(provisioned_access_log_group_arn, region_name)
+
+
+def stage_default_route_settings(throttling_burst_limit: int, throttling_rate_limit: int) -> dict:
+    return {
+        'DetailedMetricsEnabled': True,
+        'ThrottlingBurstLimit':throttling_burst_limit,
+        'ThrottlingRateLimit': throttling_rate_limit
+    }
 
 
 def deploy_api(
@@ -88,44 +407,60 @@ def deploy_api(
         api_stage_name: str,
         api_access_logs_arn: str,
         throttling_burst_limit: int, 
-        throttling_rate_limit: int
+        throttling_rate_limit: int,
+        region_name: str = None
     ) -> None:
-    apigateway_client.create_stage(
-        AccessLogSettings={
-            'DestinationArn': api_access_logs_arn,
-            'Format': '$context.identity.sourceIp - - [$context.requestTime] "$context.httpMethod $context.routeKey $context.protocol" $context.status $context.responseLength $context.requestId $context.integrationErrorMessage'
-        },
+    get_apigateway_client(region_name).create_stage(
+        AccessLogSettings=stage_access_log_settings(api_access_logs_arn),
         ApiId=api_id,
         StageName=api_stage_name,
         AutoDeploy=True,
-        DefaultRouteSettings={
-            'DetailedMetricsEnabled': True,
-            'ThrottlingBurstLimit':throttling_burst_limit,
-            'ThrottlingRateLimit': throttling_rate_limit
-        }
+        DefaultRouteSettings=stage_default_route_settings(throttling_burst_limit, throttling_rate_limit)
     )
 
 
-def delete_api_deployment(api_id: str, api_stage_name: str) -> None:
+def update_api_deployment(
+        api_id: str, 
+        api_stage_name: str,
+        api_access_logs_arn: str,
+        throttling_burst_limit: int, 
+        throttling_rate_limit: int,
+        region_name: str = None
+    ) -> None:
+    # the stage auto deploys route changes, re-apply its settings in place instead of recreating it
+    try:
+        get_apigateway_client(region_name).update_stage(
+            AccessLogSettings=stage_access_log_settings(api_access_logs_arn),
+            ApiId=api_id,
+            StageName=api_stage_name,
+            AutoDeploy=True,
+            DefaultRouteSettings=stage_default_route_settings(throttling_burst_limit, throttling_rate_limit)
+        )
+    except get_apigateway_client(region_name).exceptions.NotFoundException:
+        logger.info(f"Stage name: {api_stage_name} for api id: {api_id} was not found, creating it")
+        deploy_api(api_id, api_stage_name, api_access_logs_arn, throttling_burst_limit, throttling_rate_limit, region_name)
+
+
+def delete_api_deployment(api_id: str, api_stage_name: str, region_name: str = None) -> None:
     try:
-        apigateway_client.get_stage(
+        get_apigateway_client(region_name).get_stage(
             ApiId=api_id,
             StageName=api_stage_name
         )
 
-        apigateway_client.delete_stage(
+        get_apigateway_client(region_name).delete_stage(
             ApiId=api_id,
             StageName=api_stage_name
         )
-    except apigateway_client.exceptions.NotFoundException as e:
+    except get_apigateway_client(region_name).exceptions.NotFoundException as e:
         logger.error(f"Stage name: {api_stage_name} for api id: {api_id} was not found during stage deletion. This is an expected error condition and is handled in code.")
     except Exception as e:
         raise ValueError(f"Unexpected error encountered during api deployment deletion: {str(e)}")
 
 
-def publish_api_documentation(bucket_name: str, api_definition: str)  -> None:
+def publish_api_documentation(bucket_name: str, api_definition: dict)  -> None:
 
-    api_definition_json=json.dumps(yaml.safe_load(api_definition))    
+    api_definition_json=json.dumps(api_definition)
 
     with open("/tmp/swagger.json", "w") as swagger_file:
         swagger_file.write(api_definition_json)
@@ -133,13 +468,294 @@ def publish_api_documentation(bucket_name: str, api_definition: str)  -> None:
     # Upload the file
     try:
 
-        s3_client.upload_file("/tmp/swagger.json", bucket_name, "swagger.json")
+        get_s3_client().upload_file("/tmp/swagger.json", bucket_name, "swagger.json")
 
     except Exception as e:
         logging.error(str(e))
         raise ValueError(str(e))
 
 
+def delete_api_documentation(bucket_name: str, api_name: str, api_stage_name: str) -> None:
+    from botocore.exceptions import ClientError
+
+    # swagger.json, the stage manifest and its snapshots, every version of them
+    try:
+        spec_store.delete_deployment_records(
+            get_s3_client(), bucket_name, api_name, api_stage_name, ["swagger.json"]
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'NoSuchBucket':
+            raise
+        logger.info(f"Documentation bucket {bucket_name} already deleted")
+
+
+def delete_publish_lock(lock_bucket_name: str, api_name: str) -> None:
+    from botocore.exceptions import ClientError
+
+    import publish_lock
+
+    # the lease lives in the bucket the publishers use, which may be shared with other stacks
+    try:
+        publish_lock.delete_lock(get_s3_client(), lock_bucket_name, api_name)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'NoSuchBucket':
+            raise
+        logger.info(f"Publish lock bucket {lock_bucket_name} already deleted")
+
+
+def get_stage_deployment_id(api_id: str, api_stage_name: str, region_name: str = None) -> str:
+    # the deployment the stage serves before a change, '' when there is none yet
+    client = get_apigateway_client(region_name)
+    try:
+        return client.get_stage(ApiId=api_id, StageName=api_stage_name).get('DeploymentId', '')
+    except client.exceptions.NotFoundException:
+        return ''
+
+
+def get_deployment_status(api_id: str, api_stage_name: str, region_name: str = None, previous_deployment_id: str = '') -> str:
+    """
+        Status of the deployment published after previous_deployment_id (the
+        one the stage served before the update, '' when any deployment will
+        do). Raises when that deployment failed.
+    """
+    client = get_apigateway_client(region_name)
+    try:
+        stage = client.get_stage(
+            ApiId=api_id,
+            StageName=api_stage_name
+        )
+    except client.exceptions.NotFoundException:
+        return 'PENDING'
+
+    # auto deployed stages only reference a deployment once it succeeded
+    deployment_id = stage.get('DeploymentId')
+    if deployment_id is not None and deployment_id != previous_deployment_id:
+        deployment = client.get_deployment(
+            ApiId=api_id,
+            DeploymentId=deployment_id
+        )
+
+        if deployment.get('DeploymentStatus') == 'FAILED':
+            raise ValueError(f"Deployment {deployment_id} of stage {api_stage_name} for api id {api_id} failed: {deployment.get('DeploymentStatusMessage')}")
+
+        if deployment.get('DeploymentStatus') == 'DEPLOYED':
+            return 'DEPLOYED'
+
+    # the stage still serves the previous deployment, a newer one which failed never becomes current
+    deployments = [
+        deployment
+        for page in client.get_paginator('get_deployments').paginate(ApiId=api_id)
+        for deployment in page['Items']
+    ]
+    previous = next((deployment for deployment in deployments if deployment['DeploymentId'] == previous_deployment_id), None)
+    for deployment in sorted(deployments, key=lambda deployment: deployment['CreatedDate'], reverse=True):
+        if previous is not None and deployment['CreatedDate'] <= previous['CreatedDate']:
+            break
+        if deployment.get('DeploymentStatus') == 'FAILED':
+            raise ValueError(f"Deployment {deployment['DeploymentId']} of stage {api_stage_name} for api id {api_id} failed: {deployment.get('DeploymentStatusMessage')}")
+
+    return 'PENDING'
+
+
+def publish_region(
+        region_name: str,
+        api_definition: dict,
+        api_name: str,
+        api_stage_name: str,
+        api_access_logs_arn: str,
+        throttling_burst_limit: int,
+        throttling_rate_limit: int,
+        api_update_strategy: str,
+        previous_definition: dict = None
+    ) -> tuple:
+    """
+        Returns (endpoint, api id, previous deployment id): the deployment the
+        stage served before route level changes, which is_complete waits to
+        be replaced. '' when the stage is (re)created and any deployment will do.
+    """
+    # the documentation only fields are published with swagger.json, not imported
+    api_definition = spec_bundler.import_definition(api_definition)
+    api_template = json.dumps(api_definition)
+    if previous_definition is not None:
+        previous_definition = spec_bundler.import_definition(previous_definition)
+
+    api = get_api_summary_by_name(api_name, region_name)
+
+    if api is None:
+
+        logger.debug(f"Creating API in {region_name}")
+
+        api_endpoint, api_id = create_api(api_template, region_name)
+
+        deploy_api(api_id, api_stage_name, api_access_logs_arn, throttling_burst_limit, throttling_rate_limit, region_name)
+
+        return api_endpoint, api_id, ''
+
+    logger.debug(f"Updating API in {region_name}")
+
+    import route_planner
+
+    # anything the route planner does not model falls back to a full reimport
+    if api_update_strategy == 'routes' and not route_planner.requires_reimport(api_definition, previous_definition):
+
+        plan = route_planner.plan_api_update(get_apigateway_client(region_name), api['ApiId'], api_definition)
+
+        if not route_planner.plan_requires_reimport(plan):
+
+            # route changes are auto deployed, the stage keeps serving this deployment until then
+            previous_deployment_id = get_stage_deployment_id(api['ApiId'], api_stage_name, region_name) if plan else ''
+
+            api_endpoint, api_id = update_api_routes(plan, api, region_name)
+
+            update_api_deployment(api_id, api_stage_name, api_access_logs_arn, throttling_burst_limit, throttling_rate_limit, region_name)
+
+            return api_endpoint, api_id, previous_deployment_id
+
+    api_endpoint, api_id = update_api(api_template, api_name, region_name)
+
+    # delete and redeploy the stage after updating the api definition
+    delete_api_deployment(api_id, api_stage_name, region_name)
+    deploy_api(api_id, api_stage_name, api_access_logs_arn, throttling_burst_limit, throttling_rate_limit, region_name)
+
+    return api_endpoint, api_id, ''
+
+
+def publish_job(job: dict) -> dict:
+    """
+        Publishes the definitions of a publish job to every region, then its
+        documentation and the stage manifest. Returns
+        {region_name: (endpoint, api id, previous deployment id)}.
+    """
+    api_name = job['ApiName']
+    api_stage_name = job['ApiStageName']
+    api_documentation_bucket_name = job['ApiDocumentationBucketName']
+    settings = job['Settings']
+    regions = job['Regions']
+
+    logger.debug(f"{job['RequestType']} API in {', '.join(regions)}")
+
+    # the previously deployed definitions tell which unmodelled parts of the definition changed
+    s3_client = get_s3_client()
+    manifest = spec_store.read_manifest(s3_client, api_documentation_bucket_name, api_name, api_stage_name)
+    previous_definitions = spec_store.load_current_snapshots(s3_client, api_documentation_bucket_name, manifest)
+
+    def publish_to_region(region_name: str) -> tuple:
+        if region_name in job['ProvisionedAccessLogRegions']:
+            ensure_access_log_group(settings_access_log_group_arn(settings, region_name), region_name)
+
+        return publish_region(
+            region_name,
+            job['Definitions'][region_name],
+            api_name,
+            api_stage_name,
+            settings_access_log_group_arn(settings, region_name),
+            settings['ThrottlingBurstLimit'],
+            settings['ThrottlingRateLimit'],
+            settings['ApiUpdateStrategy'],
+            previous_definitions.get(region_name)
+        )
+
+    published = run_in_regions(regions, publish_to_region)
+
+    publish_api_documentation(api_documentation_bucket_name, job['Definitions'][regions[0]])
+
+    # regions removed from ApiRegions are torn down once the remaining ones are published,
+    # a stack delete only knows the current regions
+    dropped_regions = job.get('DroppedRegions', {})
+    if dropped_regions:
+        logger.debug(f"Deleting API in {', '.join(dropped_regions)}, no longer published there")
+        run_in_regions(
+            list(dropped_regions),
+            lambda region_name: delete_from_region(region_name, api_name, dropped_regions[region_name])
+        )
+
+    spec_store.record_deployment(
+        s3_client,
+        api_documentation_bucket_name,
+        api_name,
+        api_stage_name,
+        job['Definitions'],
+        settings,
+        api_ids={region_name: api_id for region_name, (_, api_id, _) in published.items()},
+        manifest=manifest
+    )
+
+    return published
+
+
+def is_region_deployed(region_name: str, job: dict) -> bool:
+    _, api_id, previous_deployment_id = job['Published'][region_name]
+
+    deployment_status = get_deployment_status(api_id, job['ApiStageName'], region_name, previous_deployment_id)
+    logger.info(f"Stage name: {job['ApiStageName']} for api id: {api_id} in {region_name} deployment status: {deployment_status}")
+
+    return deployment_status == 'DEPLOYED'
+
+
+def advance_publish_job(job: dict) -> bool:
+    """
+        One is_complete poll of a publish job. Until the job is published it
+        makes one attempt at the publish lease: publishes once acquired, or
+        reuses the result of the holder publishing the same work once it
+        released the lease (the owner is the job token). Then checks the stage
+        deployment in every region. Returns True once it is deployed everywhere.
+    """
+    import publish_lock
+
+    s3_client = get_s3_client()
+
+    if job['State'] == 'Publishing':
+        step = publish_lock.acquire_step(
+            s3_client, job['PublishLockBucketName'], job['ApiName'], job['WorkDigest'], job['Token'], job.get('Awaited')
+        )
+
+        if step['State'] == 'Waiting':
+            # polled again after the query interval, nothing sleeps in the meantime
+            if step['Awaited'] != job.get('Awaited'):
+                job['Awaited'] = step['Awaited']
+                spec_store.write_job(s3_client, job['ApiDocumentationBucketName'], job)
+            return False
+
+        if step['State'] == 'Reused':
+            job['Published'] = step['Result']
+        else:
+            job['Published'] = publish_lock.run_holding(
+                s3_client, job['PublishLockBucketName'], job['ApiName'], step['Lease'], step['ETag'],
+                lambda: {region_name: list(result) for region_name, result in publish_job(job).items()}
+            )
+        job['State'] = 'Deploying'
+
+        region_status = run_in_regions(job['Regions'], is_region_deployed, job)
+
+        # the following polls only check the deployment, a completed job is not polled again
+        if not all(region_status.values()):
+            spec_store.write_job(s3_client, job['ApiDocumentationBucketName'], job)
+
+        return all(region_status.values())
+
+    region_status = run_in_regions(job['Regions'], is_region_deployed, job)
+
+    return all(region_status.values())
+
+
+def publish_job_output(job: dict) -> dict:
+    # the custom resource attributes, merged into the on_event data once the job completed
+    api_endpoint, api_id, _ = job['Published'][job['Regions'][0]]
+
+    output = {
+        'ApiEndpoint': api_endpoint,
+        'ApiId': api_id,
+        'ApiStageName': job['ApiStageName'],
+        'ApiEndpoints': json.dumps({region_name: endpoint for region_name, (endpoint, _, _) in job['Published'].items()})
+    }
+
+    for region_name, (regional_api_endpoint, regional_api_id, _) in job['Published'].items():
+        output[f"ApiEndpoint-{region_name}"] = regional_api_endpoint
+        output[f"ApiId-{region_name}"] = regional_api_id
+
+    return output
+
+
 def lambda_handler(event, context):
     
     # print the event details
@@ -147,83 +763,259 @@ def lambda_handler(event, context):
 
     props = event['ResourceProperties']
     api_gateway_access_log_group_arn = props['ApiGatewayAccessLogsLogGroupArn']
-    api_integration_ping_lambda = props['ApiIntegrationPingLambda']
-    api_integration_greetings_lambda = props['ApiIntegrationGreetingLambda']
+    # in router mode every operation is served by the same function
+    api_integration_router_lambda = props.get('ApiIntegrationRouterLambda')
+    api_integration_ping_lambda = api_integration_router_lambda or props['ApiIntegrationPingLambda']
+    api_integration_greetings_lambda = api_integration_router_lambda or props['ApiIntegrationGreetingLambda']
     api_name = props['ApiName']
     api_stage_name = props['ApiStageName']
     api_documentation_bucket_name = props['ApiDocumentationBucketName']
     throttling_burst_limit = int(props['ThrottlingBurstLimit'])
     throttling_rate_limit = int(props['ThrottlingRateLimit'])
+    api_update_strategy = props.get('ApiUpdateStrategy', 'routes')
+    regional_substitutions = props.get('RegionalSubstitutions', {})
+    api_authorizer_lambda = props.get('ApiAuthorizerLambda')
 
-    lambda_substitutions = {
-        "API_NAME": api_name,
-        "API_INTEGRATION_PING_LAMBDA": f"arn:aws:apigateway:{aws_region}:lambda:path/2015-03-31/functions/{api_integration_ping_lambda}/invocations",
-        "API_INTEGRATION_GREETING_LAMBDA": f"arn:aws:apigateway:{aws_region}:lambda:path/2015-03-31/functions/{api_integration_greetings_lambda}/invocations"
-    }
-
-    api_template = replace_placeholders("api_definition.yaml", lambda_substitutions)
+    regions = get_publish_regions(props)
+    access_log_group_arns = get_access_log_group_arns(props, regions)
+    provisioned_access_log_regions = get_provisioned_access_log_regions(props, regions)
 
     if event['RequestType'] != 'Delete':
 
-        if get_api_by_name(api_name) is None:
-
-            logger.debug("Creating API")
+        # additional placeholder values from cdk.json, e.g. the issuer of a jwt authorizer
+        lambda_substitutions = dict(props.get('ApiSubstitutions', {}))
+        lambda_substitutions.update({
+            "API_NAME": api_name,
+            "API_INTEGRATION_PING_LAMBDA": lambda_integration_uri(api_integration_ping_lambda),
+            "API_INTEGRATION_GREETING_LAMBDA": lambda_integration_uri(api_integration_greetings_lambda)
+        })
+
+        if api_authorizer_lambda:
+            lambda_substitutions["API_AUTHORIZER_LAMBDA"] = lambda_integration_uri(api_authorizer_lambda)
+
+        # the definition is only rendered for events that create or update the api,
+        # unchanged fragments are served from the cache for the additional regions
+        api_definitions = {
+            region_name: render_api_definition(
+                "api_definition.yaml",
+                build_regional_substitutions(lambda_substitutions, regional_substitutions, region_name)
+            )
+            for region_name in regions
+        }
 
-            api_endpoint, api_id = create_api(api_template)
+        for api_definition in api_definitions.values():
+            validate_authorizers(api_definition)
 
-            deploy_api(api_id, api_stage_name, api_gateway_access_log_group_arn, throttling_burst_limit, throttling_rate_limit)
+        settings = {
+            'ApiGatewayAccessLogsLogGroupArn': api_gateway_access_log_group_arn,
+            'ApiGatewayAccessLogsLogGroupArns': access_log_group_arns,
+            'ThrottlingBurstLimit': throttling_burst_limit,
+            'ThrottlingRateLimit': throttling_rate_limit,
+            'ApiUpdateStrategy': api_update_strategy
+        }
 
-            publish_api_documentation(api_documentation_bucket_name, api_template)
+        # the publish itself runs in is_complete_handler, on_event only hands the rendered definitions over
+        job = {
+            'Token': str(uuid.uuid4()),
+            'RequestType': event['RequestType'],
+            'ApiName': api_name,
+            'ApiStageName': api_stage_name,
+            'ApiDocumentationBucketName': api_documentation_bucket_name,
+            'PublishLockBucketName': props.get('PublishLockBucketName') or api_documentation_bucket_name,
+            'Regions': regions,
+            'ProvisionedAccessLogRegions': provisioned_access_log_regions,
+            'DroppedRegions': get_dropped_regions(event),
+            'Definitions': api_definitions,
+            'Settings': settings,
+            # publishers of the same work reuse the result of the one holding the lease
+            'WorkDigest': spec_store.snapshot_digest({'Definitions': api_definitions, 'Settings': settings, 'StageName': api_stage_name}),
+            'State': 'Publishing'
+        }
+        spec_store.write_job(get_s3_client(), api_documentation_bucket_name, job)
 
-            output = {
-                'PhysicalResourceId': f"generated-api",
-                'Data': {
-                    'ApiEndpoint': api_endpoint,
-                    'ApiId': api_id,
-                    'ApiStageName': api_stage_name
-                }
+        output = {
+            'PhysicalResourceId': f"generated-api",
+            'Data': {
+                'PublishToken': job['Token']
             }
-            
-            return output
-
-        else:
-
-            logger.debug("Updating API")
-
-            api_endpoint, api_id = update_api(api_template, api_name)
-
-            # delete and redeploy the stage after updating the api definition
-            delete_api_deployment(api_id, api_stage_name)
-            deploy_api(api_id, api_stage_name, api_gateway_access_log_group_arn, throttling_burst_limit, throttling_rate_limit)
-
-            publish_api_documentation(api_documentation_bucket_name, api_template)
+        }
+        logger.info(output)
 
-            output = {
-                'PhysicalResourceId': f"generated-api",
-                'Data': {
-                    'ApiEndpoint': api_endpoint,
-                    'ApiId': api_id,
-                    'ApiStageName': api_stage_name
-                }
-            }
-        
         return output
 
     if event['RequestType'] == 'Delete':
 
-        logger.debug("Deleting API")
-
-        if get_api_by_name(api_name) is not None:
-            delete_api(api_name)
+        logger.debug(f"Deleting API in {', '.join(regions)}")
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # the documentation and the publish lease are deleted while the api is deleted in every region
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            documentation_deleted = executor.submit(
+                delete_api_documentation, api_documentation_bucket_name, api_name, api_stage_name
+            )
+            lock_deleted = executor.submit(
+                delete_publish_lock, props.get('PublishLockBucketName') or api_documentation_bucket_name, api_name
+            )
+            run_in_regions(
+                regions,
+                lambda region_name: delete_from_region(
+                    region_name,
+                    api_name,
+                    access_log_group_arns[region_name] if region_name in provisioned_access_log_regions else None
+                )
+            )
+            documentation_deleted.result()
+            lock_deleted.result()
 
         output = {
             'PhysicalResourceId': f"generated-api",
             'Data': {
                 'ApiEndpoint': "Deleted",
                 'ApiId': "Deleted",
-                'ApiStageName': "Deleted"
+                'ApiStageName': "Deleted",
+                'ApiEndpoints': "Deleted"
             }
         }
         logger.info(output)
         
         return output
+
+
+def rollback_handler(event, context):
+    """
+        Redeploys a previously deployed definition straight from its snapshot,
+        without re-rendering the definition or running a stack update. Invoked
+        directly, e.g. aws lambda invoke --payload '{"Digest": "3f2a"}'.
+        Without a Digest the most recent version before the current one is used.
+    """
+
+    # print the event details
+    logger.debug(json.dumps(event, indent=2))
+
+    api_name = event.get('ApiName', os.environ.get('API_NAME'))
+    api_stage_name = event.get('ApiStageName', os.environ.get('API_STAGE_NAME'))
+    api_documentation_bucket_name = event.get('ApiDocumentationBucketName', os.environ.get('API_DOCUMENTATION_BUCKET_NAME'))
+
+    s3_client = get_s3_client()
+    manifest = spec_store.read_manifest(s3_client, api_documentation_bucket_name, api_name, api_stage_name)
+    version = spec_store.select_rollback_version(manifest, event.get('Digest'))
+    settings = version['Settings']
+
+    logger.info(f"Rolling back stage {api_stage_name} of {api_name} from {manifest['Current']} to {version['Digest']}")
+
+    api_definitions = {
+        region_name: spec_store.load_snapshot(s3_client, api_documentation_bucket_name, digest)
+        for region_name, digest in version['Snapshots'].items()
+    }
+
+    def publish() -> dict:
+        # the manifest is read again under the lease, another publisher may have changed it
+        current_manifest = spec_store.read_manifest(s3_client, api_documentation_bucket_name, api_name, api_stage_name)
+        previous_definitions = spec_store.load_current_snapshots(s3_client, api_documentation_bucket_name, current_manifest)
+
+        published = run_in_regions(
+            list(api_definitions),
+            lambda region_name: publish_region(
+                region_name,
+                api_definitions[region_name],
+                api_name,
+                api_stage_name,
+                settings_access_log_group_arn(settings, region_name),
+                settings['ThrottlingBurstLimit'],
+                settings['ThrottlingRateLimit'],
+                settings['ApiUpdateStrategy'],
+                previous_definitions.get(region_name)
+            )
+        )
+
+        publish_api_documentation(api_documentation_bucket_name, next(iter(api_definitions.values())))
+
+        spec_store.record_deployment(
+            s3_client,
+            api_documentation_bucket_name,
+            api_name,
+            api_stage_name,
+            api_definitions,
+            settings,
+            api_ids={region_name: api_id for region_name, (_, api_id, _) in published.items()},
+            rolled_back_from=manifest['Current'],
+            manifest=current_manifest
+        )
+
+        return published
+
+    import publish_lock
+
+    # invoked directly, nothing polls a rollback: it does not wait for the lease held by another publisher
+    lock_bucket_name = event.get('PublishLockBucketName', os.environ.get('PUBLISH_LOCK_BUCKET_NAME')) or api_documentation_bucket_name
+    step = publish_lock.acquire_step(
+        s3_client,
+        lock_bucket_name,
+        api_name,
+        spec_store.snapshot_digest({'Definitions': api_definitions, 'Settings': settings, 'StageName': api_stage_name}),
+        str(uuid.uuid4())
+    )
+    if step['State'] != 'Acquired':
+        raise ValueError(f"Publish lease of {api_name} is held by {step['Holder']}, retry the rollback once it is released")
+
+    published = publish_lock.run_holding(
+        s3_client, lock_bucket_name, api_name, step['Lease'], step['ETag'],
+        lambda: {region_name: list(result) for region_name, result in publish().items()}
+    )
+
+    return {
+        'Digest': version['Digest'],
+        'RolledBackFrom': manifest['Current'],
+        'ApiIds': {region_name: api_id for region_name, (_, api_id, _) in published.items()}
+    }
+
+
+def is_region_deleted(region_name: str, event: dict) -> bool:
+
+    return get_api_by_name(event['ResourceProperties']['ApiName'], region_name) is None
+
+
+def is_complete_handler(event, context):
+    """
+        Invoked by the custom resource provider framework every query interval
+        after lambda_handler (on_event) has returned, until the api and its
+        stage are ready in every region. The on_event output (PhysicalResourceId
+        and Data) is merged into the event, the publish job it names carries
+        the progress from one poll to the next.
+    """
+
+    # print the event details
+    logger.debug(json.dumps(event, indent=2))
+
+    props = event['ResourceProperties']
+
+    if event['RequestType'] == 'Delete':
+
+        region_status = run_in_regions(get_publish_regions(props), is_region_deleted, event)
+
+        return {
+            'IsComplete': all(region_status.values())
+        }
+
+    s3_client = get_s3_client()
+    job = spec_store.read_job(s3_client, props['ApiDocumentationBucketName'], props['ApiName'], event['Data']['PublishToken'])
+
+    try:
+        complete = advance_publish_job(job)
+    except Exception:
+        # the provider fails the resource, the job is not polled again
+        spec_store.delete_job(s3_client, props['ApiDocumentationBucketName'], props['ApiName'], job['Token'])
+        raise
+
+    if not complete:
+        return {
+            'IsComplete': False
+        }
+
+    spec_store.delete_job(s3_client, props['ApiDocumentationBucketName'], props['ApiName'], job['Token'])
+
+    return {
+        'IsComplete': True,
+        'Data': publish_job_output(job)
+    }
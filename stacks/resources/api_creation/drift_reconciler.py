@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+
+"""
+    drift_reconciler.py:
+    Scheduled lambda handler which detects out of band changes (for example
+    console edits) to the published API, in every region it was published to.
+    *   the deployed routes are read with a single export_api call and the stage
+        with a single get_stage call, both are normalized and their hashes
+        compared with the current snapshot and stage settings recorded by
+        spec_store.py
+    *   drift is reported as CloudWatch metrics (embedded metric format, so
+        reporting costs no additional API calls), for every region: a missing
+        api is reported as drift and a region which fails to reconcile is
+        reported before the handler fails
+    *   optionally (DRIFT_SELF_HEAL) only the drifted parts are re-applied:
+        a route level plan for the routes and update_stage for the stage,
+        under the publish lease and only if the drifted version is still
+        current, healing is skipped while a publisher holds the lease
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+import api_creator
+import spec_bundler
+import spec_store
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+# environment variables
+drift_metrics_namespace = os.environ.get('DRIFT_METRICS_NAMESPACE', 'ApiGatewayDynamicPublish')
+drift_self_heal = os.environ.get('DRIFT_SELF_HEAL', 'false').lower() == 'true'
+
+# snapshots are content addressed and never change, keep them for the lifetime of the execution environment
+snapshot_cache = {}
+
+
+def normalized_hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def normalize_routes(api_definition: dict, reference_routes: dict = None) -> dict:
+    """
+        Reduces a definition to {route key: integration and operation name}.
+        Exported definitions carry defaults the published one omits (such as
+        timeoutInMillis), so integrations are projected onto the attributes
+        declared by the reference routes.
+    """
+    import route_planner
+
+    routes = route_planner.desired_routes(api_definition)
+    if reference_routes is None:
+        return routes
+
+    for route_key, route in routes.items():
+        # a route without a target has nothing to project
+        if route_key in reference_routes and None not in (route['Integration'], reference_routes[route_key]['Integration']):
+            declared = reference_routes[route_key]['Integration']
+            route['Integration'] = {
+                attribute: value
+                for attribute, value in route['Integration'].items()
+                if attribute in declared
+            }
+
+    return routes
+
+
+def expected_stage(settings: dict, region_name: str) -> dict:
+    return {
+        'AccessLogSettings': api_creator.stage_access_log_settings(api_creator.settings_access_log_group_arn(settings, region_name)),
+        'DefaultRouteSettings': normalize_route_settings(
+            api_creator.stage_default_route_settings(settings['ThrottlingBurstLimit'], settings['ThrottlingRateLimit'])
+        ),
+        'RouteSettings': []
+    }
+
+
+def normalize_route_settings(route_settings: dict) -> dict:
+    return {
+        'DetailedMetricsEnabled': route_settings.get('DetailedMetricsEnabled', False),
+        'ThrottlingBurstLimit': route_settings.get('ThrottlingBurstLimit'),
+        'ThrottlingRateLimit': float(route_settings['ThrottlingRateLimit']) if 'ThrottlingRateLimit' in route_settings else None
+    }
+
+
+def normalize_stage(stage: dict) -> dict:
+    access_log_settings = stage.get('AccessLogSettings', {})
+    return {
+        'AccessLogSettings': {
+            'DestinationArn': access_log_settings.get('DestinationArn'),
+            'Format': access_log_settings.get('Format')
+        },
+        'DefaultRouteSettings': normalize_route_settings(stage.get('DefaultRouteSettings', {})),
+        # per route overrides are never published, any of them is drift
+        'RouteSettings': sorted(stage.get('RouteSettings', {}))
+    }
+
+
+def load_snapshot(bucket_name: str, digest: str) -> dict:
+    if digest not in snapshot_cache:
+        snapshot_cache[digest] = spec_store.load_snapshot(api_creator.get_s3_client(), bucket_name, digest)
+
+    return snapshot_cache[digest]
+
+
+def export_api_definition(client, api_id: str) -> dict:
+    response = client.export_api(
+        ApiId=api_id,
+        OutputType='JSON',
+        Specification='OAS30',
+        IncludeExtensions=True
+    )
+
+    return json.loads(response['body'].read())
+
+
+def detect_drift(region_name: str, api_id: str, api_stage_name: str, snapshot: dict, settings: dict) -> dict:
+    client = api_creator.get_apigateway_client(region_name)
+
+    expected_routes = normalize_routes(snapshot)
+    deployed_routes = normalize_routes(export_api_definition(client, api_id), expected_routes)
+
+    drift = {'Api': [], 'Routes': [], 'Stage': []}
+
+    if normalized_hash(deployed_routes) != normalized_hash(expected_routes):
+        drift['Routes'] = sorted(
+            route_key
+            for route_key in set(expected_routes) | set(deployed_routes)
+            if expected_routes.get(route_key) != deployed_routes.get(route_key)
+        )
+
+    try:
+        stage = client.get_stage(ApiId=api_id, StageName=api_stage_name)
+    except client.exceptions.NotFoundException:
+        stage = None
+
+    if stage is None:
+        drift['Stage'] = ['Missing']
+    else:
+        stage_settings = normalize_stage(stage)
+        expected_stage_settings = expected_stage(settings, region_name)
+        if normalized_hash(stage_settings) != normalized_hash(expected_stage_settings):
+            drift['Stage'] = sorted(
+                attribute
+                for attribute, value in expected_stage_settings.items()
+                if stage_settings[attribute] != value
+            )
+            drift['RouteSettings'] = stage_settings['RouteSettings']
+
+    return drift
+
+
+def heal_drift(region_name: str, api_id: str, api_stage_name: str, snapshot: dict, settings: dict, drift: dict) -> None:
+    import route_planner
+
+    client = api_creator.get_apigateway_client(region_name)
+
+    if drift['Routes']:
+        # route drift never involves the unmodelled parts of the snapshot, they were deployed with it
+        plan = None
+        if not route_planner.requires_reimport(snapshot, snapshot):
+            plan = route_planner.plan_api_update(client, api_id, snapshot)
+
+        if plan is None or route_planner.plan_requires_reimport(plan):
+            client.reimport_api(ApiId=api_id, Body=json.dumps(spec_bundler.import_definition(snapshot)), FailOnWarnings=True)
+        else:
+            logger.info(f"Drift repair plan for api id {api_id} in {region_name}:\n{route_planner.format_plan(plan)}")
+            route_planner.apply_plan(client, api_id, plan)
+
+    if drift['Stage'] == ['Missing']:
+        api_creator.deploy_api(
+            api_id,
+            api_stage_name,
+            api_creator.settings_access_log_group_arn(settings, region_name),
+            settings['ThrottlingBurstLimit'],
+            settings['ThrottlingRateLimit'],
+            region_name
+        )
+    elif drift['Stage']:
+        api_creator.update_api_deployment(
+            api_id,
+            api_stage_name,
+            api_creator.settings_access_log_group_arn(settings, region_name),
+            settings['ThrottlingBurstLimit'],
+            settings['ThrottlingRateLimit'],
+            region_name
+        )
+        for route_key in drift.get('RouteSettings', []):
+            client.delete_route_settings(ApiId=api_id, RouteKey=route_key, StageName=api_stage_name)
+
+
+def emit_drift_metrics(api_name: str, api_stage_name: str, region_name: str, drift: dict, healed: bool) -> None:
+    # embedded metric format, extracted from the log line by CloudWatch
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': drift_metrics_namespace,
+                'Dimensions': [['ApiName', 'ApiStageName', 'Region']],
+                'Metrics': [
+                    {'Name': 'ApiDrift', 'Unit': 'Count'},
+                    {'Name': 'RouteDrift', 'Unit': 'Count'},
+                    {'Name': 'StageDrift', 'Unit': 'Count'},
+                    {'Name': 'DriftHealed', 'Unit': 'Count'},
+                    {'Name': 'ReconcileErrors', 'Unit': 'Count'}
+                ]
+            }]
+        },
+        'ApiName': api_name,
+        'ApiStageName': api_stage_name,
+        'Region': region_name,
+        'ApiDrift': len(drift['Api']),
+        'RouteDrift': len(drift['Routes']),
+        'StageDrift': len(drift['Stage']),
+        'DriftHealed': 1 if healed else 0,
+        'ReconcileErrors': 1 if 'Error' in drift else 0,
+        'DriftedRoutes': drift['Routes'],
+        'DriftedStageSettings': drift['Stage']
+    }))
+
+
+def reconcile_region(region_name: str, api_name: str, api_stage_name: str, bucket_name: str, version: dict) -> dict:
+    """
+        Returns the drift of the region ({Api, Routes, Stage}) with its ApiId
+        and Drifted. An api deleted out of band (or replaced, the recorded id
+        no longer exists) is drift of the whole api, Api: ['Missing'].
+    """
+    client = api_creator.get_apigateway_client(region_name)
+    missing = {'Api': ['Missing'], 'Routes': [], 'Stage': [], 'ApiId': None, 'Drifted': True}
+
+    api_id = version.get('ApiIds', {}).get(region_name) or api_creator.get_api_by_name(api_name, region_name)
+    if api_id is None:
+        logger.warning(f"Drift detected in {region_name}: API {api_name} was not found")
+        return missing
+
+    snapshot = load_snapshot(bucket_name, version['Snapshots'][region_name])
+
+    try:
+        drift = detect_drift(region_name, api_id, api_stage_name, snapshot, version['Settings'])
+    except client.exceptions.NotFoundException:
+        logger.warning(f"Drift detected in {region_name}: api id {api_id} of {api_name} was not found")
+        return missing
+
+    drifted = bool(drift['Routes'] or drift['Stage'])
+    if drifted:
+        logger.warning(f"Drift detected for api id {api_id} in {region_name}: {json.dumps(drift)}")
+
+    return dict(drift, ApiId=api_id, Drifted=drifted)
+
+
+def reconcile_or_report(region_name: str, api_name: str, api_stage_name: str, bucket_name: str, version: dict) -> dict:
+    # a failing region is reported with the others instead of hiding their metrics
+    try:
+        return reconcile_region(region_name, api_name, api_stage_name, bucket_name, version)
+    except Exception as e:
+        logger.error(f"Unable to reconcile {region_name}: {str(e)}")
+        return {'Api': [], 'Routes': [], 'Stage': [], 'ApiId': None, 'Drifted': False, 'Error': str(e)}
+
+
+def heal_regions(api_name: str, api_stage_name: str, bucket_name: str, lock_bucket_name: str, version: dict, drifted: dict) -> bool:
+    """
+        Re-applies the version to the drifted regions ({region: drift}) under
+        the publish lease. Returns False when a publisher holds the lease or a
+        newer version was published since the drift was detected.
+    """
+    import publish_lock
+
+    def heal() -> bool:
+        # a publish may have completed between the detection and the lease
+        manifest = spec_store.read_manifest(api_creator.get_s3_client(), bucket_name, api_name, api_stage_name)
+        # a settings only version (throttle_tuner --apply) keeps the digest
+        if spec_store.current_version(manifest) != version:
+            logger.info(f"Version {version['Digest']} of stage {api_stage_name} is no longer current, not healing")
+            return False
+
+        api_creator.run_in_regions(
+            list(drifted),
+            lambda region_name: heal_drift(
+                region_name,
+                drifted[region_name]['ApiId'],
+                api_stage_name,
+                load_snapshot(bucket_name, version['Snapshots'][region_name]),
+                version['Settings'],
+                drifted[region_name]
+            )
+        )
+        return True
+
+    # a distinct work digest, publishers waiting for the lease never reuse the result of a heal
+    acquired, healed = publish_lock.run_if_free(
+        api_creator.get_s3_client(), lock_bucket_name, api_name, f"drift-heal-{version['Digest']}", heal
+    )
+
+    return acquired and healed
+
+
+def lambda_handler(event, context):
+
+    # print the event details
+    logger.debug(json.dumps(event, indent=2))
+
+    api_name = os.environ['API_NAME']
+    api_stage_name = os.environ['API_STAGE_NAME']
+    bucket_name = os.environ['API_DOCUMENTATION_BUCKET_NAME']
+    lock_bucket_name = os.environ.get('PUBLISH_LOCK_BUCKET_NAME') or bucket_name
+
+    manifest = spec_store.read_manifest(api_creator.get_s3_client(), bucket_name, api_name, api_stage_name)
+    version = spec_store.current_version(manifest)
+    if version is None:
+        logger.info(f"No deployment recorded for stage {api_stage_name} of {api_name}, nothing to reconcile")
+        return {'Digest': None, 'Regions': {}}
+
+    regions = api_creator.run_in_regions(
+        list(version['Snapshots']),
+        reconcile_or_report,
+        api_name,
+        api_stage_name,
+        bucket_name,
+        version
+    )
+
+    # a missing api is not healed here, it takes a publish (stack update) or a rollback
+    drifted = {
+        region_name: drift for region_name, drift in regions.items()
+        if drift['Drifted'] and drift['ApiId'] is not None
+    }
+    healed = bool(drifted) and drift_self_heal and heal_regions(
+        api_name, api_stage_name, bucket_name, lock_bucket_name, version, drifted
+    )
+
+    for region_name, drift in regions.items():
+        del drift['ApiId']
+        drift['Healed'] = healed and region_name in drifted
+        emit_drift_metrics(api_name, api_stage_name, region_name, drift, drift['Healed'])
+
+    errors = [f"{region_name}: {drift['Error']}" for region_name, drift in regions.items() if 'Error' in drift]
+    if errors:
+        raise ValueError(f"Unable to reconcile {len(errors)} of {len(regions)} regions: {'; '.join(errors)}")
+
+    return {
+        'Digest': version['Digest'],
+        'Regions': regions
+    }
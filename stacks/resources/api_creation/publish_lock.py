@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+"""
+    publish_lock.py:
+    Lease serialising the publishers of an api name, kept as a single object
+    (locks/<api>.json) in the API documentation bucket and written with S3
+    conditional writes (If-None-Match / If-Match), so exactly one publisher
+    holds it at a time.
+    *   a lease expires after PUBLISH_LOCK_TTL_SECONDS, a publisher which died
+        while holding it does not block the others for longer than that
+    *   a publisher waiting for the same work (same definitions, settings and
+        regions, e.g. a retried event) reuses the result of the holder once it
+        is released instead of publishing again
+    *   a publisher waiting for different work takes the lease over once it is
+        released, it then updates the api created by the previous holder
+        rather than importing a duplicate
+    *   acquire_step makes a single attempt, so a publisher polled by the
+        custom resource provider waits between polls instead of sleeping
+"""
+
+import datetime
+import json
+import logging
+import os
+import time
+import uuid
+
+import spec_store
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+# a lease outlives the longest publish, which is bounded by the is_complete lambda timeout (publishTimeoutMinutes)
+lock_ttl_seconds = int(os.environ.get('PUBLISH_LOCK_TTL_SECONDS', '300'))
+lock_poll_seconds = float(os.environ.get('PUBLISH_LOCK_POLL_SECONDS', '2'))
+
+
+def lock_key(api_name: str) -> str:
+    return f"locks/{api_name}.json"
+
+
+def is_write_conflict(error) -> bool:
+    # 412 when the condition does not hold, 409 when a concurrent conditional write won
+    return error.response.get('Error', {}).get('Code') in ('PreconditionFailed', '412', 'ConditionalRequestConflict', '409')
+
+
+def read_lock(s3_client, bucket_name: str, api_name: str) -> tuple:
+    """
+        Returns (lease, etag), (None, None) when nobody ever held the lease.
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=lock_key(api_name))
+    except ClientError as e:
+        if not spec_store.is_not_found(e):
+            raise
+        return None, None
+
+    return json.loads(response['Body'].read()), response['ETag']
+
+
+def write_lock(s3_client, bucket_name: str, api_name: str, lease: dict, etag: str = None) -> str:
+    """
+        Writes the lease only if the lease object is still the one read (etag),
+        or does not exist yet. Returns the new etag, None if another publisher
+        wrote first.
+    """
+    from botocore.exceptions import ClientError
+
+    condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+
+    try:
+        response = s3_client.put_object(
+            Bucket=bucket_name,
+            Key=lock_key(api_name),
+            Body=json.dumps(lease).encode('utf-8'),
+            ContentType='application/json',
+            **condition
+        )
+    except ClientError as e:
+        if not is_write_conflict(e):
+            raise
+        return None
+
+    return response['ETag']
+
+
+def new_lease(owner: str, work_digest: str) -> dict:
+    return {
+        'Owner': owner,
+        'Digest': work_digest,
+        'State': 'Held',
+        'AcquiredAt': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'ExpiresAt': time.time() + lock_ttl_seconds
+    }
+
+
+def release_lock(s3_client, bucket_name: str, api_name: str, lease: dict, etag: str, result=None, failed: bool = False) -> None:
+    released = dict(lease, State='Released', Result=result, Failed=failed, ExpiresAt=time.time())
+
+    if write_lock(s3_client, bucket_name, api_name, released, etag) is None:
+        logger.warning(f"Publish lease of {api_name} expired and was taken over before it was released")
+
+
+def delete_lock(s3_client, bucket_name: str, api_name: str) -> bool:
+    """
+        Deletes every version of the lease of api_name, unless a publisher
+        holds it. Returns False when the lease is held and was kept.
+    """
+    lease, _ = read_lock(s3_client, bucket_name, api_name)
+    if lease is not None and lease['State'] == 'Held' and lease['ExpiresAt'] > time.time():
+        logger.warning(f"Publish lease of {api_name} held by {lease['Owner']}, not deleting it")
+        return False
+
+    # the prefix also matches the lease of api names extending this one
+    versions = [
+        version
+        for version in spec_store.list_object_versions(s3_client, bucket_name, lock_key(api_name))
+        if version['Key'] == lock_key(api_name)
+    ]
+    spec_store.delete_object_versions(s3_client, bucket_name, versions)
+
+    return True
+
+
+def acquire_step(s3_client, bucket_name: str, api_name: str, work_digest: str, owner: str, awaited: str = None) -> dict:
+    """
+        One attempt at the lease of api_name, without waiting. Returns
+        {'State': 'Acquired', 'Lease', 'ETag'}, {'State': 'Reused', 'Result'}
+        when the holder awaited (the owner of the same work seen holding the
+        lease) released it with its result, or {'State': 'Waiting', 'Awaited',
+        'Holder'}. awaited is carried from one attempt to the next.
+    """
+    lease, etag = read_lock(s3_client, bucket_name, api_name)
+
+    if lease is not None and lease['State'] == 'Held' and lease['ExpiresAt'] > time.time():
+        if lease['Digest'] == work_digest:
+            awaited = lease['Owner']
+        logger.info(f"Publish lease of {api_name} held by {lease['Owner']} until {lease['ExpiresAt']:.0f}, waiting")
+        return {'State': 'Waiting', 'Awaited': awaited, 'Holder': lease['Owner']}
+
+    if (lease is not None and lease['State'] == 'Released' and lease['Owner'] == awaited
+            and not lease.get('Failed')):
+        # the holder published the same work while this publisher waited
+        logger.info(f"Reusing the result published by {awaited} for {api_name}")
+        return {'State': 'Reused', 'Result': lease['Result']}
+
+    # free, released or expired
+    acquired = new_lease(owner, work_digest)
+    acquired_etag = write_lock(s3_client, bucket_name, api_name, acquired, etag)
+    if acquired_etag is None:
+        logger.info(f"Publish lease of {api_name} acquired by another publisher first")
+        return {'State': 'Waiting', 'Awaited': awaited, 'Holder': None}
+
+    return {'State': 'Acquired', 'Lease': acquired, 'ETag': acquired_etag}
+
+
+def run_holding(s3_client, bucket_name: str, api_name: str, lease: dict, etag: str, work):
+    """
+        Runs work() with the acquired lease and releases it with the (JSON
+        serialisable) result, or as failed so that waiters take it over.
+    """
+    try:
+        result = work()
+    except Exception:
+        release_lock(s3_client, bucket_name, api_name, lease, etag, failed=True)
+        raise
+
+    release_lock(s3_client, bucket_name, api_name, lease, etag, result)
+
+    return result
+
+
+def run_if_free(s3_client, bucket_name: str, api_name: str, work_digest: str, work) -> tuple:
+    """
+        Runs work() while holding the lease of api_name without waiting for it.
+        Returns (True, result), or (False, None) when another publisher holds
+        the lease. work_digest must not match any publisher's work, waiters
+        never reuse the result of work().
+    """
+    step = acquire_step(s3_client, bucket_name, api_name, work_digest, str(uuid.uuid4()))
+    if step['State'] != 'Acquired':
+        return False, None
+
+    return True, run_holding(s3_client, bucket_name, api_name, step['Lease'], step['ETag'], work)
+
+
+def publish_exclusively(
+        s3_client,
+        bucket_name: str,
+        api_name: str,
+        work_digest: str,
+        publish,
+        max_wait_seconds: float = None
+    ):
+    """
+        Runs publish() while holding the lease of api_name and returns its
+        (JSON serialisable) result. When another publisher holds the lease for
+        the same work, waits for it and returns its result instead. Sleeps
+        between attempts, for callers which are not polled (e.g. command line tools).
+    """
+    owner = str(uuid.uuid4())
+    max_wait_seconds = lock_ttl_seconds + lock_poll_seconds if max_wait_seconds is None else max_wait_seconds
+    deadline = time.time() + max_wait_seconds
+    awaited = None
+
+    while True:
+        step = acquire_step(s3_client, bucket_name, api_name, work_digest, owner, awaited)
+
+        if step['State'] == 'Acquired':
+            return run_holding(s3_client, bucket_name, api_name, step['Lease'], step['ETag'], publish)
+
+        if step['State'] == 'Reused':
+            return step['Result']
+
+        awaited = step['Awaited']
+
+        if time.time() + lock_poll_seconds > deadline:
+            raise ValueError(f"Timed out after {max_wait_seconds:.0f} seconds waiting for the publish lease of {api_name} held by {step['Holder']}")
+
+        time.sleep(lock_poll_seconds)
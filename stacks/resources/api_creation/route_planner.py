@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+
+"""
+    route_planner.py:
+    Route level update planner for HTTP APIs. Instead of replacing the whole
+    API definition with reimport_api, the planner:
+    *   lists the deployed routes and integrations (paginated get_routes and
+        get_integrations calls)
+    *   diffs them against the routes declared in the rendered OpenAPI definition
+    *   applies only the required create_route / update_integration /
+        update_route / delete_route calls, concurrently and under a rate limit,
+        integrations of deleted routes are deleted once every route is deleted
+    *   operations without an x-amazon-apigateway-integration are routes
+        without a target; a deployed route without a target gets its declared
+        integration with create_integration and update_route(Target=...)
+    *   falls back to reimport_api when the definition changes anything the
+        planner does not model (see requires_reimport and unmodelled_elements)
+
+    The plan can be printed without applying it (dry run), either from the
+    command line or via format_plan().
+
+    usage: python route_planner.py --api-name NAME --substitutions subs.json
+           [--bucket DOCUMENTATION_BUCKET --stage-name STAGE] [--apply]
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+# API Gateway control plane calls are throttled per account, stay well below the limit
+control_plane_max_workers = int(os.environ.get('CONTROL_PLANE_MAX_WORKERS', '4'))
+control_plane_rate_limit = float(os.environ.get('CONTROL_PLANE_RATE_LIMIT', '5'))
+
+HTTP_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+
+# OpenAPI x-amazon-apigateway-integration attribute -> apigatewayv2 integration attribute
+INTEGRATION_ATTRIBUTES = {
+    'type': 'IntegrationType',
+    'uri': 'IntegrationUri',
+    'httpMethod': 'IntegrationMethod',
+    'payloadFormatVersion': 'PayloadFormatVersion',
+    'connectionType': 'ConnectionType',
+    'connectionId': 'ConnectionId',
+    'timeoutInMillis': 'TimeoutInMillis',
+    'integrationSubtype': 'IntegrationSubtype',
+    'credentials': 'CredentialsArn',
+    'requestParameters': 'RequestParameters',
+    'responseParameters': 'ResponseParameters',
+    'tlsConfig': 'TlsConfig'
+}
+
+# attributes API Gateway has no default for, removing one from the definition cannot be
+# applied with update_integration and requires a full reimport
+OPTIONAL_INTEGRATION_ATTRIBUTES = (
+    'ConnectionId', 'IntegrationSubtype', 'CredentialsArn', 'RequestParameters', 'ResponseParameters', 'TlsConfig'
+)
+
+# definition features that are not modelled at route level and require a full reimport
+REIMPORT_EXTENSIONS = ('x-amazon-apigateway-cors', 'security')
+
+# extensions the planner applies itself, every other x-amazon-apigateway-* extension (request
+# validators, binary media types, ...) is only applied by a full reimport
+ROUTE_EXTENSIONS = ('x-amazon-apigateway-integration', 'x-amazon-apigateway-any-method')
+
+
+class RateLimiter:
+    """
+        Token bucket shared by the worker threads applying a plan.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+def unmodelled_elements(api_definition: dict) -> dict:
+    """
+        Returns the parts of the definition the planner does not diff, keyed by
+        their location: x-amazon-apigateway-* extensions of the definition, its
+        paths and operations, and integration attributes missing from
+        INTEGRATION_ATTRIBUTES.
+    """
+    elements = {}
+
+    def collect(location: str, node: dict) -> None:
+        for key, value in node.items():
+            if key.startswith('x-amazon-apigateway-') and key not in ROUTE_EXTENSIONS:
+                elements[f"{location}/{key}"] = value
+
+    collect('', api_definition)
+    for path, path_item in api_definition.get('paths', {}).items():
+        collect(path, path_item)
+
+    for path, method, operation in iterate_operations(api_definition):
+        collect(f"{method} {path}", operation)
+        for attribute, value in operation.get('x-amazon-apigateway-integration', {}).items():
+            if attribute not in INTEGRATION_ATTRIBUTES:
+                elements[f"{method} {path}/x-amazon-apigateway-integration/{attribute}"] = value
+
+    return elements
+
+
+def requires_reimport(api_definition: dict, previous_definition: dict = None) -> bool:
+    """
+        True when the definition cannot be applied at route level. Elements the
+        planner does not model only require a reimport when they differ from
+        the previously deployed definition, or when that one is not known.
+    """
+    if any(extension in api_definition for extension in REIMPORT_EXTENSIONS):
+        return True
+
+    if api_definition.get('components', {}).get('securitySchemes'):
+        return True
+
+    for _, method, operation in iterate_operations(api_definition):
+        if 'security' in operation:
+            return True
+
+    elements = unmodelled_elements(api_definition)
+    if previous_definition is None:
+        return bool(elements)
+
+    return elements != unmodelled_elements(previous_definition)
+
+
+def plan_requires_reimport(plan: list) -> bool:
+    return any(change['Action'] == 'reimport' for change in plan)
+
+
+def iterate_operations(api_definition: dict):
+    for path, path_item in api_definition.get('paths', {}).items():
+        for method, operation in path_item.items():
+            if method == 'x-amazon-apigateway-any-method':
+                yield path, 'ANY', operation
+            elif method in HTTP_METHODS:
+                yield path, method.upper(), operation
+
+
+def desired_routes(api_definition: dict) -> dict:
+    routes = {}
+    for path, method, operation in iterate_operations(api_definition):
+        route = {'Integration': None}
+        if 'operationId' in operation:
+            route['OperationName'] = operation['operationId']
+        routes[f"{method} {path}"] = route
+
+        # like an import, an operation without an integration is a route without a target
+        integration = operation.get('x-amazon-apigateway-integration')
+        if integration is None:
+            continue
+
+        desired_integration = {}
+        for attribute, integration_attribute in INTEGRATION_ATTRIBUTES.items():
+            if attribute in integration:
+                desired_integration[integration_attribute] = integration[attribute]
+        desired_integration['IntegrationType'] = desired_integration['IntegrationType'].upper()
+        if 'TlsConfig' in desired_integration:
+            desired_integration['TlsConfig'] = {'ServerNameToVerify': desired_integration['TlsConfig'].get('serverNameToVerify')}
+
+        route['Integration'] = desired_integration
+
+    return routes
+
+
+def deployed_routes(client, api_id: str) -> dict:
+    integrations = {}
+    for page in client.get_paginator('get_integrations').paginate(ApiId=api_id):
+        for integration in page['Items']:
+            integrations[integration['IntegrationId']] = integration
+
+    routes = {}
+    for page in client.get_paginator('get_routes').paginate(ApiId=api_id):
+        for route in page['Items']:
+            integration_id = route.get('Target', '').replace('integrations/', '', 1) or None
+            routes[route['RouteKey']] = {
+                'RouteId': route['RouteId'],
+                'OperationName': route.get('OperationName'),
+                'IntegrationId': integration_id,
+                'Integration': integrations.get(integration_id, {})
+            }
+
+    return routes
+
+
+def plan_integration_changes(route_key: str, integration: dict, deployed_route: dict) -> list:
+    plan = []
+
+    integration_changes = {
+        attribute: value
+        for attribute, value in integration.items()
+        if deployed_route['Integration'].get(attribute) != value
+    }
+    removed_attributes = [
+        attribute
+        for attribute in OPTIONAL_INTEGRATION_ATTRIBUTES
+        if deployed_route['Integration'].get(attribute) and attribute not in integration
+    ]
+    if removed_attributes:
+        plan.append({
+            'Action': 'reimport',
+            'RouteKey': route_key,
+            'Reason': f"{', '.join(removed_attributes)} removed from the integration"
+        })
+
+    if integration_changes:
+        plan.append({
+            'Action': 'update_integration',
+            'RouteKey': route_key,
+            'IntegrationId': deployed_route['IntegrationId'],
+            'Changes': integration_changes,
+            'Previous': {attribute: deployed_route['Integration'].get(attribute) for attribute in integration_changes}
+        })
+
+    return plan
+
+
+def plan_changes(desired: dict, deployed: dict) -> list:
+    plan = []
+
+    for route_key, route in desired.items():
+        if route_key not in deployed:
+            plan.append({'Action': 'create', 'RouteKey': route_key, 'Route': route})
+            continue
+
+        deployed_route = deployed[route_key]
+        if route['Integration'] is None:
+            # detaching the target of a route is not planned
+            if deployed_route['IntegrationId'] is not None:
+                plan.append({'Action': 'reimport', 'RouteKey': route_key, 'Reason': "integration removed from the route"})
+        elif deployed_route['IntegrationId'] is None:
+            plan.append({
+                'Action': 'attach_integration',
+                'RouteKey': route_key,
+                'RouteId': deployed_route['RouteId'],
+                'Integration': route['Integration']
+            })
+        else:
+            plan.extend(plan_integration_changes(route_key, route['Integration'], deployed_route))
+
+        if route.get('OperationName') != deployed_route.get('OperationName'):
+            plan.append({
+                'Action': 'update_route',
+                'RouteKey': route_key,
+                'RouteId': deployed_route['RouteId'],
+                'Changes': {'OperationName': route.get('OperationName')},
+                'Previous': {'OperationName': deployed_route.get('OperationName')}
+            })
+
+    # integrations are only deleted when no remaining route targets them, once per integration
+    remaining_integrations = {
+        deployed_route['IntegrationId']
+        for route_key, deployed_route in deployed.items()
+        if route_key in desired
+    }
+    deleted_integrations = []
+    for route_key, deployed_route in deployed.items():
+        if route_key not in desired:
+            plan.append({'Action': 'delete', 'RouteKey': route_key, 'RouteId': deployed_route['RouteId']})
+
+            integration_id = deployed_route['IntegrationId']
+            if integration_id is not None and integration_id not in remaining_integrations:
+                deleted_integrations.append({
+                    'Action': 'delete_integration',
+                    'RouteKey': route_key,
+                    'IntegrationId': integration_id
+                })
+                remaining_integrations.add(integration_id)
+
+    return plan + deleted_integrations
+
+
+def plan_api_update(client, api_id: str, api_definition: dict) -> list:
+    return plan_changes(desired_routes(api_definition), deployed_routes(client, api_id))
+
+
+def format_plan(plan: list) -> str:
+    if not plan:
+        return "No route changes"
+
+    lines = []
+    for change in plan:
+        if change['Action'] == 'create':
+            integration = change['Route']['Integration']
+            target = 'no integration' if integration is None else integration.get('IntegrationUri')
+            lines.append(f"+ {change['RouteKey']} -> {target}")
+        elif change['Action'] == 'attach_integration':
+            lines.append(f"+ {change['RouteKey']}: integration {change['Integration'].get('IntegrationUri')}")
+        elif change['Action'] == 'delete':
+            lines.append(f"- {change['RouteKey']}")
+        elif change['Action'] == 'delete_integration':
+            lines.append(f"- integration {change['IntegrationId']} of {change['RouteKey']}")
+        elif change['Action'] == 'reimport':
+            lines.append(f"! {change['RouteKey']}: {change['Reason']}, a full reimport is required")
+        else:
+            for attribute, value in change['Changes'].items():
+                lines.append(f"~ {change['RouteKey']}: {attribute} {change['Previous'][attribute]} -> {value}")
+
+    return "\n".join(lines)
+
+
+def create_integration_target(client, api_id: str, integration: dict, rate_limiter: RateLimiter) -> str:
+    rate_limiter.wait()
+    integration_id = client.create_integration(ApiId=api_id, **integration)['IntegrationId']
+
+    return f"integrations/{integration_id}"
+
+
+def apply_change(client, api_id: str, change: dict, rate_limiter: RateLimiter) -> None:
+    if change['Action'] == 'create':
+        route_attributes = {'OperationName': change['Route']['OperationName']} if 'OperationName' in change['Route'] else {}
+        if change['Route']['Integration'] is not None:
+            route_attributes['Target'] = create_integration_target(client, api_id, change['Route']['Integration'], rate_limiter)
+
+        rate_limiter.wait()
+        client.create_route(ApiId=api_id, RouteKey=change['RouteKey'], **route_attributes)
+
+    elif change['Action'] == 'attach_integration':
+        target = create_integration_target(client, api_id, change['Integration'], rate_limiter)
+        rate_limiter.wait()
+        client.update_route(ApiId=api_id, RouteId=change['RouteId'], Target=target)
+
+    elif change['Action'] == 'update_integration':
+        rate_limiter.wait()
+        client.update_integration(ApiId=api_id, IntegrationId=change['IntegrationId'], **change['Changes'])
+
+    elif change['Action'] == 'update_route':
+        rate_limiter.wait()
+        client.update_route(ApiId=api_id, RouteId=change['RouteId'], **change['Changes'])
+
+    elif change['Action'] == 'delete':
+        rate_limiter.wait()
+        client.delete_route(ApiId=api_id, RouteId=change['RouteId'])
+
+    elif change['Action'] == 'delete_integration':
+        rate_limiter.wait()
+        client.delete_integration(ApiId=api_id, IntegrationId=change['IntegrationId'])
+
+    else:
+        raise ValueError(f"The route plan change {change['Action']} of {change['RouteKey']} cannot be applied at route level")
+
+
+def apply_plan(
+        client,
+        api_id: str,
+        plan: list,
+        max_workers: int = control_plane_max_workers,
+        rate_limit: float = control_plane_rate_limit
+    ) -> None:
+    """
+        Applies the route changes concurrently, then the integration deletes:
+        an integration is only deleted once no route targets it anymore.
+    """
+    if not plan:
+        return
+
+    rate_limiter = RateLimiter(rate_limit)
+    phases = (
+        [change for change in plan if change['Action'] != 'delete_integration'],
+        [change for change in plan if change['Action'] == 'delete_integration']
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for changes in phases:
+            errors = []
+            futures = {
+                executor.submit(apply_change, client, api_id, change, rate_limiter): change
+                for change in changes
+            }
+            for future, change in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed to {change['Action']} route {change['RouteKey']}: {str(e)}")
+                    errors.append(f"{change['RouteKey']}: {str(e)}")
+
+            if errors:
+                raise ValueError(f"Unexpected error encountered while applying the route plan: {'; '.join(errors)}")
+
+
+def main() -> None:
+    import api_creator
+    import spec_bundler
+    import spec_store
+
+    parser = argparse.ArgumentParser(description="Plan (and optionally apply) route level API updates")
+    parser.add_argument("--api-name", required=True, help="name of the deployed HTTP API")
+    parser.add_argument("--definition", default="api_definition.yaml", help="root OpenAPI definition file")
+    parser.add_argument("--substitutions", required=True, help="JSON file with the @@PLACEHOLDER@@ values")
+    parser.add_argument("--bucket", help="documentation bucket, unmodelled elements are compared with the deployed snapshot")
+    parser.add_argument("--stage-name", help="stage whose deployed snapshot is compared, required with --bucket")
+    parser.add_argument("--apply", action="store_true", help="apply the plan, by default it is only printed")
+    args = parser.parse_args()
+    if args.bucket and not args.stage_name:
+        parser.error("--stage-name is required with --bucket")
+
+    with open(args.substitutions, "r") as substitutions_file:
+        substitutions = json.load(substitutions_file)
+
+    api_id = api_creator.get_api_by_name(args.api_name)
+    if api_id is None:
+        raise ValueError(f"API {args.api_name} was not found")
+
+    api_definition = spec_bundler.import_definition(api_creator.render_api_definition(args.definition, substitutions))
+
+    # without the previously deployed definition, unmodelled elements always require a reimport
+    previous_definition = None
+    if args.bucket:
+        s3_client = api_creator.get_s3_client()
+        manifest = spec_store.read_manifest(s3_client, args.bucket, args.api_name, args.stage_name)
+        previous_definition = spec_store.load_current_snapshots(s3_client, args.bucket, manifest).get(api_creator.get_aws_region())
+        if previous_definition is not None:
+            previous_definition = spec_bundler.import_definition(previous_definition)
+
+    if requires_reimport(api_definition, previous_definition):
+        print("The definition uses features which are not planned at route level, a full reimport is required")
+        return
+
+    client = api_creator.get_apigateway_client()
+    plan = plan_api_update(client, api_id, api_definition)
+    print(format_plan(plan))
+
+    if args.apply and not plan_requires_reimport(plan):
+        apply_plan(client, api_id, plan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+    spec_bundler.py:
+    Assembles the OpenAPI 3 definition used by api_creator.py from the root
+    definition file (api_definition.yaml) and the fragment files it references
+    through external $refs (for example one file per route under paths/).
+    *   every file is rendered (@@PLACEHOLDER@@ substitution) and parsed once
+        per bundle, however many $refs point into it
+    *   external $refs are inlined into a single self-contained document;
+        refs pointing back into the root definition become internal refs
+    *   $refs follow JSON Reference: a fragment refers to the shared components
+        with a relative ref (../api_definition.yaml#/components/...), a local
+        ref (#/...) in a fragment points into the fragment itself
+    *   import_definition derives the minimal definition sent to API Gateway
+        (routes, integrations, validators, schemas) from the full definition,
+        the documentation only fields are kept for swagger.json
+"""
+
+import logging
+import os
+import re
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+placeholder_pattern = re.compile('@@(.*?)@@')
+
+# fields only used by the documentation (and x-slo by the monitoring), not imported
+DOCUMENTATION_FIELDS = ('description', 'summary', 'example', 'examples', 'externalDocs', 'x-slo')
+
+# maps keyed by names (paths, schema properties, response codes ...) rather than field names
+NAMED_MAPS = (
+    'paths', 'properties', 'schemas', 'responses', 'parameters', 'requestBodies', 'headers',
+    'securitySchemes', 'content', 'variables', 'x-amazon-apigateway-request-validators'
+)
+
+
+def substitute_placeholders(template_data: str, substitutions: dict) -> str:
+
+    def lookup(match):
+        key = match.group(1)
+        return substitutions.get(key, f'<{key} not found>')
+
+    # perform the subsitutions, looking for placeholders @@PLACEHOLDER@@
+    return placeholder_pattern.sub(lookup, template_data)
+
+
+def load_yaml(document: str):
+    import yaml
+
+    # prefer the libyaml backed loader, it is an order of magnitude faster on large definitions
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+    return yaml.load(document, Loader=loader)
+
+
+def render_fragment(fragment_file: str, substitutions: dict, documents: dict):
+    # documents holds the files already rendered by the current bundle
+    if fragment_file not in documents:
+        with open(fragment_file, "r") as template_file:
+            template_data = template_file.read()
+
+        logger.debug(f"Rendering fragment: {fragment_file}")
+        documents[fragment_file] = load_yaml(substitute_placeholders(template_data, substitutions))
+
+    return documents[fragment_file]
+
+
+def resolve_pointer(document, pointer: str, ref: str):
+    node = document
+    for token in pointer.lstrip('/').split('/') if pointer.strip('/') else []:
+        token = token.replace('~1', '/').replace('~0', '~')
+        if isinstance(node, list):
+            token = int(token)
+        elif token not in node and token.isdigit() and int(token) in node:
+            # yaml parses keys such as response codes (200:) as integers
+            token = int(token)
+        try:
+            node = node[token]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f"Unable to resolve $ref: {ref}")
+
+    return node
+
+
+def bundle_node(node, current_file: str, root_file: str, substitutions: dict, resolving: list, documents: dict):
+    # builds a new tree so that rendered documents are never mutated
+    if isinstance(node, dict):
+        ref = node.get('$ref')
+        if isinstance(ref, str):
+            return bundle_ref(ref, current_file, root_file, substitutions, resolving, documents)
+        return {
+            key: bundle_node(value, current_file, root_file, substitutions, resolving, documents)
+            for key, value in node.items()
+        }
+
+    if isinstance(node, list):
+        return [bundle_node(value, current_file, root_file, substitutions, resolving, documents) for value in node]
+
+    return node
+
+
+def bundle_ref(ref: str, current_file: str, root_file: str, substitutions: dict, resolving: list, documents: dict):
+    target, _, pointer = ref.partition('#')
+
+    # a ref without a file points into the document holding it
+    target_file = current_file
+    if target:
+        target_file = os.path.abspath(os.path.join(os.path.dirname(current_file), target))
+
+    # refs into the root definition stay refs, the bundle is the root definition
+    if target_file == root_file:
+        return {'$ref': f"#{pointer}"}
+
+    ref_id = (target_file, pointer)
+    if ref_id in resolving:
+        raise ValueError(f"Circular external $ref detected: {ref} in {current_file}")
+
+    resolving.append(ref_id)
+    try:
+        document = render_fragment(target_file, substitutions, documents)
+        return bundle_node(
+            resolve_pointer(document, pointer, ref), target_file, root_file, substitutions, resolving, documents
+        )
+    finally:
+        resolving.pop()
+
+
+def bundle_api_definition(root_file: str, substitutions: dict) -> dict:
+    root_file = os.path.abspath(root_file)
+    documents = {}
+    root = render_fragment(root_file, substitutions, documents)
+
+    return bundle_node(root, root_file, root_file, substitutions, [], documents)
+
+
+def strip_documentation(node, parent_key: str = None):
+    if isinstance(node, list):
+        return [strip_documentation(value) for value in node]
+
+    if not isinstance(node, dict):
+        return node
+
+    stripped = {}
+    for key, value in node.items():
+        # response objects require a description, it is short and kept
+        if parent_key not in NAMED_MAPS and key in DOCUMENTATION_FIELDS and not (key == 'description' and parent_key == 'response'):
+            continue
+
+        if parent_key == 'responses':
+            child_key = 'response'
+        elif parent_key in NAMED_MAPS:
+            child_key = None
+        else:
+            child_key = key
+
+        stripped[key] = strip_documentation(value, child_key)
+
+    return stripped
+
+
+def import_definition(api_definition: dict) -> dict:
+    """
+        Returns a copy of the definition without the documentation only fields
+        (markdown descriptions, samples, examples), which API Gateway stores
+        but never uses. Keeps import payloads well below the import size limit.
+    """
+    return strip_documentation(api_definition)
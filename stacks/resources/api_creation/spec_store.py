@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+
+"""
+    spec_store.py:
+    Content addressed store for the rendered OpenAPI definitions, kept in the
+    (versioned) API documentation bucket.
+    *   every rendered definition is stored once under snapshots/<sha256>.json,
+        the hash is computed over the canonical JSON form so identical
+        definitions are deduplicated across deployments and regions
+    *   a manifest per api and stage (manifests/<api>/<stage>.json) records the
+        deployed versions, newest last, together with the stage settings they
+        were deployed with, so a previous version can be redeployed without
+        re-rendering anything (and drift can be checked against the current one)
+    *   a publish job per custom resource event (jobs/<api>/<token>.json)
+        carries the rendered definitions and the publish progress from the
+        on_event handler to the is_complete polls
+    *   delete_deployment_records removes every version of the manifest and of
+        the snapshots no other manifest references, when the api is torn down
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+# number of deployed versions kept in a manifest, snapshots are only deleted on teardown
+manifest_max_versions = int(os.environ.get('SNAPSHOT_MANIFEST_MAX_VERSIONS', '50'))
+
+
+def canonical_json(api_definition: dict) -> bytes:
+    return json.dumps(api_definition, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def snapshot_digest(api_definition: dict) -> str:
+    return hashlib.sha256(canonical_json(api_definition)).hexdigest()
+
+
+def version_digest(snapshots: dict) -> str:
+    # a version is identified by the snapshots of all its regions ({region: snapshot digest}, sorted by region)
+    return snapshot_digest(dict(sorted(snapshots.items())))
+
+
+def snapshot_key(digest: str) -> str:
+    return f"snapshots/{digest}.json"
+
+
+def manifest_key(api_name: str, api_stage_name: str) -> str:
+    return f"manifests/{api_name}/{api_stage_name}.json"
+
+
+def job_key(api_name: str, token: str) -> str:
+    return f"jobs/{api_name}/{token}.json"
+
+
+# maximum number of keys per delete_objects request
+DELETE_BATCH_SIZE = 1000
+
+
+def is_not_found(error) -> bool:
+    return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+
+def store_snapshot(s3_client, bucket_name: str, api_definition: dict) -> str:
+    from botocore.exceptions import ClientError
+
+    digest = snapshot_digest(api_definition)
+
+    try:
+        s3_client.head_object(Bucket=bucket_name, Key=snapshot_key(digest))
+        logger.debug(f"Snapshot {digest} already stored")
+        return digest
+    except ClientError as e:
+        if not is_not_found(e):
+            raise
+
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=snapshot_key(digest),
+        Body=canonical_json(api_definition),
+        ContentType='application/json'
+    )
+
+    return digest
+
+
+def load_snapshot(s3_client, bucket_name: str, digest: str) -> dict:
+    response = s3_client.get_object(Bucket=bucket_name, Key=snapshot_key(digest))
+    return json.loads(response['Body'].read())
+
+
+def read_manifest(s3_client, bucket_name: str, api_name: str, api_stage_name: str) -> dict:
+    from botocore.exceptions import ClientError
+
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=manifest_key(api_name, api_stage_name))
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if not is_not_found(e):
+            raise
+
+    return {
+        'ApiName': api_name,
+        'StageName': api_stage_name,
+        'Current': None,
+        'Versions': []
+    }
+
+
+def write_manifest(s3_client, bucket_name: str, manifest: dict) -> None:
+    manifest['Versions'] = manifest['Versions'][-manifest_max_versions:]
+
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=manifest_key(manifest['ApiName'], manifest['StageName']),
+        Body=json.dumps(manifest, indent=2).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def write_job(s3_client, bucket_name: str, job: dict) -> None:
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=job_key(job['ApiName'], job['Token']),
+        Body=json.dumps(job).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def read_job(s3_client, bucket_name: str, api_name: str, token: str) -> dict:
+    response = s3_client.get_object(Bucket=bucket_name, Key=job_key(api_name, token))
+    return json.loads(response['Body'].read())
+
+
+def delete_job(s3_client, bucket_name: str, api_name: str, token: str) -> None:
+    # finished jobs are not kept, the manifest records what was deployed
+    s3_client.delete_object(Bucket=bucket_name, Key=job_key(api_name, token))
+
+
+def current_version(manifest: dict) -> dict:
+    for version in reversed(manifest['Versions']):
+        if version['Digest'] == manifest['Current']:
+            return version
+
+    return None
+
+
+def load_current_snapshots(s3_client, bucket_name: str, manifest: dict) -> dict:
+    """
+        Returns the definitions of the current version ({region: definition}),
+        empty when nothing was deployed yet. Shared snapshots are loaded once.
+    """
+    current = current_version(manifest)
+    if current is None:
+        return {}
+
+    definitions = {
+        digest: load_snapshot(s3_client, bucket_name, digest)
+        for digest in set(current['Snapshots'].values())
+    }
+
+    return {region_name: definitions[digest] for region_name, digest in current['Snapshots'].items()}
+
+
+def record_deployment(
+        s3_client,
+        bucket_name: str,
+        api_name: str,
+        api_stage_name: str,
+        api_definitions: dict,
+        settings: dict,
+        api_ids: dict = None,
+        rolled_back_from: str = None,
+        manifest: dict = None
+    ) -> dict:
+    """
+        Stores the definition deployed to every region ({region: definition},
+        stack region first) and appends the deployment, with the api id per
+        region, to the stage manifest.
+        Nothing is written when the definitions and settings match the version
+        which is already current. A manifest read earlier under the publish
+        lease can be passed in to avoid reading it again.
+    """
+    if manifest is None:
+        manifest = read_manifest(s3_client, bucket_name, api_name, api_stage_name)
+
+    snapshots = {
+        region_name: snapshot_digest(api_definition)
+        for region_name, api_definition in api_definitions.items()
+    }
+    digest = version_digest(snapshots)
+    api_ids = api_ids or {}
+
+    current = current_version(manifest)
+    if (current is not None and current['Snapshots'] == snapshots and current['Settings'] == settings
+            and current.get('ApiIds', {}) == api_ids):
+        logger.debug(f"Version {digest} is already current for stage {api_stage_name}")
+        return current
+
+    # snapshots referenced by an earlier version are known to be stored
+    stored = {
+        stored_digest
+        for version in manifest['Versions']
+        for stored_digest in version['Snapshots'].values()
+    }
+    for region_name, api_definition in api_definitions.items():
+        if snapshots[region_name] not in stored:
+            store_snapshot(s3_client, bucket_name, api_definition)
+            stored.add(snapshots[region_name])
+
+    version = {
+        'Digest': digest,
+        'Snapshots': snapshots,
+        'Settings': settings,
+        'ApiIds': api_ids,
+        'DeployedAt': datetime.datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    }
+    if rolled_back_from is not None:
+        version['RolledBackFrom'] = rolled_back_from
+
+    manifest['Versions'].append(version)
+    manifest['Current'] = digest
+    write_manifest(s3_client, bucket_name, manifest)
+
+    return version
+
+
+def select_rollback_version(manifest: dict, digest: str = None) -> dict:
+    """
+        Returns the version to roll back to: the given digest (a unique prefix
+        is enough), or by default the most recent version that differs from
+        the current one.
+    """
+    if digest is not None:
+        matches = {
+            version['Digest']: version
+            for version in manifest['Versions']
+            if version['Digest'].startswith(digest)
+        }
+        if len(matches) != 1:
+            raise ValueError(f"Expected exactly one version of stage {manifest['StageName']} matching {digest}, found {len(matches)}")
+        return next(iter(matches.values()))
+
+    for version in reversed(manifest['Versions']):
+        if version['Digest'] != manifest['Current']:
+            return version
+
+    raise ValueError(f"No previous version of stage {manifest['StageName']} to roll back to")
+
+
+def list_object_versions(s3_client, bucket_name: str, prefix: str = '') -> list:
+    """
+        Returns every version and delete marker in the bucket (under prefix)
+        as {Key, VersionId, IsLatest, IsDeleteMarker}.
+    """
+    versions = []
+    for page in s3_client.get_paginator('list_object_versions').paginate(Bucket=bucket_name, Prefix=prefix):
+        for version in page.get('Versions', []):
+            versions.append(dict(version, IsDeleteMarker=False))
+        for delete_marker in page.get('DeleteMarkers', []):
+            versions.append(dict(delete_marker, IsDeleteMarker=True))
+
+    return versions
+
+
+def delete_object_versions(s3_client, bucket_name: str, versions: list) -> int:
+    objects = [{'Key': version['Key'], 'VersionId': version['VersionId']} for version in versions]
+
+    for start in range(0, len(objects), DELETE_BATCH_SIZE):
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': objects[start:start + DELETE_BATCH_SIZE], 'Quiet': True}
+        )
+        # versions deleted in the meantime are already gone
+        errors = [
+            f"{error['Key']} ({error.get('VersionId')}): {error['Code']}"
+            for error in response.get('Errors', [])
+            if error['Code'] not in ('NoSuchKey', 'NoSuchVersion')
+        ]
+        if errors:
+            raise ValueError(f"Unable to delete {len(errors)} object versions from {bucket_name}: {'; '.join(errors)}")
+
+    return len(objects)
+
+
+def delete_deployment_records(s3_client, bucket_name: str, api_name: str, api_stage_name: str, keys: list = ()) -> int:
+    """
+        Deletes every version of the stage manifest, of the given keys (e.g.
+        swagger.json), of the unfinished publish jobs of the api and of the
+        snapshots which are not referenced by the manifest of another api or
+        stage. Returns the number of versions deleted.
+    """
+    versions = list_object_versions(s3_client, bucket_name)
+
+    own_manifest = manifest_key(api_name, api_stage_name)
+    other_manifests = {
+        version['Key']
+        for version in versions
+        if version['Key'].startswith('manifests/') and version['Key'] != own_manifest
+        and version['IsLatest'] and not version['IsDeleteMarker']
+    }
+
+    # snapshots are content addressed, another stage deploying the same definition shares them
+    shared_snapshots = set()
+    for other_manifest in other_manifests:
+        manifest = json.loads(s3_client.get_object(Bucket=bucket_name, Key=other_manifest)['Body'].read())
+        shared_snapshots.update(
+            snapshot_key(digest)
+            for version in manifest['Versions']
+            for digest in version['Snapshots'].values()
+        )
+
+    deleted_keys = set(keys) | {own_manifest}
+    stale_versions = [
+        version
+        for version in versions
+        if version['Key'] in deleted_keys
+        or version['Key'].startswith(f"jobs/{api_name}/")
+        or (version['Key'].startswith('snapshots/') and version['Key'] not in shared_snapshots)
+    ]
+
+    logger.info(f"Deleting {len(stale_versions)} object versions of stage {api_stage_name} from {bucket_name}")
+
+    return delete_object_versions(s3_client, bucket_name, stale_versions)
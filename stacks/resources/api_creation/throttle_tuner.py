@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+"""
+    throttle_tuner.py:
+    Recommends the stage throttling limits (throttlingBurstLimit and
+    throttlingRateLimit in cdk.json) from observed traffic.
+    *   reads exported access logs (aws logs filter-log-events output or JSON
+        lines with timestamp and message) or per route Count metrics
+        (aws cloudwatch get-metric-data output, one result per route labelled
+        with its route key, "<route key> throttled" for throttled requests)
+    *   computes the peak and percentile request rates per route, throttled
+        (429) requests count as demand
+    *   the stage default route limits apply to every route individually, so
+        the recommendation covers the busiest route: the burst limit from the
+        peak rate and the rate limit from the chosen percentile, both with
+        headroom
+    *   prints the recommendation as a cdk.json (merge) patch and optionally
+        applies it to the deployed stage in every region, under the publish
+        lease, recording the new limits as a version of the stage manifest so
+        the drift reconciler keeps them (a stack update applies cdk.json again)
+
+    usage: python throttle_tuner.py (--access-logs logs.json ... | --metrics metrics.json ...)
+           [--percentile 99] [--headroom 1.5]
+           [--apply --api-name NAME --stage dev --bucket DOC_BUCKET [--lock-bucket BUCKET]]
+"""
+
+import argparse
+import collections
+import json
+import math
+import re
+
+# "$context.httpMethod $context.routeKey $context.protocol" $context.status, see stage_access_log_settings
+access_log_pattern = re.compile(r'"(?P<method>\S+) (?P<route_key>[^"]+?) (?P<protocol>\S+)" (?P<status>\d{3})')
+
+THROTTLED_STATUS = 429
+
+
+def read_json_records(file_name: str) -> list:
+    with open(file_name, "r") as json_file:
+        content = json_file.read().strip()
+
+    if not content:
+        return []
+
+    try:
+        document = json.loads(content)
+    except json.JSONDecodeError:
+        # JSON lines
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    if isinstance(document, dict):
+        return document.get('events', document.get('MetricDataResults', [document]))
+
+    return document
+
+
+def parse_access_log_event(event: dict) -> tuple:
+    """
+        Returns (epoch seconds, route key, status) for an exported log event,
+        or None for lines that are not access log entries.
+    """
+    message = event.get('message', '')
+
+    # access logs can also be written in JSON format
+    if message.startswith('{'):
+        entry = json.loads(message)
+        if 'routeKey' not in entry:
+            return None
+        timestamp = int(entry.get('requestTimeEpoch', event.get('timestamp', 0) // 1000))
+        return timestamp, entry['routeKey'], int(entry.get('status', 0))
+
+    match = access_log_pattern.search(message)
+    if match is None:
+        return None
+
+    return event['timestamp'] // 1000, match.group('route_key'), int(match.group('status'))
+
+
+def access_log_counts(events: list) -> tuple:
+    """
+        Returns ({route key: {second: requests}}, {route key: throttled requests}, (first, last second)).
+    """
+    counts = collections.defaultdict(collections.Counter)
+    throttled = collections.Counter()
+    first_second, last_second = None, None
+
+    for event in events:
+        entry = parse_access_log_event(event)
+        if entry is None:
+            continue
+
+        second, route_key, status = entry
+        counts[route_key][second] += 1
+        if status == THROTTLED_STATUS:
+            throttled[route_key] += 1
+
+        first_second = second if first_second is None else min(first_second, second)
+        last_second = second if last_second is None else max(last_second, second)
+
+    return counts, throttled, (first_second, last_second)
+
+
+def access_log_rates(events: list) -> dict:
+    counts, throttled, (first_second, last_second) = access_log_counts(events)
+    if first_second is None:
+        return {}
+
+    # seconds without requests are part of the observed window
+    window = range(first_second, last_second + 1)
+
+    return {
+        route_key: {
+            'Rates': [route_counts.get(second, 0) for second in window],
+            'Requests': sum(route_counts.values()),
+            'Throttled': throttled[route_key]
+        }
+        for route_key, route_counts in counts.items()
+    }
+
+
+def metric_rates(results: list, period: int) -> dict:
+    """
+        Count metrics only resolve the average rate per period, the peak is the
+        busiest period (sub period bursts are not visible).
+    """
+    rates = {}
+    throttled = collections.Counter()
+
+    for result in results:
+        label = result['Label']
+        if label.endswith(' throttled'):
+            throttled[label[:-len(' throttled')]] += sum(result['Values'])
+            continue
+        # the same route may be exported in several files
+        observed = rates.setdefault(label, {'Rates': [], 'Requests': 0, 'Throttled': 0})
+        observed['Rates'].extend(value / period for value in result['Values'])
+        observed['Requests'] += sum(result['Values'])
+
+    for route_key, throttled_requests in throttled.items():
+        if route_key in rates:
+            rates[route_key]['Throttled'] = throttled_requests
+
+    return rates
+
+
+def percentile(values: list, pct: float) -> float:
+    # nearest rank
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+
+    rank = max(math.ceil(pct / 100.0 * len(ordered)), 1)
+
+    return float(ordered[rank - 1])
+
+
+def route_statistics(route_rates: dict) -> dict:
+    statistics = {}
+    for route_key, observed in sorted(route_rates.items()):
+        rates = observed['Rates']
+        statistics[route_key] = {
+            'Rates': rates,
+            'Requests': observed['Requests'],
+            'Throttled': observed['Throttled'],
+            'Peak': float(max(rates)) if rates else 0.0,
+            'Mean': sum(rates) / len(rates) if rates else 0.0,
+            'P50': percentile(rates, 50),
+            'P90': percentile(rates, 90),
+            'P99': percentile(rates, 99)
+        }
+
+    return statistics
+
+
+def recommend_limits(statistics: dict, pct: float = 99, headroom: float = 1.5, minimum_rate: int = 1) -> dict:
+    if not statistics:
+        raise ValueError("No requests found in the observed traffic")
+
+    def percentile_rate(route_statistics: dict) -> float:
+        return percentile(route_statistics['Rates'], pct)
+
+    busiest_rate_route = max(statistics, key=lambda route_key: percentile_rate(statistics[route_key]))
+    busiest_peak_route = max(statistics, key=lambda route_key: statistics[route_key]['Peak'])
+
+    rate_limit = max(math.ceil(percentile_rate(statistics[busiest_rate_route]) * headroom), minimum_rate)
+    burst_limit = max(math.ceil(statistics[busiest_peak_route]['Peak'] * headroom), rate_limit)
+
+    return {
+        'ThrottlingBurstLimit': burst_limit,
+        'ThrottlingRateLimit': rate_limit,
+        'BurstRoute': busiest_peak_route,
+        'RateRoute': busiest_rate_route
+    }
+
+
+def cdk_json_patch(recommendation: dict) -> dict:
+    return {
+        'context': {
+            'api': {
+                'throttlingBurstLimit': recommendation['ThrottlingBurstLimit'],
+                'throttlingRateLimit': recommendation['ThrottlingRateLimit']
+            }
+        }
+    }
+
+
+def apply_limits(api_name: str, api_stage_name: str, recommendation: dict, bucket_name: str, lock_bucket_name: str = None) -> dict:
+    """
+        Applies the limits to the stage in every region of the current version
+        and records them as a new version of the stage manifest, both under
+        the publish lease. Returns the recorded version.
+    """
+    import api_creator
+    import publish_lock
+    import spec_store
+
+    s3_client = api_creator.get_s3_client()
+
+    def apply() -> dict:
+        # the manifest is read under the lease, a publisher may have changed it
+        manifest = spec_store.read_manifest(s3_client, bucket_name, api_name, api_stage_name)
+        current = spec_store.current_version(manifest)
+        if current is None:
+            raise ValueError(f"No deployment of stage {api_stage_name} of {api_name} is recorded in {bucket_name}")
+
+        settings = dict(
+            current['Settings'],
+            ThrottlingBurstLimit=recommendation['ThrottlingBurstLimit'],
+            ThrottlingRateLimit=recommendation['ThrottlingRateLimit']
+        )
+        api_ids = current.get('ApiIds') or {
+            region_name: api_creator.get_api_by_name(api_name, region_name)
+            for region_name in current['Snapshots']
+        }
+
+        for region_name, api_id in api_ids.items():
+            if api_id is None:
+                raise ValueError(f"API {api_name} was not found in {region_name}")
+            api_creator.get_apigateway_client(region_name).update_stage(
+                ApiId=api_id,
+                StageName=api_stage_name,
+                DefaultRouteSettings=api_creator.stage_default_route_settings(
+                    settings['ThrottlingBurstLimit'],
+                    settings['ThrottlingRateLimit']
+                )
+            )
+
+        return spec_store.record_deployment(
+            s3_client,
+            bucket_name,
+            api_name,
+            api_stage_name,
+            spec_store.load_current_snapshots(s3_client, bucket_name, manifest),
+            settings,
+            api_ids=api_ids,
+            manifest=manifest
+        )
+
+    # a distinct work digest, publishers waiting for the lease never reuse the result
+    return publish_lock.publish_exclusively(
+        s3_client,
+        lock_bucket_name or bucket_name,
+        api_name,
+        spec_store.snapshot_digest({'ThrottlingLimits': recommendation, 'StageName': api_stage_name}),
+        apply
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recommend stage throttling limits from observed traffic")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--access-logs", nargs="+", help="exported access log events (JSON)")
+    source.add_argument("--metrics", nargs="+", help="get-metric-data output with per route Count results (JSON)")
+    parser.add_argument("--period", type=int, default=60, help="period of the metric data points in seconds")
+    parser.add_argument("--percentile", type=float, default=99, help="percentile of the per route rate used for the rate limit")
+    parser.add_argument("--headroom", type=float, default=1.5, help="multiplier applied to the observed rates")
+    parser.add_argument("--apply", action="store_true", help="apply the limits to the deployed stage and record them in the stage manifest")
+    parser.add_argument("--api-name", help="name of the deployed HTTP API (with --apply)")
+    parser.add_argument("--stage", help="stage name (with --apply)")
+    parser.add_argument("--bucket", help="API documentation bucket holding the stage manifest (with --apply)")
+    parser.add_argument("--lock-bucket", help="bucket of the publish lease (publishLockBucketName), the documentation bucket by default")
+    args = parser.parse_args()
+
+    # access logs resolve per second rates, metrics per period averages, they are not mixed
+    if args.access_logs:
+        route_rates = access_log_rates([record for file_name in args.access_logs for record in read_json_records(file_name)])
+    else:
+        route_rates = metric_rates([record for file_name in args.metrics for record in read_json_records(file_name)], args.period)
+
+    statistics = route_statistics(route_rates)
+    recommendation = recommend_limits(statistics, args.percentile, args.headroom)
+
+    report = {
+        route_key: {name: value for name, value in route_statistics.items() if name != 'Rates'}
+        for route_key, route_statistics in statistics.items()
+    }
+    print(json.dumps({'Routes': report, 'Recommendation': recommendation}, indent=2))
+    print(json.dumps(cdk_json_patch(recommendation), indent=2))
+
+    if args.apply:
+        if not args.api_name or not args.stage or not args.bucket:
+            parser.error("--apply requires --api-name, --stage and --bucket")
+        version = apply_limits(args.api_name, args.stage, recommendation, args.bucket, args.lock_bucket)
+        print(f"Recorded the limits as version {version['Digest']} deployed at {version['DeployedAt']}")
+
+
+if __name__ == "__main__":
+    main()
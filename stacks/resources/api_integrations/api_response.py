@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+    api_response.py:
+    Shared response builder for the API Gateway Lambda integrations.
+    Serializes the response payload as minified JSON and, when the client
+    advertises support via the Accept-Encoding header, compresses bodies
+    above a size threshold with brotli or gzip. Compressed bodies are
+    returned base64 encoded with isBase64Encoded set, as API Gateway expects.
+"""
+
+import base64
+import gzip
+import json
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:
+    # brotli is not part of the Lambda python runtime, gzip is always available
+    brotli = None
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+# bodies smaller than this are returned uncompressed, the saving does not pay for the cpu time
+compression_min_bytes = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+
+def supported_encodings() -> list:
+    # ordered by preference, used to break ties between equal quality values
+    if brotli is not None:
+        return ['br', 'gzip']
+    return ['gzip']
+
+
+def get_header(event: dict, header_name: str) -> str:
+    # payload format 2.0 lowercases header names, format 1.0 does not
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == header_name:
+            return value
+
+    return None
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for token in accept_encoding.split(','):
+        parts = token.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best_encoding, best_quality = None, 0.0
+    for coding in supported_encodings():
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best_encoding, best_quality = coding, quality
+
+    return best_encoding
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body)
+
+    return gzip.compress(body)
+
+
+def build_response(event: dict, status_code: int, payload: dict) -> dict:
+    body = json.dumps(payload, separators=(',', ':'))
+    headers = {
+        'Content-Type': 'application/json',
+        'Vary': 'Accept-Encoding'
+    }
+
+    raw_body = body.encode('utf-8')
+    encoding = None
+    if len(raw_body) >= compression_min_bytes:
+        encoding = negotiate_encoding(get_header(event, 'accept-encoding'))
+
+    if encoding is None:
+        logger.debug(f"Response body: {len(raw_body)} bytes, uncompressed")
+        return {
+            'statusCode': status_code,
+            'body': body,
+            'headers': headers
+        }
+
+    compressed_body = compress(raw_body, encoding)
+    logger.debug(f"Response body: {len(raw_body)} bytes raw, {len(compressed_body)} bytes {encoding}")
+
+    headers['Content-Encoding'] = encoding
+
+    return {
+        'statusCode': status_code,
+        'body': base64.b64encode(compressed_body).decode('ascii'),
+        'headers': headers,
+        'isBase64Encoded': True
+    }
@@ -10,6 +10,8 @@ import json
 import logging
 import traceback
 
+from api_response import build_response
+
 # set logging
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -26,11 +28,7 @@ def lambda_handler(event, context):
 
         message = {"greeting": f"Hello {event['queryStringParameters']['greeting']}"}
 
-        return {
-            'statusCode': 200,
-            'body': json.dumps(message, indent=2),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return build_response(event, 200, message)
         
     except Exception as e:
 
@@ -40,8 +38,4 @@ def lambda_handler(event, context):
 
         api_error = {"error": str(e)}
 
-        return {
-            'statusCode': 500,
-            'body': json.dumps(api_error),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return build_response(event, 500, api_error)
@@ -10,6 +10,8 @@ import json
 import logging
 import traceback
 
+from api_response import build_response
+
 # set logging
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -22,11 +24,7 @@ def lambda_handler(event, context):
 
         message = {"ping": "Pong"}
         
-        return {
-            'statusCode': 200,
-            'body': json.dumps(message, indent=2),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return build_response(event, 200, message)
         
     except Exception as e:
 
@@ -36,8 +34,4 @@ def lambda_handler(event, context):
 
         api_error = {"error": str(e)}
 
-        return {
-            'statusCode': 500,
-            'body': json.dumps(api_error),
-            'headers': {'Content-Type': 'application/json'}
-        }
+        return build_response(event, 500, api_error)
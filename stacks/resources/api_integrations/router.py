@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+    router.py:
+    Lambda Function handler that serves every API Gateway endpoint from a
+    single function (router integration mode). Requests are dispatched on
+    their route key to the handlers of the per endpoint functions. The route
+    table (ROUTE_HANDLERS) is built from api_definition.yaml when the stack
+    is synthesized, the handlers are imported once, when the execution
+    environment initialises, so a warm router serves every route without a
+    further cold start.
+"""
+
+import importlib
+import json
+import logging
+import os
+
+from api_response import build_response
+
+# set logging
+logger = logging.getLogger()
+logger.setLevel(logging.DEBUG)
+
+# route key -> module providing the lambda_handler, e.g. {"GET /ping": "ping"}
+route_handlers = json.loads(os.environ.get('ROUTE_HANDLERS', '{}'))
+
+
+def build_dispatch_table(route_handlers: dict) -> dict:
+    handlers = {
+        module_name: importlib.import_module(module_name).lambda_handler
+        for module_name in set(route_handlers.values())
+    }
+
+    return {route_key: handlers[module_name] for route_key, module_name in route_handlers.items()}
+
+
+dispatch_table = build_dispatch_table(route_handlers)
+
+
+def resolve_handler(event: dict):
+    # payload format 2.0 carries the route key, 1.0 the method and resource path,
+    # neither carries the operation name, so the table is keyed by route only
+    route_key = event.get('routeKey') or f"{event.get('httpMethod')} {event.get('resource')}"
+
+    return dispatch_table.get(route_key)
+
+
+def lambda_handler(event, context):
+    handler = resolve_handler(event)
+
+    if handler is None:
+        logger.error(f"No handler for route {event.get('routeKey')}: {json.dumps(event)}")
+        return build_response(event, 404, {"error": f"No handler for route {event.get('routeKey')}"})
+
+    return handler(event, context)
@@ -0,0 +1,54 @@
+import collections
+import os
+import sys
+
+import pytest
+
+# the lambda sources are deployed as flat assets rather than packages,
+# expose them on the import path the same way the lambda runtime does
+RESOURCES_DIR = os.path.join(os.path.dirname(__file__), "..", "stacks", "resources")
+
+for asset_dir in ("api_integrations", "api_creation"):
+    sys.path.insert(0, os.path.abspath(os.path.join(RESOURCES_DIR, asset_dir)))
+
+
+@pytest.fixture
+def aws_environment(monkeypatch):
+    monkeypatch.setenv("AWS_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_SESSION_TOKEN", "testing")
+
+
+@pytest.fixture
+def api_creator_harness(aws_environment, monkeypatch, tmp_path):
+    """
+        Runs api_creator against an in-memory apigatewayv2 control plane and a
+        moto backed S3, counting every control plane call made per operation.
+    """
+    from moto import mock_aws
+
+    import api_creator
+    from tests.fake_apigatewayv2 import FakeApiGatewayV2
+
+    monkeypatch.chdir(os.path.join(RESOURCES_DIR, "api_creation"))
+    monkeypatch.setattr(api_creator, "boto3_session", None)
+    monkeypatch.setattr(api_creator, "boto3_clients", {})
+
+    with mock_aws():
+        fake_apigateway = FakeApiGatewayV2()
+        fake_apigateway.attach(api_creator.get_apigateway_client())
+
+        s3_calls = collections.Counter()
+        s3_client = api_creator.get_s3_client()
+        s3_client.meta.events.register(
+            "before-call.s3",
+            lambda model, **kwargs: s3_calls.update([model.name])
+        )
+        s3_client.create_bucket(Bucket="api-documentation-bucket")
+        s3_calls.clear()
+
+        yield collections.namedtuple("Harness", "api_creator apigateway s3 s3_calls")(
+            api_creator, fake_apigateway, s3_client, s3_calls
+        )
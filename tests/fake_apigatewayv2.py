@@ -0,0 +1,313 @@
+"""
+    fake_apigatewayv2.py:
+    In-memory stand-in for the apigatewayv2 control plane. It attaches to a
+    real botocore client through the before-call event (the same mechanism
+    botocore's Stubber uses), so request parameters are still validated
+    against the service model, and it counts every call per operation.
+    Unlike the Stubber it keeps state and does not require a scripted call
+    order, which keeps it usable from concurrent code paths.
+"""
+
+import collections
+import datetime
+import io
+import itertools
+import json
+import threading
+
+import yaml
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+
+class FakeApiGatewayV2:
+
+    def __init__(self, region: str = "us-east-1", page_size: int = 25):
+        self.region = region
+        self.page_size = page_size
+        self.apis = {}
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        # status reported for new deployments, tests switch it to simulate slow or failed deployments
+        self.deployment_status = "DEPLOYED"
+
+    def attach(self, client) -> None:
+        client.meta.events.register("before-parameter-build.apigatewayv2", self.capture_params)
+        client.meta.events.register("before-call.apigatewayv2", self.handle_call)
+
+    def capture_params(self, params, context, **kwargs):
+        context["fake_api_params"] = dict(params)
+
+    def handle_call(self, model, context, **kwargs):
+        params = context["fake_api_params"]
+        with self.lock:
+            self.calls[model.name] += 1
+            handler = getattr(self, f"op_{model.name}", None)
+            if handler is None:
+                raise NotImplementedError(f"FakeApiGatewayV2 does not implement {model.name}")
+            try:
+                status_code, response = 200, handler(**params)
+            except FakeClientError as e:
+                status_code = e.status_code
+                response = {"Error": {"Code": e.code, "Message": e.message}}
+
+        response.setdefault("ResponseMetadata", {})["HTTPStatusCode"] = status_code
+        return AWSResponse(None, status_code, {}, None), response
+
+    def next_id(self) -> str:
+        return f"{next(self.ids):010x}"
+
+    def get_api(self, api_id: str) -> dict:
+        if api_id not in self.apis:
+            raise FakeClientError("NotFoundException", f"Invalid API identifier specified {api_id}")
+        return self.apis[api_id]
+
+    def load_definition(self, api: dict, body: str) -> None:
+        definition = yaml.safe_load(body)
+        api["Name"] = definition["info"]["title"]
+        api["Definition"] = definition
+        api["Routes"] = {}
+        api["Integrations"] = {}
+        api["Authorizers"] = {}
+
+        authorizer_ids = {}
+        for scheme_name, scheme in definition.get("components", {}).get("securitySchemes", {}).items():
+            authorizer = scheme.get("x-amazon-apigateway-authorizer")
+            if authorizer is None:
+                continue
+            authorizer_id = self.next_id()
+            authorizer_ids[scheme_name] = (authorizer_id, "JWT" if authorizer["type"] == "jwt" else "CUSTOM")
+            api["Authorizers"][authorizer_id] = {
+                "AuthorizerId": authorizer_id,
+                "Name": scheme_name,
+                "AuthorizerType": authorizer["type"].upper(),
+                "IdentitySource": [source.strip() for source in authorizer.get("identitySource", "").split(",") if source.strip()],
+                "AuthorizerUri": authorizer.get("authorizerUri"),
+                "AuthorizerResultTtlInSeconds": authorizer.get("authorizerResultTtlInSeconds", 0),
+                "EnableSimpleResponses": authorizer.get("enableSimpleResponses", False)
+            }
+
+        for path, path_item in definition.get("paths", {}).items():
+            for method, operation in path_item.items():
+                route_id = self.next_id()
+                api["Routes"][route_id] = {
+                    "RouteId": route_id,
+                    "RouteKey": f"{'ANY' if method == 'x-amazon-apigateway-any-method' else method.upper()} {path}",
+                    "OperationName": operation.get("operationId"),
+                    "AuthorizationType": "NONE"
+                }
+                # like the service, an operation without an integration is imported as a route without a target
+                integration = operation.get("x-amazon-apigateway-integration")
+                if integration is not None:
+                    integration_id = self.next_id()
+                    api["Integrations"][integration_id] = {
+                        "IntegrationId": integration_id,
+                        "IntegrationType": integration["type"].upper(),
+                        "IntegrationMethod": integration.get("httpMethod"),
+                        "IntegrationUri": integration["uri"],
+                        "PayloadFormatVersion": integration.get("payloadFormatVersion", "2.0"),
+                        "ConnectionType": integration.get("connectionType", "INTERNET")
+                    }
+                    api["Routes"][route_id]["Target"] = f"integrations/{integration_id}"
+                for requirement in operation.get("security", definition.get("security", []))[:1]:
+                    for scheme_name in requirement:
+                        authorizer_id, authorization_type = authorizer_ids[scheme_name]
+                        api["Routes"][route_id].update(AuthorizationType=authorization_type, AuthorizerId=authorizer_id)
+
+    def paginate(self, items: list, NextToken: str = None, MaxResults: str = None) -> dict:
+        start = int(NextToken or 0)
+        end = start + int(MaxResults or self.page_size)
+        page = {"Items": [dict(item) for item in items[start:end]]}
+        if end < len(items):
+            page["NextToken"] = str(end)
+        return page
+
+    def get_child(self, api_id: str, collection: str, child_id: str) -> dict:
+        children = self.get_api(api_id)[collection]
+        if child_id not in children:
+            raise FakeClientError("NotFoundException", f"Invalid identifier specified {child_id}")
+        return children[child_id]
+
+    def api_summary(self, api: dict) -> dict:
+        return {
+            "ApiId": api["ApiId"],
+            "ApiEndpoint": api["ApiEndpoint"],
+            "Name": api["Name"],
+            "ProtocolType": "HTTP"
+        }
+
+    def op_GetApis(self, **params) -> dict:
+        return {"Items": [self.api_summary(api) for api in self.apis.values()]}
+
+    def op_ImportApi(self, Body: str, **params) -> dict:
+        api_id = self.next_id()
+        api = {
+            "ApiId": api_id,
+            "ApiEndpoint": f"https://{api_id}.execute-api.{self.region}.amazonaws.com",
+            "Stages": {},
+            "Deployments": {}
+        }
+        self.load_definition(api, Body)
+        self.apis[api_id] = api
+        return self.api_summary(api)
+
+    def op_ReimportApi(self, ApiId: str, Body: str, **params) -> dict:
+        api = self.get_api(ApiId)
+        self.load_definition(api, Body)
+        return self.api_summary(api)
+
+    def op_DeleteApi(self, ApiId: str) -> dict:
+        self.get_api(ApiId)
+        del self.apis[ApiId]
+        return {}
+
+    def op_CreateStage(self, ApiId: str, StageName: str, **params) -> dict:
+        api = self.get_api(ApiId)
+        if StageName in api["Stages"]:
+            raise FakeClientError("ConflictException", f"Stage already exists: {StageName}", 409)
+        api["Stages"][StageName] = dict(params, StageName=StageName)
+        if params.get("AutoDeploy"):
+            self.create_deployment(api, StageName)
+        return dict(api["Stages"][StageName])
+
+    def create_deployment(self, api: dict, stage_name: str) -> dict:
+        deployment_id = self.next_id()
+        deployment = api["Deployments"][deployment_id] = {
+            "DeploymentId": deployment_id,
+            "DeploymentStatus": self.deployment_status,
+            "AutoDeployed": True,
+            "CreatedDate": datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=len(api["Deployments"]))
+        }
+        # like the service, the stage keeps serving its deployment until a newer one succeeded
+        if self.deployment_status == "DEPLOYED":
+            api["Stages"][stage_name]["DeploymentId"] = deployment_id
+        return deployment
+
+    def auto_deploy(self, api_id: str) -> None:
+        # route and integration changes are deployed to every auto deploy stage
+        api = self.get_api(api_id)
+        for stage_name, stage in api["Stages"].items():
+            if stage.get("AutoDeploy"):
+                self.create_deployment(api, stage_name)
+
+    def op_GetDeployment(self, ApiId: str, DeploymentId: str) -> dict:
+        return dict(self.get_child(ApiId, "Deployments", DeploymentId))
+
+    def op_GetDeployments(self, ApiId: str, **params) -> dict:
+        return self.paginate(list(self.get_api(ApiId)["Deployments"].values()), **params)
+
+    def op_GetStage(self, ApiId: str, StageName: str) -> dict:
+        api = self.get_api(ApiId)
+        if StageName not in api["Stages"]:
+            raise FakeClientError("NotFoundException", f"Invalid stage identifier specified {StageName}")
+        return dict(api["Stages"][StageName])
+
+    def op_DeleteStage(self, ApiId: str, StageName: str) -> dict:
+        self.op_GetStage(ApiId, StageName)
+        del self.apis[ApiId]["Stages"][StageName]
+        return {}
+
+    def op_UpdateStage(self, ApiId: str, StageName: str, **params) -> dict:
+        stage = self.op_GetStage(ApiId, StageName)
+        stage.update(params)
+        self.apis[ApiId]["Stages"][StageName] = stage
+        return dict(stage)
+
+    def op_DeleteRouteSettings(self, ApiId: str, RouteKey: str, StageName: str) -> dict:
+        stage = self.op_GetStage(ApiId, StageName)
+        if RouteKey not in stage.get("RouteSettings", {}):
+            raise FakeClientError("NotFoundException", f"Invalid route settings specified {RouteKey}")
+        del self.apis[ApiId]["Stages"][StageName]["RouteSettings"][RouteKey]
+        return {}
+
+    def op_ExportApi(self, ApiId: str, **params) -> dict:
+        # like the service, the export is built from the current routes and
+        # integrations and carries defaults the imported definition omitted
+        api = self.get_api(ApiId)
+        paths = {}
+        for route in api["Routes"].values():
+            method, path = route["RouteKey"].split(" ", 1)
+            operation = {}
+            if route.get("Target"):
+                integration = api["Integrations"][route["Target"].replace("integrations/", "", 1)]
+                operation["x-amazon-apigateway-integration"] = {
+                    "type": integration["IntegrationType"].lower(),
+                    "uri": integration["IntegrationUri"],
+                    "httpMethod": integration.get("IntegrationMethod"),
+                    "payloadFormatVersion": integration.get("PayloadFormatVersion"),
+                    "connectionType": integration.get("ConnectionType", "INTERNET"),
+                    "timeoutInMillis": integration.get("TimeoutInMillis", 30000)
+                }
+            if route.get("OperationName"):
+                operation["operationId"] = route["OperationName"]
+            method = "x-amazon-apigateway-any-method" if method == "ANY" else method.lower()
+            paths.setdefault(path, {})[method] = operation
+
+        body = json.dumps({
+            "openapi": "3.0.1",
+            "info": {"title": api["Name"], "version": "2021-01-01 00:00:00UTC"},
+            "servers": [{"url": api["ApiEndpoint"]}],
+            "paths": paths
+        }).encode("utf-8")
+        return {"body": StreamingBody(io.BytesIO(body), len(body))}
+
+    def op_GetAuthorizers(self, ApiId: str, **params) -> dict:
+        return self.paginate(list(self.get_api(ApiId)["Authorizers"].values()), **params)
+
+    def op_GetRoutes(self, ApiId: str, **params) -> dict:
+        return self.paginate(list(self.get_api(ApiId)["Routes"].values()), **params)
+
+    def op_GetIntegrations(self, ApiId: str, **params) -> dict:
+        return self.paginate(list(self.get_api(ApiId)["Integrations"].values()), **params)
+
+    def op_CreateIntegration(self, ApiId: str, **params) -> dict:
+        integration_id = self.next_id()
+        integration = dict(params, IntegrationId=integration_id)
+        self.get_api(ApiId)["Integrations"][integration_id] = integration
+        self.auto_deploy(ApiId)
+        return dict(integration)
+
+    def op_UpdateIntegration(self, ApiId: str, IntegrationId: str, **params) -> dict:
+        integration = self.get_child(ApiId, "Integrations", IntegrationId)
+        integration.update(params)
+        self.auto_deploy(ApiId)
+        return dict(integration)
+
+    def op_DeleteIntegration(self, ApiId: str, IntegrationId: str) -> dict:
+        self.get_child(ApiId, "Integrations", IntegrationId)
+        # like the service, an integration a route still targets cannot be deleted
+        if any(route.get("Target") == f"integrations/{IntegrationId}" for route in self.apis[ApiId]["Routes"].values()):
+            raise FakeClientError("ConflictException", f"Integration {IntegrationId} is still targeted by a route", 409)
+        del self.apis[ApiId]["Integrations"][IntegrationId]
+        self.auto_deploy(ApiId)
+        return {}
+
+    def op_CreateRoute(self, ApiId: str, **params) -> dict:
+        route_id = self.next_id()
+        route = dict(params, RouteId=route_id)
+        route.setdefault("AuthorizationType", "NONE")
+        self.get_api(ApiId)["Routes"][route_id] = route
+        self.auto_deploy(ApiId)
+        return dict(route)
+
+    def op_UpdateRoute(self, ApiId: str, RouteId: str, **params) -> dict:
+        route = self.get_child(ApiId, "Routes", RouteId)
+        route.update(params)
+        self.auto_deploy(ApiId)
+        return dict(route)
+
+    def op_DeleteRoute(self, ApiId: str, RouteId: str) -> dict:
+        self.get_child(ApiId, "Routes", RouteId)
+        del self.apis[ApiId]["Routes"][RouteId]
+        self.auto_deploy(ApiId)
+        return {}
+
+
+class FakeClientError(Exception):
+
+    def __init__(self, code: str, message: str, status_code: int = 404):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
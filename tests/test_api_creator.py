@@ -0,0 +1,571 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from tests.conftest import RESOURCES_DIR
+
+
+def test_import_is_lazy_and_region_independent():
+    api_creation_dir = os.path.abspath(os.path.join(RESOURCES_DIR, "api_creation"))
+    env = dict(os.environ, PYTHONPATH=api_creation_dir)
+    env.pop("AWS_REGION", None)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api_creator"],
+        cwd=api_creation_dir,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    imported = {line.split("|")[-1].strip() for line in result.stderr.splitlines()}
+    assert "boto3" not in imported
+    assert "botocore" not in imported
+    assert "yaml" not in imported
+
+
+def custom_resource_event(request_type: str, **properties) -> dict:
+    event = {
+        "RequestType": request_type,
+        "ResourceProperties": {
+            "ApiGatewayAccessLogsLogGroupArn": "arn:aws:logs:us-east-1:123456789012:log-group:/aws/vendedlogs/ApiGatewayAccessLogs",
+            "ApiIntegrationPingLambda": "arn:aws:lambda:us-east-1:123456789012:function:ping",
+            "ApiIntegrationGreetingLambda": "arn:aws:lambda:us-east-1:123456789012:function:greeting",
+            "ApiDocumentationBucketName": "api-documentation-bucket",
+            "ApiDocumentationBucketUrl": "http://api-documentation-bucket.s3-website-us-east-1.amazonaws.com",
+            "ApiName": "apigateway-dynamic-publish",
+            "ApiStageName": "dev",
+            "ThrottlingBurstLimit": "500",
+            "ThrottlingRateLimit": "100"
+        }
+    }
+    event["ResourceProperties"].update(properties)
+
+    return event
+
+
+def run_provider(api_creator, event: dict, max_polls: int = 10, poll_seconds: float = 0) -> dict:
+    """
+        Drives the handlers the way the custom resource provider framework does,
+        on_event once and then is_complete with the on_event output merged in.
+        Returns the response, the data of the last is_complete merged in.
+    """
+    output = api_creator.lambda_handler(event, None)
+    event = dict(event, **output)
+
+    for _ in range(max_polls):
+        result = api_creator.is_complete_handler(event, None)
+        if result["IsComplete"]:
+            return dict(output, Data=dict(output["Data"], **result.get("Data", {})))
+        time.sleep(poll_seconds)
+
+    raise AssertionError(f"{event['RequestType']} did not complete after {max_polls} polls")
+
+
+# control plane calls expected per custom resource event, a change in these
+# numbers is a change in deployment latency and must be intentional
+EXPECTED_APIGATEWAY_CALLS = {
+    "Create": {"GetApis": 1, "ImportApi": 1, "CreateStage": 1, "GetStage": 1, "GetDeployment": 1},
+    "Update": {"GetApis": 1, "GetIntegrations": 1, "GetRoutes": 1, "UpdateStage": 1, "GetStage": 1, "GetDeployment": 1},
+    "Delete": {"GetApis": 2, "DeleteApi": 1}
+}
+
+# publish job (written by on_event, read and deleted by is_complete), publish lease (read, acquire, release),
+# documentation, snapshot and manifest writes, an unchanged update only reads the manifest and the current
+# snapshot, a job deployed by its first poll is not written again, a delete removes the documentation
+# in a single batch and the lease (read first, it is kept while held) in another
+EXPECTED_S3_CALLS = {
+    "Create": {"PutObject": 6, "GetObject": 3, "HeadObject": 1, "DeleteObject": 1},
+    "Update": {"PutObject": 4, "GetObject": 4, "DeleteObject": 1},
+    "Delete": {"GetObject": 1, "ListObjectVersions": 2, "DeleteObjects": 2}
+}
+
+# generous upper bound for a full lifecycle against local stand-ins
+LIFECYCLE_BUDGET_SECONDS = 5.0
+
+
+def test_lifecycle_control_plane_calls(api_creator_harness):
+    harness = api_creator_harness
+    started = time.perf_counter()
+
+    for request_type in ("Create", "Update", "Delete"):
+        harness.apigateway.calls.clear()
+        harness.s3_calls.clear()
+
+        output = run_provider(harness.api_creator, custom_resource_event(request_type))
+
+        assert output["PhysicalResourceId"] == "generated-api"
+        assert dict(harness.apigateway.calls) == EXPECTED_APIGATEWAY_CALLS[request_type], request_type
+        assert dict(harness.s3_calls) == EXPECTED_S3_CALLS[request_type], request_type
+
+    elapsed = time.perf_counter() - started
+    assert elapsed < LIFECYCLE_BUDGET_SECONDS, f"lifecycle took {elapsed:.2f}s"
+
+
+def test_on_event_hands_the_publish_to_is_complete(api_creator_harness):
+    harness = api_creator_harness
+    harness.apigateway.deployment_status = "PENDING"
+    event = custom_resource_event("Create")
+    event.update(harness.api_creator.lambda_handler(event, None))
+
+    # on_event only renders and stores the publish job
+    assert harness.apigateway.apis == {}
+    assert list(event["Data"]) == ["PublishToken"]
+
+    # the first poll publishes, the following ones only check the deployment
+    assert harness.api_creator.is_complete_handler(event, None) == {"IsComplete": False}
+    assert harness.apigateway.calls["ImportApi"] == 1
+    assert harness.api_creator.is_complete_handler(event, None) == {"IsComplete": False}
+    assert harness.apigateway.calls["ImportApi"] == 1
+
+    (api,) = harness.apigateway.apis.values()
+    for deployment in api["Deployments"].values():
+        deployment["DeploymentStatus"] = "FAILED"
+    with pytest.raises(ValueError, match="failed"):
+        harness.api_creator.is_complete_handler(event, None)
+
+    # a failed job is not kept
+    assert harness.s3.list_objects_v2(Bucket="api-documentation-bucket", Prefix="jobs/")["KeyCount"] == 0
+
+
+def test_is_complete_waits_for_the_updated_deployment(api_creator_harness):
+    harness = api_creator_harness
+    api_id = run_provider(harness.api_creator, custom_resource_event("Create"))["Data"]["ApiId"]
+    stages = harness.apigateway.apis[api_id]["Stages"]
+    deployed_id = stages["dev"]["DeploymentId"]
+
+    def start_update(function_name: str) -> dict:
+        event = custom_resource_event("Update", ApiIntegrationPingLambda=f"arn:aws:lambda:us-east-1:123456789012:function:{function_name}")
+        event.update(harness.api_creator.lambda_handler(event, None))
+        return event
+
+    # the stage keeps serving the deployment from before the update
+    harness.apigateway.deployment_status = "PENDING"
+    event = start_update("ping-v2")
+
+    assert harness.api_creator.is_complete_handler(event, None) == {"IsComplete": False}
+    assert stages["dev"]["DeploymentId"] == deployed_id
+    job = harness.api_creator.spec_store.read_job(harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", event["Data"]["PublishToken"])
+    assert job["Published"]["us-east-1"][2] == deployed_id
+
+    updated = [deployment for deployment in harness.apigateway.apis[api_id]["Deployments"].values() if deployment["DeploymentId"] != deployed_id]
+    updated[-1]["DeploymentStatus"] = "DEPLOYED"
+    stages["dev"]["DeploymentId"] = updated[-1]["DeploymentId"]
+    completed = harness.api_creator.is_complete_handler(event, None)
+    assert completed["IsComplete"] is True
+    assert completed["Data"]["ApiId"] == completed["Data"]["ApiId-us-east-1"] == api_id
+
+    # a newer deployment which failed fails the update, the stage never serves it
+    deployed_id = stages["dev"]["DeploymentId"]
+    event = start_update("ping-v3")
+    assert harness.api_creator.is_complete_handler(event, None) == {"IsComplete": False}
+    failed = [deployment for deployment in harness.apigateway.apis[api_id]["Deployments"].values() if deployment["DeploymentId"] not in (deployed_id, updated[-1]["DeploymentId"])]
+    failed[-1]["DeploymentStatus"] = "FAILED"
+    with pytest.raises(ValueError, match=f"Deployment {failed[-1]['DeploymentId']} .* failed"):
+        harness.api_creator.is_complete_handler(event, None)
+
+
+def test_create_publishes_api_and_documentation(api_creator_harness):
+    harness = api_creator_harness
+
+    output = run_provider(harness.api_creator, custom_resource_event("Create"))
+
+    api = harness.apigateway.apis[output["Data"]["ApiId"]]
+    assert output["Data"]["ApiEndpoint"] == api["ApiEndpoint"]
+    assert sorted(route["RouteKey"] for route in api["Routes"].values()) == ["GET /greeting", "GET /ping"]
+    assert api["Stages"]["dev"]["DefaultRouteSettings"]["ThrottlingBurstLimit"] == 500
+
+    swagger = json.loads(
+        harness.s3.get_object(Bucket="api-documentation-bucket", Key="swagger.json")["Body"].read()
+    )
+    assert swagger["info"]["title"] == "apigateway-dynamic-publish"
+
+    # the markdown samples are only published with the documentation
+    assert "Sample invocation" in swagger["paths"]["/ping"]["get"]["description"]
+    assert "description" not in api["Definition"]["paths"]["/ping"]["get"]
+    assert api["Definition"]["paths"]["/ping"]["get"]["responses"]["200"]["description"] == "OK"
+
+
+def test_delete_removes_api(api_creator_harness):
+    harness = api_creator_harness
+    run_provider(harness.api_creator, custom_resource_event("Create"))
+
+    output = harness.api_creator.lambda_handler(custom_resource_event("Delete"), None)
+
+    assert output["Data"]["ApiId"] == "Deleted"
+    assert harness.apigateway.apis == {}
+    assert harness.s3.list_object_versions(Bucket="api-documentation-bucket").get("Versions", []) == []
+
+    # a repeated delete finds nothing left to delete
+    harness.apigateway.calls.clear()
+    harness.s3_calls.clear()
+    harness.api_creator.lambda_handler(custom_resource_event("Delete"), None)
+
+    assert dict(harness.apigateway.calls) == {"GetApis": 1}
+    assert dict(harness.s3_calls) == {"GetObject": 1, "ListObjectVersions": 2}
+
+
+def test_delete_removes_the_lease_from_the_lock_bucket(api_creator_harness):
+    harness = api_creator_harness
+    harness.s3.create_bucket(Bucket="shared-publish-locks")
+    harness.s3.put_object(Bucket="shared-publish-locks", Key="locks/other-api.json", Body=b"{}")
+
+    run_provider(harness.api_creator, custom_resource_event("Create", PublishLockBucketName="shared-publish-locks"))
+    assert harness.s3.get_object(Bucket="shared-publish-locks", Key="locks/apigateway-dynamic-publish.json")
+
+    harness.api_creator.lambda_handler(custom_resource_event("Delete", PublishLockBucketName="shared-publish-locks"), None)
+
+    keys = [version["Key"] for version in harness.s3.list_object_versions(Bucket="shared-publish-locks").get("Versions", [])]
+    assert keys == ["locks/other-api.json"]
+
+
+def test_concurrent_creates_publish_a_single_api(api_creator_harness):
+    import threading
+
+    harness = api_creator_harness
+
+    # a retried create racing the original one
+    outputs = []
+    threads = [
+        threading.Thread(target=lambda: outputs.append(
+            run_provider(harness.api_creator, custom_resource_event("Create"), max_polls=100, poll_seconds=0.05)
+        ))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(harness.apigateway.apis) == 1
+    assert harness.apigateway.calls["ImportApi"] == 1
+    assert [output["Data"]["ApiId"] for output in outputs] == list(harness.apigateway.apis) * 2
+
+
+def test_is_complete_waits_for_the_publish_lease_between_polls(api_creator_harness):
+    import publish_lock
+
+    harness = api_creator_harness
+    created = run_provider(harness.api_creator, custom_resource_event("Create"))
+    event = custom_resource_event("Update")
+    event.update(harness.api_creator.lambda_handler(event, None))
+    job = harness.api_creator.spec_store.read_job(harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", event["Data"]["PublishToken"])
+
+    # a retried event publishing the same work holds the lease, the poll returns instead of sleeping
+    _, released_etag = publish_lock.read_lock(harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish")
+    lease = publish_lock.new_lease("retried-event", job["WorkDigest"])
+    etag = publish_lock.write_lock(harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", lease, released_etag)
+    harness.apigateway.calls.clear()
+
+    started = time.perf_counter()
+    assert harness.api_creator.is_complete_handler(event, None) == {"IsComplete": False}
+    assert time.perf_counter() - started < publish_lock.lock_poll_seconds
+    assert dict(harness.apigateway.calls) == {}
+
+    # once the holder released the lease its result is reused rather than published again
+    publish_lock.release_lock(
+        harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", lease, etag,
+        {"us-east-1": [created["Data"]["ApiEndpoint"], created["Data"]["ApiId"], ""]}
+    )
+
+    completed = harness.api_creator.is_complete_handler(event, None)
+    assert completed["IsComplete"] is True
+    assert completed["Data"]["ApiId"] == created["Data"]["ApiId"]
+    assert dict(harness.apigateway.calls) == {"GetStage": 1, "GetDeployment": 1}
+
+
+def test_update_applies_only_changed_routes(api_creator_harness):
+    harness = api_creator_harness
+    harness.apigateway.page_size = 1
+    api_id = run_provider(harness.api_creator, custom_resource_event("Create"))["Data"]["ApiId"]
+    ping_route_id = next(
+        route_id for route_id, route in harness.apigateway.apis[api_id]["Routes"].items()
+        if route["RouteKey"] == "GET /ping"
+    )
+    harness.apigateway.calls.clear()
+
+    run_provider(
+        harness.api_creator,
+        custom_resource_event("Update", ApiIntegrationPingLambda="arn:aws:lambda:us-east-1:123456789012:function:ping-v2")
+    )
+
+    # both list calls were paginated one item per page
+    assert harness.apigateway.calls["GetRoutes"] == 2
+    assert harness.apigateway.calls["GetIntegrations"] == 2
+    assert harness.apigateway.calls["UpdateIntegration"] == 1
+    assert "ReimportApi" not in harness.apigateway.calls
+    api = harness.apigateway.apis[api_id]
+    ping_integration_id = api["Routes"][ping_route_id]["Target"].split("/")[1]
+    assert "function:ping-v2" in api["Integrations"][ping_integration_id]["IntegrationUri"]
+
+
+def test_update_reimport_strategy(api_creator_harness):
+    harness = api_creator_harness
+    run_provider(harness.api_creator, custom_resource_event("Create"))
+    harness.apigateway.calls.clear()
+
+    run_provider(harness.api_creator, custom_resource_event("Update", ApiUpdateStrategy="reimport"))
+
+    # the stage is recreated, then its deployment checked
+    assert dict(harness.apigateway.calls) == {
+        "GetApis": 2, "ReimportApi": 1, "GetStage": 2, "DeleteStage": 1, "CreateStage": 1, "GetDeployment": 1
+    }
+
+
+def test_update_reimports_changed_unmodelled_elements(api_creator_harness):
+    harness = api_creator_harness
+    event = custom_resource_event("Create")
+    run_provider(harness.api_creator, event)
+    manifest = harness.api_creator.spec_store.read_manifest(harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", "dev")
+    deployed = harness.api_creator.spec_store.load_current_snapshots(harness.s3, "api-documentation-bucket", manifest)["us-east-1"]
+    properties = event["ResourceProperties"]
+
+    def publish(api_definition):
+        harness.apigateway.calls.clear()
+        harness.api_creator.publish_region(
+            "us-east-1", api_definition, properties["ApiName"], properties["ApiStageName"],
+            properties["ApiGatewayAccessLogsLogGroupArn"], 500, 100, "routes", deployed
+        )
+        return harness.apigateway.calls
+
+    assert "ReimportApi" not in publish(deployed)
+    # request validators are not modelled by the route planner
+    assert publish(dict(deployed, **{"x-amazon-apigateway-request-validator": "params-only"}))["ReimportApi"] == 1
+
+
+def test_publishes_to_additional_regions(api_creator_harness):
+    harness = api_creator_harness
+    from tests.fake_apigatewayv2 import FakeApiGatewayV2
+
+    regional_apigateway = FakeApiGatewayV2(region="eu-west-1")
+    regional_apigateway.attach(harness.api_creator.get_apigateway_client("eu-west-1"))
+
+    replica_ping_lambda = "arn:aws:lambda:eu-west-1:123456789012:function:ping"
+    event = custom_resource_event(
+        "Create",
+        ApiRegions=["eu-west-1"],
+        RegionalSubstitutions={"eu-west-1": {"API_INTEGRATION_PING_LAMBDA": replica_ping_lambda}}
+    )
+    output = run_provider(harness.api_creator, event)
+
+    regional_api = regional_apigateway.apis[output["Data"]["ApiId-eu-west-1"]]
+    assert output["Data"]["ApiId"] in harness.apigateway.apis
+    assert json.loads(output["Data"]["ApiEndpoints"]) == {
+        "us-east-1": output["Data"]["ApiEndpoint"],
+        "eu-west-1": regional_api["ApiEndpoint"]
+    }
+    assert sorted(integration["IntegrationUri"] for integration in regional_api["Integrations"].values()) == [
+        "arn:aws:apigateway:eu-west-1:lambda:path/2015-03-31/functions/"
+        f"{replica_ping_lambda}/invocations",
+        "arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/functions/"
+        "arn:aws:lambda:us-east-1:123456789012:function:greeting/invocations"
+    ]
+    # the documentation is published once, from the stack region definition, under a single lease and a single job
+    assert harness.s3_calls["PutObject"] == 7
+    # one snapshot per distinct regional definition
+    assert harness.s3.list_objects_v2(Bucket="api-documentation-bucket", Prefix="snapshots/")["KeyCount"] == 2
+    # every stage logs to a log group of its own region, provisioned by the api creator outside the stack region
+    assert regional_api["Stages"]["dev"]["AccessLogSettings"]["DestinationArn"] == (
+        "arn:aws:logs:eu-west-1:123456789012:log-group:/aws/vendedlogs/ApiGatewayAccessLogs"
+    )
+    regional_logs = harness.api_creator.get_client("logs", "eu-west-1")
+    assert [log_group["retentionInDays"] for log_group in regional_logs.describe_log_groups()["logGroups"]] == [14]
+
+    run_provider(harness.api_creator, custom_resource_event("Delete", ApiRegions=["eu-west-1"]))
+
+    assert harness.apigateway.apis == {}
+    assert regional_apigateway.apis == {}
+    assert regional_logs.describe_log_groups()["logGroups"] == []
+
+
+def test_update_tears_down_dropped_regions(api_creator_harness):
+    harness = api_creator_harness
+    from tests.fake_apigatewayv2 import FakeApiGatewayV2
+
+    regional_apigateway = FakeApiGatewayV2(region="eu-west-1")
+    regional_apigateway.attach(harness.api_creator.get_apigateway_client("eu-west-1"))
+    created = custom_resource_event("Create", ApiRegions=["eu-west-1"])
+    run_provider(harness.api_creator, created)
+    regional_logs = harness.api_creator.get_client("logs", "eu-west-1")
+    assert len(regional_logs.describe_log_groups()["logGroups"]) == 1
+
+    # eu-west-1 is removed from regions in cdk.json
+    event = custom_resource_event("Update")
+    event["OldResourceProperties"] = created["ResourceProperties"]
+    output = run_provider(harness.api_creator, event)
+
+    assert regional_apigateway.apis == {}
+    assert regional_logs.describe_log_groups()["logGroups"] == []
+    assert json.loads(output["Data"]["ApiEndpoints"]) == {"us-east-1": output["Data"]["ApiEndpoint"]}
+    assert output["Data"]["ApiId"] in harness.apigateway.apis
+
+
+def test_regional_access_log_group_override(api_creator_harness):
+    harness = api_creator_harness
+    from tests.fake_apigatewayv2 import FakeApiGatewayV2
+
+    regional_apigateway = FakeApiGatewayV2(region="eu-west-1")
+    regional_apigateway.attach(harness.api_creator.get_apigateway_client("eu-west-1"))
+
+    regional_log_group_arn = "arn:aws:logs:eu-west-1:123456789012:log-group:/aws/vendedlogs/SharedAccessLogs"
+    output = run_provider(harness.api_creator, custom_resource_event(
+        "Create",
+        ApiRegions=["eu-west-1"],
+        RegionalAccessLogGroupArns={"eu-west-1": regional_log_group_arn}
+    ))
+
+    regional_api = regional_apigateway.apis[output["Data"]["ApiId-eu-west-1"]]
+    assert regional_api["Stages"]["dev"]["AccessLogSettings"]["DestinationArn"] == regional_log_group_arn
+    assert harness.api_creator.get_client("logs", "eu-west-1").describe_log_groups()["logGroups"] == []
+
+
+def test_rollback_redeploys_previous_snapshot(api_creator_harness, monkeypatch):
+    harness = api_creator_harness
+    monkeypatch.setenv("API_NAME", "apigateway-dynamic-publish")
+    monkeypatch.setenv("API_STAGE_NAME", "dev")
+    monkeypatch.setenv("API_DOCUMENTATION_BUCKET_NAME", "api-documentation-bucket")
+
+    run_provider(harness.api_creator, custom_resource_event("Create"))
+    output = run_provider(
+        harness.api_creator,
+        custom_resource_event("Update", ApiIntegrationPingLambda="arn:aws:lambda:us-east-1:123456789012:function:ping-v2")
+    )
+
+    harness.apigateway.calls.clear()
+    rollback = harness.api_creator.rollback_handler({}, None)
+
+    integration_uris = sorted(
+        integration["IntegrationUri"]
+        for integration in harness.apigateway.apis[output["Data"]["ApiId"]]["Integrations"].values()
+    )
+    assert "function:ping/invocations" in integration_uris[1]
+    assert rollback["ApiIds"] == {"us-east-1": output["Data"]["ApiId"]}
+    # route level rollback, nothing is re-imported
+    assert "ReimportApi" not in harness.apigateway.calls
+    assert harness.apigateway.calls["UpdateIntegration"] == 1
+
+    manifest = json.loads(harness.s3.get_object(
+        Bucket="api-documentation-bucket", Key="manifests/apigateway-dynamic-publish/dev.json"
+    )["Body"].read())
+    assert [version["Digest"] for version in manifest["Versions"]][0] == manifest["Current"] == rollback["Digest"]
+    assert manifest["Versions"][-1]["RolledBackFrom"] == rollback["RolledBackFrom"]
+
+
+def test_router_mode_points_every_integration_at_the_router(api_creator_harness):
+    harness = api_creator_harness
+    router_lambda = "arn:aws:lambda:us-east-1:123456789012:function:router"
+    event = custom_resource_event("Create", ApiIntegrationRouterLambda=router_lambda)
+    del event["ResourceProperties"]["ApiIntegrationPingLambda"]
+    del event["ResourceProperties"]["ApiIntegrationGreetingLambda"]
+
+    output = run_provider(harness.api_creator, event)
+
+    integrations = harness.apigateway.apis[output["Data"]["ApiId"]]["Integrations"].values()
+    assert {integration["IntegrationUri"] for integration in integrations} == {
+        f"arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/functions/{router_lambda}/invocations"
+    }
+
+
+def authorizer_definition(substitutions: dict) -> dict:
+    return {
+        "components": {
+            "securitySchemes": {
+                "tokenAuthorizer": {
+                    "type": "apiKey",
+                    "name": "Authorization",
+                    "in": "header",
+                    "x-amazon-apigateway-authorizer": {
+                        "type": "request",
+                        "identitySource": "$request.header.Authorization",
+                        "authorizerUri": substitutions["API_AUTHORIZER_LAMBDA"],
+                        "authorizerPayloadFormatVersion": "2.0",
+                        "authorizerResultTtlInSeconds": int(substitutions["AUTHORIZER_TTL"]),
+                        "enableSimpleResponses": True
+                    }
+                }
+            }
+        },
+        "security": [{"tokenAuthorizer": []}]
+    }
+
+
+def merge_definition(api_definition: dict, overrides: dict) -> dict:
+    merged = dict(api_definition)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = merge_definition(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+@pytest.fixture
+def authorized_definition(api_creator_harness, monkeypatch):
+    # the rendered definition gets a lambda authorizer, required by every route
+    render_api_definition = api_creator_harness.api_creator.render_api_definition
+    monkeypatch.setattr(
+        api_creator_harness.api_creator,
+        "render_api_definition",
+        lambda root_file, substitutions: merge_definition(
+            render_api_definition(root_file, substitutions), authorizer_definition(substitutions)
+        )
+    )
+
+
+def test_create_imports_spec_declared_authorizers(api_creator_harness, authorized_definition):
+    harness = api_creator_harness
+    authorizer_lambda = "arn:aws:lambda:us-east-1:123456789012:function:authorizer"
+
+    output = run_provider(
+        harness.api_creator,
+        custom_resource_event("Create", ApiAuthorizerLambda=authorizer_lambda, ApiSubstitutions={"AUTHORIZER_TTL": "300"})
+    )
+
+    api = harness.apigateway.apis[output["Data"]["ApiId"]]
+    (authorizer,) = api["Authorizers"].values()
+    assert authorizer["AuthorizerUri"] == (
+        f"arn:aws:apigateway:us-east-1:lambda:path/2015-03-31/functions/{authorizer_lambda}/invocations"
+    )
+    assert authorizer["AuthorizerResultTtlInSeconds"] == 300
+    assert authorizer["IdentitySource"] == ["$request.header.Authorization"]
+    assert {route["AuthorizerId"] for route in api["Routes"].values()} == {authorizer["AuthorizerId"]}
+
+
+def test_invalid_authorizer_fails_before_import(api_creator_harness, authorized_definition):
+    harness = api_creator_harness
+
+    with pytest.raises(ValueError, match="between 0 and 3600"):
+        harness.api_creator.lambda_handler(
+            custom_resource_event(
+                "Create",
+                ApiAuthorizerLambda="arn:aws:lambda:us-east-1:123456789012:function:authorizer",
+                ApiSubstitutions={"AUTHORIZER_TTL": "7200"}
+            ),
+            None
+        )
+
+    assert "ImportApi" not in harness.apigateway.calls
+
+
+def test_validate_jwt_authorizer(api_creator_harness):
+    validate_authorizers = api_creator_harness.api_creator.validate_authorizers
+    jwt_authorizer = {
+        "type": "jwt",
+        "identitySource": "$request.header.Authorization",
+        "jwtConfiguration": {"issuer": "https://issuer.example.com", "audience": ["api"]}
+    }
+    definition = {
+        "components": {"securitySchemes": {"jwt": {"type": "oauth2", "x-amazon-apigateway-authorizer": jwt_authorizer}}},
+        "paths": {"/ping": {"get": {"security": [{"jwt": ["read"]}]}}}
+    }
+
+    validate_authorizers(definition)
+
+    del jwt_authorizer["jwtConfiguration"]["issuer"]
+    definition["paths"]["/ping"]["get"]["security"].append({"undeclared": []})
+    with pytest.raises(ValueError, match="issuer.*undeclared|undeclared.*issuer"):
+        validate_authorizers(definition)
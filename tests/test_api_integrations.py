@@ -0,0 +1,90 @@
+import base64
+import gzip
+import json
+import os
+
+import api_response
+import greeting
+import ping
+import router
+
+
+def test_ping_returns_minified_json():
+    response = ping.lambda_handler({"headers": {}}, None)
+
+    assert response["statusCode"] == 200
+    assert response["body"] == '{"ping":"Pong"}'
+    assert "isBase64Encoded" not in response
+
+
+def test_greeting_missing_parameter_returns_error():
+    response = greeting.lambda_handler({"headers": {}, "rawPath": "/greeting"}, None)
+
+    assert response["statusCode"] == 500
+    assert "greeting is expected" in json.loads(response["body"])["error"]
+
+
+def test_small_bodies_are_not_compressed():
+    event = {"headers": {"accept-encoding": "gzip"}}
+
+    response = api_response.build_response(event, 200, {"ping": "Pong"})
+
+    assert "Content-Encoding" not in response["headers"]
+    assert response["body"] == '{"ping":"Pong"}'
+
+
+def test_large_bodies_are_gzip_compressed(monkeypatch):
+    monkeypatch.setattr(api_response, "brotli", None)
+    payload = {"items": ["greeting"] * 500}
+    event = {"headers": {"accept-encoding": "deflate, gzip;q=0.8"}}
+
+    response = api_response.build_response(event, 200, payload)
+
+    assert response["isBase64Encoded"] is True
+    assert response["headers"]["Content-Encoding"] == "gzip"
+    body = gzip.decompress(base64.b64decode(response["body"]))
+    assert json.loads(body) == payload
+    assert len(response["body"]) < len(body)
+
+
+def test_large_bodies_respect_client_refusal(monkeypatch):
+    monkeypatch.setattr(api_response, "brotli", None)
+    payload = {"items": ["greeting"] * 500}
+    event = {"headers": {"Accept-Encoding": "gzip;q=0, identity"}}
+
+    response = api_response.build_response(event, 200, payload)
+
+    assert "Content-Encoding" not in response["headers"]
+    assert json.loads(response["body"]) == payload
+
+
+def test_negotiate_encoding():
+    assert api_response.negotiate_encoding(None) is None
+    assert api_response.negotiate_encoding("identity") is None
+    assert api_response.negotiate_encoding("*") in api_response.supported_encodings()
+    assert api_response.negotiate_encoding("br;q=0.1, gzip;q=0.9") == "gzip"
+
+
+def test_router_dispatches_on_route_key(monkeypatch):
+    monkeypatch.setattr(router, "dispatch_table", router.build_dispatch_table({"GET /ping": "ping", "GET /greeting": "greeting"}))
+
+    response = router.lambda_handler({"headers": {}, "routeKey": "GET /ping"}, None)
+    assert response["body"] == '{"ping":"Pong"}'
+
+    # payload format 1.0
+    event = {"headers": {}, "queryStringParameters": {"greeting": "Bob"}, "httpMethod": "GET", "resource": "/greeting"}
+    response = router.lambda_handler(event, None)
+    assert json.loads(response["body"]) == {"greeting": "Hello Bob"}
+
+    response = router.lambda_handler({"headers": {}, "routeKey": "GET /unknown"}, None)
+    assert response["statusCode"] == 404
+
+
+def test_router_table_covers_every_operation_in_the_definition():
+    from stacks.apigateway_dynamic_publish import build_route_handlers
+    from stacks.api_monitoring import read_api_routes
+
+    route_handlers = build_route_handlers(read_api_routes())
+
+    assert route_handlers == {"GET /ping": "ping", "GET /greeting": "greeting"}
+    assert set(router.build_dispatch_table(route_handlers)) == set(route_handlers)
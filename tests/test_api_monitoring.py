@@ -0,0 +1,10 @@
+from stacks.api_monitoring import read_api_routes
+
+
+def test_read_api_routes():
+    routes = {f"{route['Method']} {route['Path']}": route for route in read_api_routes()}
+
+    assert set(routes) == {"GET /ping", "GET /greeting"}
+    assert routes["GET /ping"]["Integration"] == "API_INTEGRATION_PING_LAMBDA"
+    assert routes["GET /ping"]["OperationId"] == "pingIntegration"
+    assert routes["GET /greeting"]["Slo"] == {"p99LatencyMs": 500, "throttles": 0}
@@ -1,10 +1,33 @@
+import json
+
 import aws_cdk as cdk
+import pytest
 from aws_cdk.assertions import Template
 from aws_cdk.assertions import Match
 
 from stacks.apigateway_dynamic_publish import ApiGatewayDynamicPublishStack
 
 
+@pytest.fixture
+def template(request, monkeypatch):
+    """
+        Template of the stack synthesized with cdk.json, with the "api" context
+        overridden by the indirect parameter, e.g.
+        @pytest.mark.parametrize("template", [{"integrationMode": "router"}], indirect=True)
+    """
+    api_overrides = getattr(request, "param", {})
+    read_cdk_context_json = ApiGatewayDynamicPublishStack.read_cdk_context_json
+
+    def overridden_context(stack):
+        config = read_cdk_context_json(stack)
+        config['api'].update(api_overrides)
+        return config
+
+    monkeypatch.setattr(ApiGatewayDynamicPublishStack, "read_cdk_context_json", overridden_context)
+
+    return Template.from_stack(ApiGatewayDynamicPublishStack(cdk.App(), "ApiGatewayDynamicPublishStack"))
+
+
 def test_synthesizes_properly():
     app = cdk.App()
 
@@ -20,11 +43,17 @@ def test_synthesizes_properly():
     # Assert that we have the expected resources
     template.resource_count_is("AWS::S3::Bucket", 1)
     template.resource_count_is("AWS::KMS::Key", 1)
-    template.resource_count_is("AWS::Lambda::Function", 5)
-    template.resource_count_is("AWS::IAM::Role", 4)
-    template.resource_count_is("AWS::IAM::Policy", 3)
-    template.resource_count_is("AWS::Lambda::Permission", 2)
+    template.resource_count_is("AWS::Lambda::Function", 10)
+    template.resource_count_is("AWS::IAM::Role", 7)
+    template.resource_count_is("AWS::IAM::Policy", 6)
+    template.resource_count_is("AWS::Lambda::Permission", 3)
+    template.resource_count_is("AWS::Events::Rule", 1)
+    template.resource_count_is("AWS::CloudWatch::Dashboard", 1)
+    template.resource_count_is("AWS::CloudWatch::Alarm", 4)
+    template.resource_count_is("AWS::Logs::MetricFilter", 2)
+    template.resource_count_is("AWS::SNS::Topic", 1)
     template.resource_count_is("AWS::CloudFormation::CustomResource", 1)
+    template.resource_count_is("AWS::StepFunctions::StateMachine", 1)
     template.resource_count_is("Custom::S3AutoDeleteObjects", 1)
     template.resource_count_is("AWS::S3::BucketPolicy", 1)
 
@@ -236,7 +265,12 @@ def test_synthesizes_properly():
                 "ApiName": Match.any_value(),
                 "ApiStageName": Match.any_value(),
                 "ThrottlingBurstLimit": Match.any_value(),
-                "ThrottlingRateLimit": Match.any_value()
+                "ThrottlingRateLimit": Match.any_value(),
+                "ApiUpdateStrategy": "routes",
+                "ApiRegions": [],
+                "RegionalSubstitutions": {},
+                "RegionalAccessLogGroupArns": {},
+                "ApiSubstitutions": {}
             }
         )
     )
@@ -400,3 +434,55 @@ def test_synthesizes_properly():
             }
         )
     )
+
+
+@pytest.mark.parametrize("template", [{"integrationMode": "router"}], indirect=True)
+def test_router_integration_mode(template):
+    # a single integration function serves every operation
+    template.resource_count_is("AWS::Lambda::Function", 9)
+    template.resource_count_is("AWS::Lambda::Permission", 2)
+    # the route table is built from the definition at synth time
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "router.lambda_handler",
+        "Environment": {"Variables": {"ROUTE_HANDLERS": json.dumps({"GET /greeting": "greeting", "GET /ping": "ping"})}}
+    })
+    # throttles are counted per route from the access logs, not per function
+    template.resource_count_is("AWS::CloudWatch::Alarm", 4)
+    template.has_resource_properties("AWS::Logs::MetricFilter", {
+        "FilterPattern": '[ip, identity, user, time, request = "* GET /ping *", status = 429, ...]'
+    })
+    template.has_resource_properties(
+        "AWS::CloudFormation::CustomResource",
+        Match.object_like({"ApiIntegrationRouterLambda": Match.any_value()})
+    )
+    assert not template.find_resources("AWS::Lambda::Function", {"Properties": {"Handler": "ping.lambda_handler"}})
+
+
+@pytest.mark.parametrize("template", [{"authorizerLambdaArn": "arn:aws:lambda:us-east-1:123456789012:function:authorizer"}], indirect=True)
+def test_authorizer_permission(template):
+    template.has_resource_properties(
+        "AWS::Lambda::Permission",
+        {
+            "FunctionName": "arn:aws:lambda:us-east-1:123456789012:function:authorizer",
+            "Principal": "apigateway.amazonaws.com"
+        }
+    )
+    template.has_resource_properties(
+        "AWS::CloudFormation::CustomResource",
+        Match.object_like({"ApiAuthorizerLambda": "arn:aws:lambda:us-east-1:123456789012:function:authorizer"})
+    )
+
+
+@pytest.mark.parametrize("template", [{"publishLockBucketName": "shared-publish-locks"}], indirect=True)
+def test_shared_publish_lock_bucket(template):
+    template.has_resource_properties(
+        "AWS::CloudFormation::CustomResource",
+        Match.object_like({"PublishLockBucketName": "shared-publish-locks"})
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Handler": "api_creator.rollback_handler",
+            "Environment": {"Variables": Match.object_like({"PUBLISH_LOCK_BUCKET_NAME": "shared-publish-locks"})}
+        }
+    )
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from apidocs import doc_server
+from tests.conftest import RESOURCES_DIR
+
+
+def test_swagger_json_is_downloaded_only_when_the_etag_changes(aws_environment, tmp_path):
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="api-documentation-bucket")
+        s3_client.put_object(Bucket="api-documentation-bucket", Key="swagger.json", Body=b'{"v": 1}')
+
+        # the cached copy is served on a 304 response, bodies of 200 responses are tracked
+        downloads = []
+        s3_client.meta.events.register(
+            "after-call.s3.GetObject",
+            lambda http_response, **kwargs: downloads.append(http_response.status_code)
+        )
+
+        assert doc_server.fetch_swagger_json(s3_client, "api-documentation-bucket", str(tmp_path)) == b'{"v": 1}'
+        assert doc_server.fetch_swagger_json(s3_client, "api-documentation-bucket", str(tmp_path)) == b'{"v": 1}'
+
+        s3_client.put_object(Bucket="api-documentation-bucket", Key="swagger.json", Body=b'{"v": 2}')
+        assert doc_server.fetch_swagger_json(s3_client, "api-documentation-bucket", str(tmp_path)) == b'{"v": 2}'
+
+    assert downloads == [200, 304, 200]
+
+
+def test_renders_local_definition():
+    root_file = os.path.join(RESOURCES_DIR, "api_creation", "api_definition.yaml")
+
+    api_definition = json.loads(doc_server.render_local_definition(root_file))
+
+    assert {"/ping", "/greeting"} <= set(api_definition["paths"])
+    integration = api_definition["paths"]["/ping"]["get"]["x-amazon-apigateway-integration"]
+    assert "<API_INTEGRATION_PING_LAMBDA>" in integration["uri"]
+
+
+@pytest.fixture
+def documentation_server(tmp_path):
+    ui_dir = tmp_path / "swagger-ui-4.5.2"
+    ui_dir.mkdir()
+    (ui_dir / "index.html").write_text(f'<script>SwaggerUIBundle({{url: "{doc_server.SWAGGER_UI_DEFAULT_URL}"}})</script>')
+    (ui_dir / "swagger-ui-bundle.js").write_text("var bundle = 1;\n" * 500)
+
+    server = doc_server.create_server(doc_server.load_site(str(ui_dir), b'{"openapi": "3.0.1"}'), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f"http://localhost:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, headers=None):
+    try:
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}))
+    except urllib.error.HTTPError as e:
+        return e
+
+
+def test_serves_with_gzip_etag_and_cache_control(documentation_server):
+    index = get(f"{documentation_server}/")
+    assert index.status == 200
+    assert b'url: "swagger.json"' in index.read()
+    assert index.headers["Cache-Control"] == "no-cache"
+
+    bundle = get(f"{documentation_server}/swagger-ui-bundle.js", {"Accept-Encoding": "gzip, deflate"})
+    assert bundle.status == 200
+    assert bundle.headers["Content-Encoding"] == "gzip"
+    assert bundle.headers["Cache-Control"] == doc_server.ASSETS
+    assert gzip.decompress(bundle.read()) == b"var bundle = 1;\n" * 500
+
+    revalidated = get(
+        f"{documentation_server}/swagger-ui-bundle.js",
+        {"Accept-Encoding": "gzip", "If-None-Match": bundle.headers["ETag"]}
+    )
+    assert revalidated.status == 304
+
+    # the identity encoding has its own ETag
+    identity = get(f"{documentation_server}/swagger-ui-bundle.js", {"If-None-Match": bundle.headers["ETag"]})
+    assert identity.status == 200
+    assert "Content-Encoding" not in identity.headers
+
+    assert get(f"{documentation_server}/swagger.json").read() == b'{"openapi": "3.0.1"}'
+    assert get(f"{documentation_server}/missing.js").status == 404
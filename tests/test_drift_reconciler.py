@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from tests.test_api_creator import custom_resource_event, run_provider
+
+
+@pytest.fixture
+def reconciler(api_creator_harness, monkeypatch):
+    import drift_reconciler
+
+    monkeypatch.setenv("API_NAME", "apigateway-dynamic-publish")
+    monkeypatch.setenv("API_STAGE_NAME", "dev")
+    monkeypatch.setenv("API_DOCUMENTATION_BUCKET_NAME", "api-documentation-bucket")
+    monkeypatch.setattr(drift_reconciler, "snapshot_cache", {})
+
+    run_provider(api_creator_harness.api_creator, custom_resource_event("Create"))
+    api_creator_harness.apigateway.calls.clear()
+
+    return drift_reconciler
+
+
+def test_no_drift_costs_two_calls(api_creator_harness, reconciler, capsys):
+    result = reconciler.lambda_handler({}, None)
+
+    assert result["Regions"]["us-east-1"]["Drifted"] is False
+    assert dict(api_creator_harness.apigateway.calls) == {"ExportApi": 1, "GetStage": 1}
+
+    metrics = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert metrics["RouteDrift"] == 0
+    assert metrics["StageDrift"] == 0
+
+
+def test_detects_and_heals_drift(api_creator_harness, reconciler, monkeypatch, capsys):
+    api = next(iter(api_creator_harness.apigateway.apis.values()))
+    for integration in api["Integrations"].values():
+        if "function:ping" in integration["IntegrationUri"]:
+            integration["IntegrationUri"] = integration["IntegrationUri"].replace("function:ping", "function:edited")
+    stage = api["Stages"]["dev"]
+    stage["DefaultRouteSettings"] = dict(stage["DefaultRouteSettings"], ThrottlingBurstLimit=1)
+    stage["RouteSettings"] = {"GET /ping": {"ThrottlingBurstLimit": 1}}
+
+    result = reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]
+
+    assert result["Routes"] == ["GET /ping"]
+    assert result["Stage"] == ["DefaultRouteSettings", "RouteSettings"]
+    assert result["Healed"] is False
+    metrics = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert metrics["RouteDrift"] == 1
+    assert metrics["StageDrift"] == 2
+
+    monkeypatch.setattr(reconciler, "drift_self_heal", True)
+    api_creator_harness.apigateway.calls.clear()
+    assert reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]["Healed"] is True
+    # only the drifted integration and the stage are touched
+    assert api_creator_harness.apigateway.calls["UpdateIntegration"] == 1
+    assert api_creator_harness.apigateway.calls["UpdateStage"] == 1
+    assert api_creator_harness.apigateway.calls["DeleteRouteSettings"] == 1
+    assert "ReimportApi" not in api_creator_harness.apigateway.calls
+
+    assert reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]["Drifted"] is False
+
+
+def test_heal_waits_for_the_publish_lease_and_the_current_version(api_creator_harness, reconciler, monkeypatch):
+    import publish_lock
+
+    api = next(iter(api_creator_harness.apigateway.apis.values()))
+    api["Stages"]["dev"]["DefaultRouteSettings"]["ThrottlingBurstLimit"] = 1
+    monkeypatch.setattr(reconciler, "drift_self_heal", True)
+
+    # a publisher holds the lease, healing is skipped rather than racing it
+    _, released_etag = publish_lock.read_lock(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish")
+    lease = publish_lock.new_lease("publisher", "work")
+    etag = publish_lock.write_lock(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", lease, released_etag)
+    api_creator_harness.apigateway.calls.clear()
+
+    result = reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]
+    assert result["Drifted"] is True and result["Healed"] is False
+    assert "UpdateStage" not in api_creator_harness.apigateway.calls
+
+    # the publisher released the lease after recording a newer version, here a settings only one (same digest)
+    publish_lock.release_lock(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", lease, etag)
+    detected = reconciler.spec_store.read_manifest(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", "dev")
+    newer = json.loads(json.dumps(detected))
+    current = newer["Versions"][-1]
+    newer["Versions"].append(dict(current, Settings=dict(current["Settings"], ThrottlingBurstLimit=1)))
+    manifests = [detected, newer]
+    monkeypatch.setattr(reconciler.spec_store, "read_manifest", lambda *args: manifests.pop(0) if len(manifests) > 1 else manifests[0])
+
+    assert reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]["Healed"] is False
+    assert "UpdateStage" not in api_creator_harness.apigateway.calls
+    # the lease was acquired, the heal itself declined
+    heal_lease, _ = publish_lock.read_lock(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish")
+    assert heal_lease["Digest"].startswith("drift-heal-") and heal_lease["Result"] is False
+
+
+def test_missing_api_and_failing_regions_are_reported(api_creator_harness, reconciler, monkeypatch, capsys):
+    # the api recorded in the manifest was deleted out of band
+    api_creator_harness.apigateway.apis.clear()
+
+    result = reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]
+
+    assert result["Api"] == ["Missing"] and result["Drifted"] is True and result["Healed"] is False
+    metrics = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert metrics["ApiDrift"] == 1
+    assert metrics["ReconcileErrors"] == 0
+
+    # a region which cannot be reconciled still gets its metrics before the handler fails
+    def failing_detect_drift(*args):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(reconciler, "detect_drift", failing_detect_drift)
+    with pytest.raises(ValueError, match="us-east-1: throttled"):
+        reconciler.lambda_handler({}, None)
+
+    metrics = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert metrics["ReconcileErrors"] == 1
+    assert metrics["Region"] == "us-east-1"
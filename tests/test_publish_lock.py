@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+import publish_lock
+
+
+@pytest.fixture
+def s3_client(aws_environment, monkeypatch):
+    import boto3
+    from moto import mock_aws
+
+    monkeypatch.setattr(publish_lock, "lock_poll_seconds", 0.05)
+
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="bucket")
+        yield client
+
+
+def run_concurrently(*targets) -> list:
+    results = [None] * len(targets)
+
+    def run(index, target):
+        results[index] = target()
+
+    threads = [threading.Thread(target=run, args=(index, target)) for index, target in enumerate(targets)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def test_publishers_of_the_same_work_coalesce(s3_client):
+    published = []
+    holding = threading.Event()
+
+    def publish():
+        published.append(threading.get_ident())
+        holding.set()
+        time.sleep(0.3)
+        return {"us-east-1": ["https://api", "api-1"]}
+
+    def waiting_publisher():
+        # starts once the first publisher holds the lease
+        holding.wait()
+        return publish_lock.publish_exclusively(s3_client, "bucket", "api", "digest", publish)
+
+    results = run_concurrently(
+        lambda: publish_lock.publish_exclusively(s3_client, "bucket", "api", "digest", publish),
+        waiting_publisher
+    )
+
+    assert len(published) == 1
+    assert results == [{"us-east-1": ["https://api", "api-1"]}] * 2
+
+
+def test_publishers_of_different_work_are_serialised(s3_client):
+    active = []
+    overlaps = []
+
+    def publisher(work_digest):
+        def publish():
+            overlaps.append(len(active))
+            active.append(work_digest)
+            time.sleep(0.2)
+            active.remove(work_digest)
+            return work_digest
+        return lambda: publish_lock.publish_exclusively(s3_client, "bucket", "api", work_digest, publish)
+
+    assert run_concurrently(publisher("v1"), publisher("v2"), publisher("v3")) == ["v1", "v2", "v3"]
+    assert overlaps == [0, 0, 0]
+
+
+def test_expired_and_failed_leases_are_taken_over(s3_client):
+    expired = dict(publish_lock.new_lease("crashed", "digest"), ExpiresAt=time.time() - 1)
+    publish_lock.write_lock(s3_client, "bucket", "api", expired)
+
+    assert publish_lock.publish_exclusively(s3_client, "bucket", "api", "digest", lambda: "published") == "published"
+
+    def failing_publish():
+        raise ValueError("import failed")
+
+    with pytest.raises(ValueError, match="import failed"):
+        publish_lock.publish_exclusively(s3_client, "bucket", "api", "digest", failing_publish)
+
+    lease, _ = publish_lock.read_lock(s3_client, "bucket", "api")
+    assert lease["State"] == "Released" and lease["Failed"]
+    assert publish_lock.publish_exclusively(s3_client, "bucket", "api", "digest", lambda: "retried") == "retried"
+
+
+def test_waiting_is_bounded(s3_client):
+    publish_lock.write_lock(s3_client, "bucket", "api", publish_lock.new_lease("holder", "other"))
+
+    with pytest.raises(ValueError, match="Timed out"):
+        publish_lock.publish_exclusively(s3_client, "bucket", "api", "digest", lambda: "published", max_wait_seconds=0.1)
+
+
+def test_delete_keeps_a_held_lease(s3_client):
+    s3_client.put_bucket_versioning(Bucket="bucket", VersioningConfiguration={"Status": "Enabled"})
+    lease = publish_lock.new_lease("holder", "digest")
+    etag = publish_lock.write_lock(s3_client, "bucket", "api", lease)
+    publish_lock.write_lock(s3_client, "bucket", "api-v2", publish_lock.new_lease("other", "digest"))
+
+    assert publish_lock.delete_lock(s3_client, "bucket", "api") is False
+    assert publish_lock.read_lock(s3_client, "bucket", "api")[0] == lease
+
+    # once released every version goes, the lease of api-v2 is kept
+    publish_lock.release_lock(s3_client, "bucket", "api", lease, etag)
+    assert publish_lock.delete_lock(s3_client, "bucket", "api") is True
+    keys = [version["Key"] for version in s3_client.list_object_versions(Bucket="bucket").get("Versions", [])]
+    assert keys == [publish_lock.lock_key("api-v2")]
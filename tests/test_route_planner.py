@@ -0,0 +1,190 @@
+import json
+
+import route_planner
+
+
+def route(uri, operation_id=None):
+    operation = {"x-amazon-apigateway-integration": {"type": "aws_proxy", "uri": uri, "payloadFormatVersion": "2.0"}}
+    if operation_id is not None:
+        operation["operationId"] = operation_id
+    return operation
+
+
+def deployed(route_id, integration_id, uri, operation_name=None):
+    return {
+        "RouteId": route_id,
+        "OperationName": operation_name,
+        "IntegrationId": integration_id,
+        "Integration": {"IntegrationType": "AWS_PROXY", "IntegrationUri": uri, "PayloadFormatVersion": "2.0"}
+    }
+
+
+def test_plan_changes():
+    api_definition = {
+        "paths": {
+            "/ping": {"get": route("arn:ping", "ping")},
+            "/greeting": {"get": route("arn:greeting:v2", "greeting")},
+            "/new": {"x-amazon-apigateway-any-method": route("arn:new")}
+        }
+    }
+    current = {
+        "GET /ping": deployed("r1", "i1", "arn:ping", "ping"),
+        "GET /greeting": deployed("r2", "i2", "arn:greeting", "hello"),
+        "GET /old": deployed("r3", "i3", "arn:old"),
+        "POST /old": deployed("r4", "i3", "arn:old")
+    }
+
+    plan = route_planner.plan_changes(route_planner.desired_routes(api_definition), current)
+
+    assert [(change["Action"], change["RouteKey"]) for change in plan] == [
+        ("update_integration", "GET /greeting"),
+        ("update_route", "GET /greeting"),
+        ("create", "ANY /new"),
+        ("delete", "GET /old"),
+        ("delete", "POST /old"),
+        ("delete_integration", "GET /old")
+    ]
+    assert plan[0]["Changes"] == {"IntegrationUri": "arn:greeting:v2"}
+    # the shared integration is deleted exactly once, after the routes
+    assert plan[5]["IntegrationId"] == "i3"
+    assert "~ GET /greeting: IntegrationUri arn:greeting -> arn:greeting:v2" in route_planner.format_plan(plan)
+
+
+def test_unchanged_definition_has_empty_plan():
+    api_definition = {"paths": {"/ping": {"get": route("arn:ping", "ping")}}}
+
+    plan = route_planner.plan_changes(
+        route_planner.desired_routes(api_definition), {"GET /ping": deployed("r1", "i1", "arn:ping", "ping")}
+    )
+
+    assert plan == []
+    assert route_planner.format_plan(plan) == "No route changes"
+
+
+def test_requires_reimport():
+    assert not route_planner.requires_reimport({"paths": {"/ping": {"get": route("arn:ping")}}})
+    assert route_planner.requires_reimport({"paths": {}, "x-amazon-apigateway-cors": {}})
+    assert route_planner.requires_reimport({"paths": {"/ping": {"get": dict(route("arn:ping"), security=[])}}})
+
+
+def test_unmodelled_elements_require_reimport_when_changed():
+    api_definition = {
+        "x-amazon-apigateway-request-validator": "all",
+        "paths": {"/ping": {"get": dict(route("arn:ping"), **{"x-amazon-apigateway-request-validator": "all"})}}
+    }
+    assert route_planner.unmodelled_elements(api_definition) == {
+        "/x-amazon-apigateway-request-validator": "all",
+        "GET /ping/x-amazon-apigateway-request-validator": "all"
+    }
+
+    # unknown previous definition, or a changed validator
+    assert route_planner.requires_reimport(api_definition)
+    assert not route_planner.requires_reimport(api_definition, api_definition)
+    changed = dict(api_definition, **{"x-amazon-apigateway-request-validator": "params-only"})
+    assert route_planner.requires_reimport(changed, api_definition)
+
+    # integration attributes the planner does not know about
+    unknown_attribute = {"paths": {"/ping": {"get": route("arn:ping")}}}
+    unknown_attribute["paths"]["/ping"]["get"]["x-amazon-apigateway-integration"]["cacheKeyParameters"] = []
+    assert route_planner.requires_reimport(unknown_attribute, {"paths": {"/ping": {"get": route("arn:ping")}}})
+
+
+def test_plan_diffs_every_integration_attribute():
+    operation = route("arn:ping", "ping")
+    operation["x-amazon-apigateway-integration"].update(
+        requestParameters={"append:header.version": "2"},
+        tlsConfig={"serverNameToVerify": "example.com"}
+    )
+    deployed_route = deployed("r1", "i1", "arn:ping", "ping")
+
+    plan = route_planner.plan_changes(
+        route_planner.desired_routes({"paths": {"/ping": {"get": operation}}}), {"GET /ping": deployed_route}
+    )
+    assert plan[0]["Changes"] == {
+        "RequestParameters": {"append:header.version": "2"},
+        "TlsConfig": {"ServerNameToVerify": "example.com"}
+    }
+
+    # removing an attribute cannot be applied with update_integration
+    deployed_route["Integration"]["ResponseParameters"] = {"200": {"overwrite:statuscode": "204"}}
+    plan = route_planner.plan_changes(
+        route_planner.desired_routes({"paths": {"/ping": {"get": route("arn:ping", "ping")}}}), {"GET /ping": deployed_route}
+    )
+    assert route_planner.plan_requires_reimport(plan)
+    assert "ResponseParameters removed from the integration" in route_planner.format_plan(plan)
+
+
+def test_shared_integration_is_deleted_after_its_routes(api_creator_harness):
+    harness = api_creator_harness
+    client = harness.api_creator.get_apigateway_client()
+    api_id = client.import_api(Body=json.dumps({
+        "openapi": "3.0.1",
+        "info": {"title": "shared", "version": "1"},
+        "paths": {path: {"get": route("arn:shared")} for path in ("/a", "/b", "/c")}
+    }))["ApiId"]
+
+    # every route targets the same integration
+    api = harness.apigateway.apis[api_id]
+    shared_target = next(iter(api["Routes"].values()))["Target"]
+    for deployed_route in api["Routes"].values():
+        deployed_route["Target"] = shared_target
+    api["Integrations"] = {shared_target.split("/")[1]: api["Integrations"][shared_target.split("/")[1]]}
+
+    plan = route_planner.plan_api_update(client, api_id, {"paths": {}})
+    route_planner.apply_plan(client, api_id, plan, max_workers=3, rate_limit=0)
+
+    assert api["Routes"] == {}
+    assert api["Integrations"] == {}
+    assert harness.apigateway.calls["DeleteIntegration"] == 1
+
+
+def test_routes_without_integration():
+    api_definition = {
+        "paths": {
+            "/health": {"get": {"operationId": "health"}},
+            "/ping": {"get": route("arn:ping", "ping")},
+            "/greeting": {"get": {"operationId": "greeting"}},
+            "/new": {"get": {}}
+        }
+    }
+    current = {
+        "GET /health": dict(deployed("r1", None, None, "health"), Integration={}),
+        "GET /ping": dict(deployed("r2", None, None, "ping"), Integration={}),
+        "GET /greeting": deployed("r3", "i3", "arn:greeting", "greeting")
+    }
+
+    plan = route_planner.plan_changes(route_planner.desired_routes(api_definition), current)
+
+    # a declared route without an integration is kept, never deleted
+    assert [(change["Action"], change["RouteKey"]) for change in plan] == [
+        ("attach_integration", "GET /ping"),
+        ("reimport", "GET /greeting"),
+        ("create", "GET /new")
+    ]
+    assert plan[0]["RouteId"] == "r2"
+    assert plan[0]["Integration"]["IntegrationUri"] == "arn:ping"
+    assert "+ GET /ping: integration arn:ping" in route_planner.format_plan(plan)
+    assert "+ GET /new -> no integration" in route_planner.format_plan(plan)
+
+
+def test_integration_is_attached_to_a_route_without_target(api_creator_harness):
+    harness = api_creator_harness
+    client = harness.api_creator.get_apigateway_client()
+    api_id = client.import_api(Body=json.dumps({
+        "openapi": "3.0.1",
+        "info": {"title": "untargeted", "version": "1"},
+        "paths": {"/ping": {"get": {"operationId": "ping"}}}
+    }))["ApiId"]
+    api = harness.apigateway.apis[api_id]
+    assert "Target" not in next(iter(api["Routes"].values()))
+
+    api_definition = {"paths": {"/ping": {"get": route("arn:ping", "ping")}, "/health": {"get": {}}}}
+    plan = route_planner.plan_api_update(client, api_id, api_definition)
+    route_planner.apply_plan(client, api_id, plan, rate_limit=0)
+
+    routes = {deployed_route["RouteKey"]: deployed_route for deployed_route in api["Routes"].values()}
+    integration_id = routes["GET /ping"]["Target"].replace("integrations/", "", 1)
+    assert api["Integrations"][integration_id]["IntegrationUri"] == "arn:ping"
+    assert "Target" not in routes["GET /health"]
+    assert "UpdateIntegration" not in harness.apigateway.calls
+    assert route_planner.plan_api_update(client, api_id, api_definition) == []
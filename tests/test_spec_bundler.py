@@ -0,0 +1,161 @@
+import os
+
+import pytest
+
+import spec_bundler
+from tests.conftest import RESOURCES_DIR
+
+SUBSTITUTIONS = {
+    "API_NAME": "apigateway-dynamic-publish",
+    "API_INTEGRATION_PING_LAMBDA": "arn:ping",
+    "API_INTEGRATION_GREETING_LAMBDA": "arn:greeting"
+}
+
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    return str(path)
+
+
+def test_bundles_route_fragments():
+    root_file = os.path.join(RESOURCES_DIR, "api_creation", "api_definition.yaml")
+
+    api_definition = spec_bundler.bundle_api_definition(root_file, SUBSTITUTIONS)
+
+    assert api_definition["info"]["title"] == "apigateway-dynamic-publish"
+    assert list(api_definition["paths"]) == ["/ping", "/greeting"]
+    ping = api_definition["paths"]["/ping"]["get"]
+    assert ping["x-amazon-apigateway-integration"]["uri"] == "arn:ping"
+    assert ping["responses"][200]["content"]["application/json"]["schema"]["items"] == {
+        "$ref": "#/components/schemas/PingResponse"
+    }
+
+
+def test_each_file_is_rendered_once_per_bundle(tmp_path, monkeypatch):
+    root_file = write(tmp_path / "api_definition.yaml", (
+        "info:\n  title: @@API_NAME@@\n"
+        "paths:\n"
+        "  /ping:\n    $ref: \"paths/ping.yaml\"\n"
+        "  /greeting:\n    $ref: \"paths/greeting.yaml\"\n"
+    ))
+    write(tmp_path / "paths" / "ping.yaml", (
+        "get:\n  operationId: ping\n  uri: @@API_INTEGRATION_PING_LAMBDA@@\n"
+        "  responses:\n    $ref: \"../shared/responses.yaml#/Default\"\n"
+    ))
+    write(tmp_path / "paths" / "greeting.yaml", (
+        "get:\n  operationId: greeting\n"
+        "  responses:\n    $ref: \"../shared/responses.yaml#/Default\"\n"
+    ))
+    write(tmp_path / "shared" / "responses.yaml", "Default:\n  200:\n    description: OK\n")
+
+    rendered = []
+    load_yaml = spec_bundler.load_yaml
+    monkeypatch.setattr(spec_bundler, "load_yaml", lambda document: rendered.append(document) or load_yaml(document))
+
+    api_definition = spec_bundler.bundle_api_definition(root_file, SUBSTITUTIONS)
+
+    # the shared file is referenced twice and parsed once
+    assert len(rendered) == 4
+    assert api_definition["paths"]["/greeting"]["get"]["responses"] == {200: {"description": "OK"}}
+
+    # nothing is kept between bundles, a changed fragment is always picked up
+    write(tmp_path / "paths" / "greeting.yaml", "get:\n  operationId: greetingV2\n")
+    api_definition = spec_bundler.bundle_api_definition(root_file, SUBSTITUTIONS)
+
+    assert api_definition["paths"]["/greeting"]["get"]["operationId"] == "greetingV2"
+
+
+def test_external_refs_are_bundled(tmp_path):
+    root_file = write(tmp_path / "api_definition.yaml", (
+        "paths:\n  /ping:\n    $ref: \"paths/ping.yaml\"\n"
+        "components:\n  schemas:\n    Ping:\n      type: object\n"
+    ))
+    write(tmp_path / "paths" / "ping.yaml", (
+        "get:\n  responses:\n    200:\n"
+        "      schema:\n        $ref: \"../api_definition.yaml#/components/schemas/Ping\"\n"
+        "      headers:\n        $ref: \"../shared/headers.yaml#/RequestId\"\n"
+    ))
+    write(tmp_path / "shared" / "headers.yaml", "RequestId:\n  schema:\n    type: string\n")
+
+    api_definition = spec_bundler.bundle_api_definition(root_file, {})
+
+    response = api_definition["paths"]["/ping"]["get"]["responses"][200]
+    assert response["schema"] == {"$ref": "#/components/schemas/Ping"}
+    assert response["headers"] == {"schema": {"type": "string"}}
+
+
+def test_local_refs_in_a_fragment_point_into_the_fragment(tmp_path):
+    root_file = write(tmp_path / "api_definition.yaml", (
+        "paths:\n  /ping:\n    $ref: \"paths/ping.yaml#/PathItem\"\n"
+        "components:\n  schemas:\n    Ping:\n      type: object\n"
+    ))
+    write(tmp_path / "paths" / "ping.yaml", (
+        "PathItem:\n  get:\n    responses:\n      200:\n"
+        "        schema:\n          $ref: \"#/Ping\"\n"
+        "Ping:\n  type: string\n"
+    ))
+
+    api_definition = spec_bundler.bundle_api_definition(root_file, {})
+
+    assert api_definition["paths"]["/ping"]["get"]["responses"][200]["schema"] == {"type": "string"}
+
+
+def test_circular_external_refs_are_rejected(tmp_path):
+    root_file = write(tmp_path / "api_definition.yaml", "paths:\n  /a:\n    $ref: \"a.yaml\"\n")
+    write(tmp_path / "a.yaml", "get:\n  $ref: \"b.yaml\"\n")
+    write(tmp_path / "b.yaml", "$ref: \"a.yaml\"\n")
+
+    with pytest.raises(ValueError, match="Circular"):
+        spec_bundler.bundle_api_definition(root_file, {})
+
+
+def test_import_definition_strips_documentation():
+    api_definition = {
+        "info": {"title": "apigateway-dynamic-publish", "description": "## Markdown"},
+        "paths": {
+            "/ping": {
+                "summary": "Ping",
+                "get": {
+                    "description": "### Sample invocation",
+                    "operationId": "pingIntegration",
+                    "x-slo": {"p99LatencyMs": 250},
+                    "parameters": [{"in": "query", "name": "q", "description": "query", "schema": {"type": "string"}}],
+                    "responses": {200: {"description": "OK", "content": {"application/json": {"example": {"ping": "pong"}}}}},
+                    "x-amazon-apigateway-integration": {"uri": "arn:ping", "type": "aws_proxy"}
+                }
+            }
+        },
+        "components": {
+            "schemas": {
+                "Item": {
+                    "type": "object",
+                    "description": "An item",
+                    "properties": {"description": {"type": "string", "description": "Named description"}}
+                }
+            }
+        }
+    }
+
+    imported = spec_bundler.import_definition(api_definition)
+
+    assert imported == {
+        "info": {"title": "apigateway-dynamic-publish"},
+        "paths": {
+            "/ping": {
+                "get": {
+                    "operationId": "pingIntegration",
+                    "parameters": [{"in": "query", "name": "q", "schema": {"type": "string"}}],
+                    "responses": {200: {"description": "OK", "content": {"application/json": {}}}},
+                    "x-amazon-apigateway-integration": {"uri": "arn:ping", "type": "aws_proxy"}
+                }
+            }
+        },
+        "components": {
+            "schemas": {
+                "Item": {"type": "object", "properties": {"description": {"type": "string"}}}
+            }
+        }
+    }
+    # the full definition is left untouched for swagger.json
+    assert api_definition["paths"]["/ping"]["get"]["description"] == "### Sample invocation"
@@ -0,0 +1,85 @@
+import pytest
+
+import spec_store
+
+SETTINGS = {"ThrottlingBurstLimit": 500, "ThrottlingRateLimit": 100}
+
+
+@pytest.fixture
+def s3_client(aws_environment):
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="bucket")
+        yield client
+
+
+def test_snapshot_digest_ignores_key_order():
+    assert spec_store.snapshot_digest({"a": 1, "b": {"c": 2}}) == spec_store.snapshot_digest({"b": {"c": 2}, "a": 1})
+    assert spec_store.snapshot_digest({"a": 1}) != spec_store.snapshot_digest({"a": 2})
+
+
+def test_record_deployment_deduplicates_snapshots(s3_client):
+    first = spec_store.record_deployment(s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 1}}, SETTINGS)
+    spec_store.record_deployment(s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 2}}, SETTINGS)
+    # an unchanged deployment is not recorded again
+    spec_store.record_deployment(s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 2}}, SETTINGS)
+    spec_store.record_deployment(s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 1}}, SETTINGS)
+
+    manifest = spec_store.read_manifest(s3_client, "bucket", "api", "dev")
+    assert len(manifest["Versions"]) == 3
+    assert manifest["Current"] == first["Digest"]
+    assert s3_client.list_objects_v2(Bucket="bucket", Prefix="snapshots/")["KeyCount"] == 2
+    assert spec_store.load_snapshot(s3_client, "bucket", first["Snapshots"]["us-east-1"]) == {"v": 1}
+
+
+def test_version_digest_covers_every_region(s3_client):
+    first = spec_store.record_deployment(
+        s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 1}, "eu-west-1": {"v": 1}}, SETTINGS
+    )
+    # only the additional region changed
+    second = spec_store.record_deployment(
+        s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 1}, "eu-west-1": {"v": 2}}, SETTINGS
+    )
+
+    assert first["Digest"] != second["Digest"]
+    assert spec_store.select_rollback_version(spec_store.read_manifest(s3_client, "bucket", "api", "dev")) == first
+    # independent of the region order
+    assert second["Digest"] == spec_store.version_digest(dict(reversed(list(second["Snapshots"].items()))))
+
+
+def test_select_rollback_version():
+    manifest = {
+        "StageName": "dev",
+        "Current": "cc33",
+        "Versions": [{"Digest": "aa11"}, {"Digest": "bb22"}, {"Digest": "cc33"}]
+    }
+
+    assert spec_store.select_rollback_version(manifest)["Digest"] == "bb22"
+    assert spec_store.select_rollback_version(manifest, "aa")["Digest"] == "aa11"
+
+    with pytest.raises(ValueError):
+        spec_store.select_rollback_version(manifest, "dd")
+    with pytest.raises(ValueError):
+        spec_store.select_rollback_version({"StageName": "dev", "Current": "aa11", "Versions": [{"Digest": "aa11"}]})
+
+
+def test_delete_deployment_records_keeps_shared_snapshots(s3_client, monkeypatch):
+    s3_client.put_bucket_versioning(Bucket="bucket", VersioningConfiguration={"Status": "Enabled"})
+    s3_client.put_object(Bucket="bucket", Key="swagger.json", Body=b"{}")
+    s3_client.put_object(Bucket="bucket", Key="swagger.json", Body=b'{"v": 2}')
+
+    shared = spec_store.record_deployment(s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 1}}, SETTINGS)
+    spec_store.record_deployment(s3_client, "bucket", "api", "dev", {"us-east-1": {"v": 2}}, SETTINGS)
+    spec_store.record_deployment(s3_client, "bucket", "api", "prod", {"us-east-1": {"v": 1}}, SETTINGS)
+
+    # every version is deleted in batches
+    monkeypatch.setattr(spec_store, "DELETE_BATCH_SIZE", 2)
+    deleted = spec_store.delete_deployment_records(s3_client, "bucket", "api", "dev", ["swagger.json"])
+
+    remaining = {version["Key"] for version in s3_client.list_object_versions(Bucket="bucket")["Versions"]}
+    assert remaining == {spec_store.manifest_key("api", "prod"), spec_store.snapshot_key(shared["Snapshots"]["us-east-1"])}
+    # 2 swagger.json versions, 2 manifest versions and the unshared snapshot
+    assert deleted == 5
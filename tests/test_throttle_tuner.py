@@ -0,0 +1,86 @@
+import json
+
+import throttle_tuner
+
+
+def access_log_event(second: int, route_key: str, status: int = 200) -> dict:
+    method = route_key.split(" ")[0]
+    return {
+        "timestamp": second * 1000 + 250,
+        "message": f'10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "{method} {route_key} HTTP/1.1" {status} 15 req-{second} -'
+    }
+
+
+def test_access_log_statistics_and_recommendation():
+    # /ping: 10 requests in second 0 (3 of them throttled), then 1 per second
+    events = [access_log_event(0, "GET /ping", 429 if index < 3 else 200) for index in range(10)]
+    events += [access_log_event(second, "GET /ping") for second in range(1, 100)]
+    events += [access_log_event(second, "GET /greeting") for second in range(0, 100, 10)]
+    events.append({"timestamp": 0, "message": "START RequestId: not an access log line"})
+
+    statistics = throttle_tuner.route_statistics(throttle_tuner.access_log_rates(events))
+
+    assert statistics["GET /ping"]["Requests"] == 109
+    assert statistics["GET /ping"]["Throttled"] == 3
+    assert statistics["GET /ping"]["Peak"] == 10.0
+    assert statistics["GET /ping"]["P50"] == 1.0
+    assert statistics["GET /greeting"]["P50"] == 0.0
+
+    recommendation = throttle_tuner.recommend_limits(statistics, pct=99, headroom=1.5)
+
+    assert recommendation["ThrottlingBurstLimit"] == 15
+    assert recommendation["ThrottlingRateLimit"] == 2
+    assert recommendation["BurstRoute"] == "GET /ping"
+    assert throttle_tuner.cdk_json_patch(recommendation) == {
+        "context": {"api": {"throttlingBurstLimit": 15, "throttlingRateLimit": 2}}
+    }
+
+
+def test_metric_statistics(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text(json.dumps({
+        "MetricDataResults": [
+            {"Id": "ping", "Label": "GET /ping", "Timestamps": [], "Values": [600, 1200, 6000]},
+            {"Id": "ping_throttled", "Label": "GET /ping throttled", "Timestamps": [], "Values": [0, 0, 60]}
+        ]
+    }))
+
+    statistics = throttle_tuner.route_statistics(
+        throttle_tuner.metric_rates(throttle_tuner.read_json_records(str(metrics_file)), 60)
+    )
+
+    assert statistics["GET /ping"]["Peak"] == 100.0
+    assert statistics["GET /ping"]["P50"] == 20.0
+    assert statistics["GET /ping"]["Throttled"] == 60
+
+
+def test_apply_limits_records_a_version_under_the_publish_lease(api_creator_harness, monkeypatch):
+    import drift_reconciler
+    import publish_lock
+    import spec_store
+    from tests.test_api_creator import custom_resource_event, run_provider
+
+    output = run_provider(api_creator_harness.api_creator, custom_resource_event("Create"))
+
+    version = throttle_tuner.apply_limits(
+        "apigateway-dynamic-publish", "dev", {"ThrottlingBurstLimit": 15, "ThrottlingRateLimit": 2}, "api-documentation-bucket"
+    )
+
+    stage = api_creator_harness.apigateway.apis[output["Data"]["ApiId"]]["Stages"]["dev"]
+    assert stage["DefaultRouteSettings"]["ThrottlingBurstLimit"] == 15
+    assert stage["DefaultRouteSettings"]["ThrottlingRateLimit"] == 2
+
+    manifest = spec_store.read_manifest(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish", "dev")
+    assert spec_store.current_version(manifest) == version
+    assert len(manifest["Versions"]) == 2
+    assert version["Settings"]["ThrottlingBurstLimit"] == 15
+    assert version["ApiIds"] == {"us-east-1": output["Data"]["ApiId"]}
+    lease, _ = publish_lock.read_lock(api_creator_harness.s3, "api-documentation-bucket", "apigateway-dynamic-publish")
+    assert lease["State"] == "Released"
+
+    # the reconciler sees the recorded limits, not drift
+    monkeypatch.setenv("API_NAME", "apigateway-dynamic-publish")
+    monkeypatch.setenv("API_STAGE_NAME", "dev")
+    monkeypatch.setenv("API_DOCUMENTATION_BUCKET_NAME", "api-documentation-bucket")
+    monkeypatch.setattr(drift_reconciler, "snapshot_cache", {})
+    assert drift_reconciler.lambda_handler({}, None)["Regions"]["us-east-1"]["Drifted"] is False